@@ -9,6 +9,7 @@ class PrefsIn(BaseModel):
     tech_keywords: List[str] = Field(default_factory=list)
     role_keywords: List[str] = Field(default_factory=list)
     location_keywords: List[str] = Field(default_factory=list)
+    subscribed_repos: List[str] = Field(default_factory=list)
 
 
 class SubscribeIn(BaseModel):
@@ -40,3 +41,32 @@ class UnsubscribeConfirmIn(BaseModel):
     token: str
     disable_email: bool = True
     disable_sms: bool = True
+
+
+class WebhookOut(BaseModel):
+    status: str
+    queued: int = 0
+
+
+class RepoOut(BaseModel):
+    key: str
+    label: str
+    full_name: str
+
+
+class PollScheduleOut(BaseModel):
+    repo_name: str
+    last_sha: str
+    commit_rate_per_hour: float
+    idle_polls: int
+    interval_seconds: Optional[float] = None
+    last_polled_at: Optional[str] = None
+    next_poll_at: Optional[str] = None
+    next_poll_reason: Optional[str] = None
+
+
+class OutboxStatsOut(BaseModel):
+    depth: int
+    oldest_age_seconds: Optional[float] = None
+    delivered: int
+    failed: int
@@ -1,4 +1,7 @@
+import hashlib
+import hmac
 import os
+from typing import Optional
 from itsdangerous import URLSafeTimedSerializer, BadSignature, BadTimeSignature, SignatureExpired
 
 
@@ -18,3 +21,15 @@ def read_token(token: str, max_age_seconds: int):
         raise ValueError("expired") from e
     except (BadTimeSignature, BadSignature) as e:
         raise ValueError("invalid") from e
+
+
+def verify_github_signature(secret: str, body: bytes,
+                            signature_header: Optional[str]) -> bool:
+    """Check an X-Hub-Signature-256 header ("sha256=<hexdigest>") against body."""
+    if not secret or not signature_header:
+        return False
+    algo, _, digest = signature_header.partition("=")
+    if algo != "sha256" or not digest:
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, digest)
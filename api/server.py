@@ -1,13 +1,13 @@
-import os, uuid
-from fastapi import FastAPI, HTTPException, Depends, Query
+import json, os, uuid
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Header
 from fastapi.responses import HTMLResponse
-from typing import Optional
+from typing import List, Optional
 from persistence.db import get_conn, init_db
-from persistence.repositories import UserRepository
+from persistence.repositories import UserRepository, WebhookEventRepository, RepoConfigRepository, RepoStateRepository, OutboxRepository
 from common.models import UserPreferences, UserContact
 from notification.service import NotificationService
-from api.schemas import SubscribeIn, SubscribeOut, VerifyOut, RequestEditLinkIn, UpdatePrefsIn, UnsubscribeConfirmIn
-from api.security import make_token, read_token
+from api.schemas import SubscribeIn, SubscribeOut, VerifyOut, RequestEditLinkIn, UpdatePrefsIn, UnsubscribeConfirmIn, WebhookOut, RepoOut, PollScheduleOut, OutboxStatsOut
+from api.security import make_token, read_token, verify_github_signature
 from fastapi.middleware.cors import CORSMiddleware
 
 APP_BASE_URL = os.getenv("APP_BASE_URL", "http://localhost:8000")
@@ -48,6 +48,22 @@ def get_user_repo():
     return UserRepository(get_user_repo.conn)
 
 
+def get_webhook_repo():
+    return WebhookEventRepository(get_user_repo().conn)
+
+
+def get_repo_config_repo():
+    return RepoConfigRepository(get_user_repo().conn)
+
+
+def get_repo_state_repo():
+    return RepoStateRepository(get_user_repo().conn)
+
+
+def get_outbox_repo():
+    return OutboxRepository(get_user_repo().conn)
+
+
 class ConsoleSender:
 
     def send_email(self, to_addr, subject, html_body, text_body):
@@ -71,6 +87,7 @@ def _prefs_from_model(p) -> UserPreferences:
         tech_keywords=p.tech_keywords,
         role_keywords=p.role_keywords,
         location_keywords=p.location_keywords,
+        subscribed_repos=p.subscribed_repos,
     )
 
 
@@ -105,6 +122,27 @@ def health():
     return {"ok": True}
 
 
+@app.get("/repos", response_model=List[RepoOut])
+def list_repos(repo: RepoConfigRepository = Depends(get_repo_config_repo)):
+    """Repos users can subscribe to via prefs.subscribed_repos."""
+    return [
+        RepoOut(key=c.key, label=c.label, full_name=c.full_name)
+        for c in repo.list_repos()
+    ]
+
+
+@app.get("/poll-schedule", response_model=List[PollScheduleOut])
+def poll_schedule(repo: RepoStateRepository = Depends(get_repo_state_repo)):
+    """Next scheduled poll per repo and why the scheduler picked it."""
+    return [PollScheduleOut(**s) for s in repo.list_states()]
+
+
+@app.get("/outbox", response_model=OutboxStatsOut)
+def outbox_stats(repo: OutboxRepository = Depends(get_outbox_repo)):
+    """Pending notification depth and the age of the oldest pending one."""
+    return OutboxStatsOut(**repo.stats())
+
+
 @app.post("/subscribe", response_model=SubscribeOut)
 def subscribe(payload: SubscribeIn,
               repo: UserRepository = Depends(get_user_repo)):
@@ -292,3 +330,53 @@ def unsubscribe_confirm(token: str = Query(None),
         notify_sms=(False if disable_sms else True),
     )
     return SubscribeOut(status="unsubscribed")
+
+
+async def raw_body(request: Request) -> bytes:
+    # Read on the loop so the handler itself can run in the threadpool
+    return await request.body()
+
+
+@app.post("/webhooks/github", response_model=WebhookOut)
+def github_webhook(x_hub_signature_256: Optional[str] = Header(None),
+                   x_github_event: Optional[str] = Header(None),
+                   x_github_delivery: Optional[str] = Header(None),
+                   body: bytes = Depends(raw_body),
+                   repo: WebhookEventRepository = Depends(get_webhook_repo)):
+    """
+    Records pushed commit SHAs so the webhook worker can poll the repo right away.
+    Cron polling still runs as a safety net for missed deliveries.
+    Only pushes to a tracked repo's configured branch are queued, and a
+    redelivery (same X-GitHub-Delivery) is acknowledged without queueing.
+    """
+    secret = os.getenv("GITHUB_WEBHOOK_SECRET", "")
+    if not verify_github_signature(secret, body, x_hub_signature_256):
+        raise HTTPException(401, "Invalid signature.")
+
+    if x_github_event == "ping":
+        return WebhookOut(status="pong")
+    if x_github_event != "push":
+        return WebhookOut(status="ignored")
+
+    try:
+        payload = json.loads(body)
+        repo_name = payload["repository"]["full_name"]
+        commits = list(payload.get("commits") or [])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPException(400, "Malformed push payload.")
+
+    cfg = RepoConfigRepository(repo.conn).get_by_full_name(repo_name)
+    ref = payload.get("ref") or ""
+    if cfg is None or not cfg.enabled or ref != f"refs/heads/{cfg.branch}":
+        return WebhookOut(status="ignored")
+
+    shas = [c["id"] for c in commits if isinstance(c, dict) and c.get("id")]
+    if not shas and payload.get("after"):
+        shas = [payload["after"]]
+    if not shas:
+        return WebhookOut(status="ignored")
+
+    queued = repo.enqueue(repo_name, shas, ref=ref, delivery_id=x_github_delivery)
+    if not queued and x_github_delivery:
+        return WebhookOut(status="duplicate")
+    return WebhookOut(status="queued", queued=queued)
@@ -0,0 +1,79 @@
+"""
+Benchmark: per-pair was_sent/mark_sent dedupe vs filter_unsent + mark_sent_many.
+
+    python -m bin.bench_dedupe [--users N] [--jobs N] [--db PATH]
+
+Uses a file-backed DB (a temp file by default) so per-pair commits pay the
+fsync they pay in production. Each pass dedupes users x jobs pairs against a
+table where half of them were already sent.
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from persistence.db import get_conn, init_db
+from persistence.repositories import SentNotificationsRepository
+
+
+def _seed(sent: SentNotificationsRepository, users: List[str],
+          jobs: List[str]) -> None:
+    sent.mark_sent_many((u, j) for u in users for j in jobs[::2])
+
+
+def per_pair(sent: SentNotificationsRepository, users: List[str],
+             jobs: List[str]) -> int:
+    n = 0
+    for u in users:
+        for j in jobs:
+            if not sent.was_sent(u, j):
+                sent.mark_sent(u, j)
+                n += 1
+    return n
+
+
+def bulk(sent: SentNotificationsRepository, users: List[str],
+         jobs: List[str]) -> int:
+    unsent = {u: sent.filter_unsent(u, jobs) for u in users}
+    return len(
+        sent.mark_sent_many((u, j) for u, js in unsent.items() for j in js))
+
+
+def bench(n_users: int = 10_000,
+          n_jobs: int = 50,
+          path: Optional[str] = None) -> Dict[str, float]:
+    """Wall milliseconds to dedupe n_users x n_jobs pairs, by strategy."""
+    jobs = [f"job-{i}" for i in range(n_jobs)]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, fn in (("per-pair", per_pair), ("bulk", bulk)):
+            db = path or os.path.join(tmp, f"{name}.db")
+            conn = get_conn(db)
+            init_db(conn)
+            sent = SentNotificationsRepository(conn)
+            users = [f"{name}-user-{i}" for i in range(n_users)]
+            _seed(sent, users, jobs)
+            t0 = time.perf_counter()
+            inserted = fn(sent, users, jobs)
+            results[name] = (time.perf_counter() - t0) * 1000
+            conn.close()
+            assert inserted == n_users * (n_jobs // 2), (name, inserted)
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=10_000)
+    ap.add_argument("--jobs", type=int, default=50)
+    ap.add_argument("--db", default=None)
+    args = ap.parse_args()
+
+    print(f"{args.users} users x {args.jobs} jobs "
+          f"({args.users * args.jobs} pairs, half already sent)")
+    for name, ms in bench(args.users, args.jobs, args.db).items():
+        print(f"  {name:<9} {ms:10.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
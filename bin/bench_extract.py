@@ -0,0 +1,54 @@
+"""
+Microbenchmark: CPU time per page for each installed HTML extractor.
+
+    python -m bin.bench_extract [page.html ...] [--repeat N]
+
+Defaults to the recorded pages in job_scraper/tests/fixtures. "html.parser-full"
+is the old extraction (whole BeautifulSoup tree, no strainer) for reference.
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from job_scraper.extract import BACKENDS, available_backends, extract_soup
+
+FIXTURES = Path(__file__).resolve().parent.parent / "job_scraper" / "tests" / "fixtures"
+
+
+def extractors() -> Dict[str, Callable[[str], str]]:
+    out = {name: BACKENDS[name][1] for name in available_backends()}
+    out["html.parser-full"] = lambda html: extract_soup(html, strain=False)
+    return out
+
+
+def bench(pages: List[str], repeat: int = 20) -> Dict[str, float]:
+    """Mean CPU milliseconds per page, by extractor."""
+    results = {}
+    for name, extract in extractors().items():
+        t0 = time.process_time()
+        for _ in range(repeat):
+            for html in pages:
+                extract(html)
+        results[name] = ((time.process_time() - t0) * 1000 /
+                         (repeat * len(pages)))
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("pages", nargs="*")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    paths = [Path(p) for p in args.pages] or sorted(FIXTURES.glob("*.html"))
+    pages = [p.read_text(encoding="utf-8", errors="replace") for p in paths]
+    total_kb = sum(len(p.encode()) for p in pages) / 1024
+    print(f"{len(pages)} pages, {total_kb:.0f} KiB, repeat={args.repeat}")
+    for name, ms in sorted(bench(pages, args.repeat).items(),
+                           key=lambda kv: kv[1]):
+        print(f"  {name:<18} {ms:8.2f} ms CPU/page")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark: lock acquisition latency under contention, fixed-interval polling
+(the old acquire_lock loop) vs acquire_lock's jittered exponential backoff.
+
+    python -m bin.bench_lock [--contenders N] [--rounds N] [--hold-ms MS]
+
+Each contender is a thread with its own connection to a file-backed DB that
+acquires the same lock `rounds` times, holding it `hold_ms` each time.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+from persistence.db import get_conn
+from persistence.lock import _try_acquire, acquire_lock, init_lock_table
+
+
+def _fixed_poll(conn, name: str, owner: str, retry_seconds: float):
+    while True:
+        lease = _try_acquire(conn, name, owner, 120)
+        if lease:
+            return lease
+        time.sleep(retry_seconds)
+
+
+def _contend(path: str, strategy: str, contenders: int, rounds: int,
+             hold_ms: float, retry_seconds: float) -> List[float]:
+    waits: List[float] = []
+    start = threading.Barrier(contenders)
+
+    def worker(i: int):
+        conn = get_conn(path)
+        owner = f"{strategy}-{i}"
+        start.wait()
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            if strategy == "fixed":
+                lease = _fixed_poll(conn, "bench", owner, retry_seconds)
+                waits.append(time.perf_counter() - t0)
+                time.sleep(hold_ms / 1000)
+                lease.release()
+            else:
+                with acquire_lock(conn,
+                                  "bench",
+                                  owner,
+                                  retry_seconds=retry_seconds,
+                                  max_wait_seconds=600) as lease:
+                    assert lease
+                    waits.append(time.perf_counter() - t0)
+                    time.sleep(hold_ms / 1000)
+        conn.close()
+
+    threads = [
+        threading.Thread(target=worker, args=(i, ))
+        for i in range(contenders)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return waits
+
+
+def bench(contenders: int = 8,
+          rounds: int = 5,
+          hold_ms: float = 20,
+          retry_seconds: float = 0.5) -> Dict[str, Dict[str, float]]:
+    """Acquisition wait (ms) percentiles and throughput, by strategy."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for strategy in ("fixed", "backoff"):
+            path = os.path.join(tmp, f"{strategy}.db")
+            conn = get_conn(path)
+            init_lock_table(conn)
+            conn.close()
+            t0 = time.perf_counter()
+            waits = sorted(
+                _contend(path, strategy, contenders, rounds, hold_ms,
+                         retry_seconds))
+            elapsed = time.perf_counter() - t0
+            results[strategy] = {
+                "p50_ms": statistics.median(waits) * 1000,
+                "p95_ms": waits[int(0.95 * (len(waits) - 1))] * 1000,
+                "max_ms": waits[-1] * 1000,
+                "acquisitions_per_s": len(waits) / elapsed,
+            }
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--contenders", type=int, default=8)
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--hold-ms", type=float, default=20)
+    ap.add_argument("--retry-seconds", type=float, default=0.5)
+    args = ap.parse_args()
+
+    print(f"{args.contenders} contenders x {args.rounds} rounds, "
+          f"{args.hold_ms:.0f} ms hold, {args.retry_seconds}s retry cap")
+    for name, r in bench(args.contenders, args.rounds, args.hold_ms,
+                         args.retry_seconds).items():
+        print(f"  {name:<8} p50 {r['p50_ms']:7.1f} ms  p95 {r['p95_ms']:7.1f} ms"
+              f"  max {r['max_ms']:7.1f} ms  {r['acquisitions_per_s']:6.1f}/s")
+
+
+if __name__ == "__main__":
+    main()
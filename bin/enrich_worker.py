@@ -0,0 +1,57 @@
+"""
+Long-running worker for two-phase notifications (TWO_PHASE_NOTIFY=1): drains
+the enrichment queue, scraping descriptions off the poll's critical path and
+sending follow-up digests for the matches they resolve.
+"""
+import os
+import time
+
+from persistence.db import get_conn, init_db
+from persistence.repositories import (EnrichmentQueueRepository,
+                                      OutboxRepository,
+                                      SentNotificationsRepository,
+                                      UserRepository)
+from notification.service import NotificationService
+from notification.runner import drain_enrichment_queue
+from bin.poll_once import (ConsoleSender, build_edit_link,
+                           build_unsubscribe_link, build_scraper)
+
+
+def main():
+    conn = get_conn(os.getenv("DB_PATH") or "db.sqlite3")
+    init_db(conn)
+    queue_repo = EnrichmentQueueRepository(conn)
+    user_repo = UserRepository(conn)
+    sent_repo = SentNotificationsRepository(conn)
+
+    notifier = NotificationService(
+        ConsoleSender(),
+        edit_link_builder=build_edit_link,
+        unsubscribe_link_builder=build_unsubscribe_link)
+    scraper = build_scraper()
+    outbox = (OutboxRepository(conn)
+              if os.getenv("NOTIFY_OUTBOX", "0") == "1" else None)
+
+    budget = float(os.getenv("ENRICH_BUDGET_SECONDS", "60"))
+    interval = float(os.getenv("ENRICH_DRAIN_INTERVAL", "5.0"))
+    max_attempts = int(os.getenv("ENRICH_MAX_ATTEMPTS", "3"))
+
+    while True:
+        try:
+            stats = drain_enrichment_queue(queue_repo,
+                                           user_repo,
+                                           sent_repo,
+                                           notifier,
+                                           scraper,
+                                           budget_seconds=budget,
+                                           outbox=outbox,
+                                           max_attempts=max_attempts)
+            if stats:
+                print("[enrich] stats:", stats)
+        except Exception as e:
+            print(f"[enrich] drain error: {e}")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Long-running worker for NOTIFY_OUTBOX=1: delivers queued digests, retrying
+failed sends with exponential backoff, so slow or flaky email/SMS providers
+never hold up polling and matching. Replicas lease disjoint batches, so
+several can drain one outbox.
+"""
+import os
+import socket
+import time
+import uuid
+
+from persistence.db import get_conn, init_db
+from persistence.repositories import OutboxRepository
+from notification.service import NotificationService
+from notification.runner import drain_outbox
+from bin.poll_once import (ConsoleSender, build_edit_link,
+                           build_unsubscribe_link)
+
+
+def main():
+    conn = get_conn(os.getenv("DB_PATH") or "db.sqlite3")
+    init_db(conn)
+    outbox = OutboxRepository(conn)
+
+    notifier = NotificationService(
+        ConsoleSender(),
+        edit_link_builder=build_edit_link,
+        unsubscribe_link_builder=build_unsubscribe_link)
+
+    max_attempts = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+    backoff = float(os.getenv("OUTBOX_BACKOFF_SECONDS", "30"))
+    interval = float(os.getenv("OUTBOX_DRAIN_INTERVAL", "1.0"))
+    lease = float(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+    owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    while True:
+        try:
+            stats = drain_outbox(outbox,
+                                 notifier,
+                                 max_attempts=max_attempts,
+                                 backoff_seconds=backoff,
+                                 owner=owner,
+                                 lease_seconds=lease)
+            if stats["delivered"] or stats["retried"] or stats["failed"]:
+                print("[outbox] stats:", stats)
+        except Exception as e:
+            print(f"[outbox] drain error: {e}")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    main()
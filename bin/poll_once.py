@@ -1,15 +1,16 @@
 import os
 import socket
 import uuid
+from datetime import timedelta
+from typing import Optional
 
 from persistence.db import get_conn, init_db
-from persistence.repositories import RepoStateRepository, SentNotificationsRepository, UserRepository
-from persistence.lock import acquire_lock
+from persistence.repositories import RepoStateRepository, SentNotificationsRepository, UserRepository, RepoConfigRepository, EnrichmentQueueRepository, OutboxRepository, SeenListingsRepository, UserShardRepository
 from notification.service import NotificationService
-from notification.orchestrator import run_poll_for_repo, NEW_GRAD_REPO, INTERNSHIP_REPO
-from notification.users import hydrate_users
+from notification.runner import run_all_repos_once, drain_user_shards
 from job_scraper.scraper import JobScraper
-from github_poller.poller import GithubPoller
+from job_scraper.cache import DescriptionCache
+from github_poller.scheduler import AdaptivePollScheduler
 from api.security import make_token
 from common.models import UserContact
 
@@ -35,6 +36,20 @@ class ConsoleSender:
         print(f"[SMS → {to_number}] {text_body}\n")
 
 
+# Pre-repos-table overrides for the seeded repos; REPOS_CONFIG replaces them
+LEGACY_BRANCH_ENV = {"new_grad": "NG_BRANCH", "internship": "INTERN_BRANCH"}
+
+
+def apply_legacy_branch_env(repo_config_repo: RepoConfigRepository) -> None:
+    for key, var in LEGACY_BRANCH_ENV.items():
+        branch = os.getenv(var)
+        if not branch:
+            continue
+        print(f"[config] {var} is deprecated; set the branch of '{key}' "
+              f"in REPOS_CONFIG instead")
+        repo_config_repo.set_branch(key, branch)
+
+
 def build_edit_link(user: UserContact) -> str:
     base = os.getenv("APP_BASE_URL", "http://localhost:8000")
     token = make_token({"purpose": "edit", "uid": user.id})
@@ -47,66 +62,116 @@ def build_unsubscribe_link(user: UserContact) -> str:
     return f"{base}/unsubscribe?token={token}"
 
 
+def build_scraper() -> JobScraper:
+    # Description cache on by default; DESC_CACHE=0 disables it
+    cache = None
+    if os.getenv("DESC_CACHE", "1") == "1":
+        cache = DescriptionCache(
+            os.getenv("DESC_CACHE_PATH") or "desc_cache.sqlite3",
+            max_bytes=int(os.getenv("DESC_CACHE_MAX_BYTES", 64 * 1024 * 1024)))
+    return JobScraper(
+        cache=cache,
+        use_headless_fallback=False,
+        extract_workers=int(os.getenv("EXTRACT_WORKERS", "4")),
+        extract_executor=os.getenv("EXTRACT_EXECUTOR", "thread"))
+
+
+def build_user_shards(conn) -> Optional[UserShardRepository]:
+    # USER_SHARDS=N (N > 1): pollers write job batches and every replica
+    # (poll_once, webhook_worker, shard_worker) fans them out by user shard
+    n_shards = int(os.getenv("USER_SHARDS", "1"))
+    return UserShardRepository(conn, n_shards) if n_shards > 1 else None
+
+
 def main():
     conn = get_conn(os.getenv("DB_PATH") or "db.sqlite3")
     init_db(conn)
     user_repo = UserRepository(conn)
     state_repo = RepoStateRepository(conn)
     sent_repo = SentNotificationsRepository(conn)
+    repo_config_repo = RepoConfigRepository(conn)
+
+    apply_legacy_branch_env(repo_config_repo)
 
-    rows = user_repo.list_verified_users()
-    users = hydrate_users(rows)
+    # Optional JSON file of extra/overridden repos (synced into the repos table)
+    repos_config = os.getenv("REPOS_CONFIG")
+    if repos_config:
+        repo_config_repo.load_file(repos_config)
 
     sender = ConsoleSender()
     notifier = NotificationService(
         sender,
         edit_link_builder=build_edit_link,
         unsubscribe_link_builder=build_unsubscribe_link)
-    scraper = JobScraper(cache=None, use_headless_fallback=False)
+    scraper = build_scraper()
 
     token = get_github_token() or ""
 
-    NG_BRANCH = os.getenv("NG_BRANCH", "dev")
-    INTERN_BRANCH = os.getenv("INTERN_BRANCH", "dev")
-
-    ng = GithubPoller("SimplifyJobs",
-                      "New-Grad-Positions",
-                      token=token,
-                      branch=NG_BRANCH)
-    internships = GithubPoller("SimplifyJobs",
-                               "Summer2026-Internships",
-                               token=token,
-                               branch=INTERN_BRANCH)
-
     locker_owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
 
-    # Run each repo under its own lock to avoid double-processing
-    for label, repo_name, poller in [
-        ("NG", NEW_GRAD_REPO, ng),
-        ("Intern", INTERNSHIP_REPO, internships),
-    ]:
-        lock_name = f"poller:{repo_name}"
-        # Hold the lock up to 120s; skip if unable to get it quickly
-        from_time = "start"
-        with acquire_lock(conn,
-                          name=lock_name,
-                          owner=locker_owner,
-                          ttl_seconds=120) as ok:
-            if not ok:
-                print(f"[{label}] Another instance holds the lock; skipping.")
-                continue
-
-            stats = run_poll_for_repo(
-                repo_name=repo_name,
-                repo_label="New Grad" if label == "NG" else "Internships",
-                poller=poller,
-                users=users,
-                sent_repo=sent_repo,
-                state_repo=state_repo,
-                notifier=notifier,
-                scraper=scraper,
-            )
-            print(f"[{label}] stats:", stats)
+    # Cron ticks often; the adaptive scheduler decides which repos are due.
+    # POLL_ADAPTIVE=0 restores "poll every repo on every run".
+    scheduler = (AdaptivePollScheduler.from_env()
+                 if os.getenv("POLL_ADAPTIVE", "1") == "1" else None)
+
+    # TWO_PHASE_NOTIFY=1: send listing-field matches now and leave scraping to
+    # bin/enrich_worker.py
+    enrichment_queue = (EnrichmentQueueRepository(conn)
+                        if os.getenv("TWO_PHASE_NOTIFY", "0") == "1" else None)
+
+    # NOTIFY_OUTBOX=1: queue digests with their dedupe marks and leave delivery
+    # to bin/outbox_worker.py
+    outbox = (OutboxRepository(conn)
+              if os.getenv("NOTIFY_OUTBOX", "0") == "1" else None)
+
+    # SEEN_LISTINGS=0 disables the ledger that skips listings already processed
+    seen_listings = (SeenListingsRepository(conn)
+                     if os.getenv("SEEN_LISTINGS", "1") == "1" else None)
+    if seen_listings is not None:
+        # Entries not re-recorded for SEEN_LISTINGS_MAX_AGE_DAYS are dropped
+        max_age = float(os.getenv("SEEN_LISTINGS_MAX_AGE_DAYS", "30"))
+        seen_listings.prune(timedelta(days=max_age))
+
+    user_shards = build_user_shards(conn)
+
+    # COMBINE_REPO_DIGESTS=1: one message per user per channel for the whole run
+    combine_repos = os.getenv("COMBINE_REPO_DIGESTS", "0") == "1"
+
+    # Scraping gives up well inside the 10-minute SIGALRM so the SHA still advances
+    enrich_deadline = float(os.getenv("ENRICH_DEADLINE_SECONDS", "240"))
+
+    # All configured repos run concurrently, each under its own lock
+    stats = run_all_repos_once(user_repo=user_repo,
+                               state_repo=state_repo,
+                               sent_repo=sent_repo,
+                               notifier=notifier,
+                               scraper=scraper,
+                               github_token=token,
+                               repo_configs=repo_config_repo.list_repos(),
+                               lock_owner=locker_owner,
+                               scheduler=scheduler,
+                               enrichment_queue=enrichment_queue,
+                               enrich_deadline=enrich_deadline,
+                               outbox=outbox,
+                               combine_repos=combine_repos,
+                               seen_listings=seen_listings,
+                               user_shards=user_shards)
+    scraper.close()
+    for repo_name, repo_stats in stats.items():
+        print(f"[{repo_name}] stats:", repo_stats)
+    if user_shards is not None:
+        # Take a share of the fan-out; bin/shard_worker.py replicas do the rest
+        shard_budget = float(os.getenv("SHARD_BUDGET_SECONDS", "120"))
+        print("[shards] stats:",
+              drain_user_shards(
+                  user_shards,
+                  user_repo,
+                  sent_repo,
+                  notifier,
+                  locker_owner,
+                  outbox=outbox,
+                  lease_seconds=int(os.getenv("SHARD_LEASE_SECONDS", "120")),
+                  budget_seconds=shard_budget))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,57 @@
+"""
+Long-running worker for USER_SHARDS=N: fans pollers' job batches out to
+user shards, leasing one shard at a time. Run as many replicas as needed;
+each takes whichever shards are free.
+"""
+import os
+import socket
+import time
+import uuid
+
+from persistence.db import get_conn, init_db
+from persistence.repositories import (SentNotificationsRepository,
+                                      UserRepository, OutboxRepository)
+from notification.service import NotificationService
+from notification.runner import drain_user_shards
+from bin.poll_once import (ConsoleSender, build_edit_link,
+                           build_unsubscribe_link, build_user_shards)
+
+
+def main():
+    conn = get_conn(os.getenv("DB_PATH") or "db.sqlite3")
+    init_db(conn)
+    user_shards = build_user_shards(conn)
+    if user_shards is None:
+        raise SystemExit("USER_SHARDS must be greater than 1")
+    user_repo = UserRepository(conn)
+    sent_repo = SentNotificationsRepository(conn)
+    outbox = (OutboxRepository(conn)
+              if os.getenv("NOTIFY_OUTBOX", "0") == "1" else None)
+
+    notifier = NotificationService(
+        ConsoleSender(),
+        edit_link_builder=build_edit_link,
+        unsubscribe_link_builder=build_unsubscribe_link)
+
+    lease = int(os.getenv("SHARD_LEASE_SECONDS", "120"))
+    interval = float(os.getenv("SHARD_DRAIN_INTERVAL", "1.0"))
+    owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    while True:
+        try:
+            stats = drain_user_shards(user_shards,
+                                      user_repo,
+                                      sent_repo,
+                                      notifier,
+                                      owner,
+                                      outbox=outbox,
+                                      lease_seconds=lease)
+            if stats["shards_processed"]:
+                print("[shards] stats:", stats)
+        except Exception as e:
+            print(f"[shards] drain error: {e}")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Long-running worker that drains the webhook queue as soon as pushes arrive.
+bin/poll_once.py stays on cron as a safety net for missed deliveries.
+"""
+import os
+import socket
+import time
+import uuid
+
+from persistence.db import get_conn, init_db
+from persistence.repositories import (RepoStateRepository,
+                                      SentNotificationsRepository,
+                                      UserRepository, WebhookEventRepository,
+                                      EnrichmentQueueRepository,
+                                      OutboxRepository,
+                                      SeenListingsRepository)
+from notification.service import NotificationService
+from notification.runner import drain_webhook_queue, drain_user_shards
+from bin.poll_once import (ConsoleSender, build_edit_link,
+                           build_unsubscribe_link, get_github_token,
+                           build_scraper, build_user_shards)
+
+
+def main():
+    conn = get_conn(os.getenv("DB_PATH") or "db.sqlite3")
+    init_db(conn)
+    webhook_repo = WebhookEventRepository(conn)
+    user_repo = UserRepository(conn)
+    state_repo = RepoStateRepository(conn)
+    sent_repo = SentNotificationsRepository(conn)
+
+    notifier = NotificationService(
+        ConsoleSender(),
+        edit_link_builder=build_edit_link,
+        unsubscribe_link_builder=build_unsubscribe_link)
+    scraper = build_scraper()
+    token = get_github_token() or ""
+    enrichment_queue = (EnrichmentQueueRepository(conn)
+                        if os.getenv("TWO_PHASE_NOTIFY", "0") == "1" else None)
+    outbox = (OutboxRepository(conn)
+              if os.getenv("NOTIFY_OUTBOX", "0") == "1" else None)
+    seen_listings = (SeenListingsRepository(conn)
+                     if os.getenv("SEEN_LISTINGS", "1") == "1" else None)
+    user_shards = build_user_shards(conn)
+
+    enrich_deadline = float(os.getenv("ENRICH_DEADLINE_SECONDS", "240"))
+    interval = float(os.getenv("WEBHOOK_DRAIN_INTERVAL", "1.0"))
+    owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    while True:
+        try:
+            stats = drain_webhook_queue(webhook_repo,
+                                        user_repo,
+                                        state_repo,
+                                        sent_repo,
+                                        notifier,
+                                        scraper,
+                                        github_token=token,
+                                        lock_owner=owner,
+                                        enrichment_queue=enrichment_queue,
+                                        enrich_deadline=enrich_deadline,
+                                        outbox=outbox,
+                                        seen_listings=seen_listings,
+                                        user_shards=user_shards)
+            for repo_name, s in stats.items():
+                print(f"[webhook] {repo_name} stats:", s)
+            if user_shards is not None:
+                s = drain_user_shards(user_shards,
+                                      user_repo,
+                                      sent_repo,
+                                      notifier,
+                                      owner,
+                                      outbox=outbox)
+                if s["shards_processed"]:
+                    print("[webhook] shard stats:", s)
+        except Exception as e:
+            print(f"[webhook] drain error: {e}")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import List, Optional
+from dataclasses import dataclass, field
+from typing import FrozenSet, List, Optional
 
 
 @dataclass
@@ -17,7 +17,8 @@ class JobListing:
     company_url: Optional[str] = None
     is_visible: Optional[bool] = None
     category: Optional[str] = None
-    description: Optional[str] = None
+    description: Optional[str] = None  # Capped excerpt once enriched
+    tags: Optional[FrozenSet[str]] = None  # Canonical tags from the full text
 
 
 @dataclass
@@ -28,6 +29,8 @@ class UserPreferences:
     tech_keywords: List[str]  # e.g. ["spring boot", "postgres"]
     role_keywords: List[str]  # e.g. ["backend", "qa"]
     location_keywords: List[str]  # e.g. ["new york", "canada"]
+    subscribed_repos: List[str] = field(
+        default_factory=list)  # RepoConfig keys, e.g. ["new_grad"]
 
 
 @dataclass
@@ -39,3 +42,29 @@ class UserContact:
     notify_email: bool
     notify_sms: bool
     prefs: UserPreferences
+
+
+@dataclass
+class RepoConfig:
+    key: str  # Subscription key, e.g. "new_grad"
+    owner: str
+    repo: str
+    branch: str = "dev"
+    label: str = ""  # Shown in message subjects, e.g. "New Grad"
+    enabled: bool = True
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.owner}/{self.repo}"
+
+
+@dataclass
+class OutgoingMessage:
+    """One rendered email or SMS, as stored in the notification outbox."""
+    user_id: str
+    channel: str  # "email" or "sms"
+    to_addr: str
+    text_body: str
+    idempotency_key: str  # Same digest + channel -> same key across retries
+    subject: Optional[str] = None
+    html_body: Optional[str] = None
@@ -0,0 +1,161 @@
+"""
+Canonical tech / role / seniority tags pulled out of job descriptions at
+enrichment time, so matching is a set lookup instead of a substring scan of
+the full page text. Each canonical tag lists its synonyms; matching is
+case-insensitive on whole words ("go" doesn't hit "google"). Words too generic
+to mean a skill on their own ("spring", "rest", "platform") are left out.
+
+User keywords the dictionary doesn't cover are passed to extract_tags as
+`terms`, so they're also looked up in the full text rather than the excerpt.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+# Description text kept on a listing after tags are extracted
+EXCERPT_CHARS = 2000
+
+TECH_TAGS: Dict[str, List[str]] = {
+    "python": ["python3"],
+    "java": [],
+    "javascript": ["js", "ecmascript"],
+    "typescript": [],
+    "go": ["golang"],
+    "rust": [],
+    "c++": ["cpp"],
+    "c#": ["csharp"],
+    "ruby": ["rails", "ruby on rails"],
+    "kotlin": [],
+    "swift": [],
+    "scala": [],
+    "php": [],
+    "sql": [],
+    "postgresql": ["postgres", "psql"],
+    "mysql": [],
+    "mongodb": ["mongo"],
+    "redis": [],
+    "kafka": ["apache kafka"],
+    "spark": ["apache spark", "pyspark"],
+    "airflow": ["apache airflow"],
+    "snowflake": [],
+    "elasticsearch": ["elastic search"],
+    "aws": ["amazon web services"],
+    "gcp": ["google cloud", "google cloud platform"],
+    "azure": ["microsoft azure"],
+    "docker": [],
+    "kubernetes": ["k8s"],
+    "terraform": [],
+    "linux": ["unix"],
+    "react": ["react.js", "reactjs"],
+    "angular": ["angularjs"],
+    "vue": ["vue.js", "vuejs"],
+    "node.js": ["nodejs"],
+    "django": [],
+    "flask": [],
+    "fastapi": [],
+    "spring boot": ["springboot"],
+    "spring framework": ["spring mvc"],
+    ".net": ["dotnet", "asp.net"],
+    "graphql": [],
+    "grpc": [],
+    "rest api": ["restful", "rest apis", "restful api", "restful apis"],
+    "microservices": ["microservice"],
+    "ci/cd": ["cicd", "continuous integration"],
+    "machine learning": ["ml"],
+    "deep learning": [],
+    "pytorch": ["torch"],
+    "tensorflow": [],
+    "llm": ["llms", "large language models", "large language model"],
+    "nlp": ["natural language processing"],
+    "computer vision": [],
+    "ios": [],
+    "android": [],
+    "embedded": ["embedded systems"],
+    "fpga": [],
+    "verilog": ["systemverilog"],
+    "matlab": [],
+    "tableau": [],
+}
+
+ROLE_TAGS: Dict[str, List[str]] = {
+    "backend": ["back-end", "back end"],
+    "frontend": ["front-end", "front end"],
+    "full stack": ["fullstack", "full-stack"],
+    "devops": ["dev ops"],
+    "sre": ["site reliability", "site reliability engineering"],
+    "data engineering": ["data engineer", "data pipelines"],
+    "data science": ["data scientist"],
+    "qa": ["quality assurance", "test engineer", "sdet"],
+    "security": ["cybersecurity", "infosec", "application security"],
+    "mobile": [],
+    "infrastructure": ["infra"],
+    "platform engineering": ["platform engineer"],
+    "firmware": [],
+    "distributed systems": [],
+}
+
+SENIORITY_TAGS: Dict[str, List[str]] = {
+    "intern": ["internship", "co-op"],
+    "new grad": ["new graduate", "recent graduate", "university graduate"],
+    "entry level": ["entry-level", "junior"],
+    "senior": ["sr."],
+    "staff": [],
+    "principal": [],
+}
+
+
+def _build_synonyms() -> Dict[str, str]:
+    out = {}
+    for table in (TECH_TAGS, ROLE_TAGS, SENIORITY_TAGS):
+        for tag, synonyms in table.items():
+            out[tag] = tag
+            for syn in synonyms:
+                out.setdefault(syn, tag)
+    return out
+
+
+SYNONYMS: Dict[str, str] = _build_synonyms()
+
+# One alternation over every phrase, longest first so "spring boot" beats
+# "spring"; the guards stop "go" matching inside "google" or "c++" inside "c++x"
+_TAG_RE = re.compile(
+    r"(?<![\w+#.])(" +
+    "|".join(re.escape(p) for p in sorted(SYNONYMS, key=len, reverse=True)) +
+    r")(?![\w+#])")
+
+
+def _norm(s: str) -> str:
+    return " ".join(s.lower().split())
+
+
+def extract_tags(text: Optional[str],
+                 terms: Iterable[str] = ()) -> FrozenSet[str]:
+    """
+    Canonical tags in `text`, plus each of `terms` (see uncovered_terms) it
+    contains, found the way the matcher scans text: as a substring.
+    """
+    if not text:
+        return frozenset()
+    text = _norm(text)
+    tags = {SYNONYMS[m] for m in _TAG_RE.findall(text)}
+    tags.update(t for t in terms if t in text)
+    return frozenset(tags)
+
+
+@lru_cache(maxsize=4096)
+def canonical_tag(keyword: str) -> Optional[str]:
+    """The tag a user keyword stands for ("k8s" -> "kubernetes"), if any."""
+    return SYNONYMS.get(_norm(keyword))
+
+
+def uncovered_terms(keywords: Iterable[str]) -> FrozenSet[str]:
+    """Normalized keywords with no canonical tag ("haskell", "rest")."""
+    return frozenset(
+        _norm(k) for k in keywords
+        if k and _norm(k) and canonical_tag(k) is None)
+
+
+def excerpt(text: Optional[str], limit: int = EXCERPT_CHARS) -> Optional[str]:
+    if text is None or len(text) <= limit:
+        return text
+    return text[:limit]
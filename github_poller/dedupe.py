@@ -0,0 +1,96 @@
+"""
+Run-level deduplication of parsed listings. A catch-up run can see the same
+listing in several commits (edits re-add the whole object) and in more than
+one repo; copies are keyed by listing id, or by a hash of the canonical URL
+for listings without one.
+"""
+import asyncio
+import hashlib
+import json
+from dataclasses import asdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from common.models import JobListing
+
+# Query parameters that only track where a click came from
+_TRACKING_PARAMS = ("utm_", "gh_src", "ref", "source", "lever-origin")
+
+
+def canonical_url(url: str) -> str:
+    """Lowercased scheme/host, no fragment, tracking params or trailing slash."""
+    parts = urlsplit(url.strip())
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if not k.lower().startswith(_TRACKING_PARAMS)]
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(),
+                       parts.path.rstrip("/"), urlencode(sorted(query)), ""))
+
+
+def listing_key(job: JobListing) -> str:
+    if job.id:
+        return f"id:{job.id}"
+    digest = hashlib.sha1(canonical_url(job.url).encode()).hexdigest()[:16]
+    return f"url:{digest}"
+
+
+def content_hash(job: JobListing) -> str:
+    """
+    Hash of the listing's own fields, so an edit that changes what's listed
+    (title, locations, active, ...) shows up as new content. Enrichment
+    output and the date_updated bump alone don't count.
+    """
+    fields = asdict(job)
+    for name in ("description", "tags", "date_updated"):
+        fields.pop(name, None)
+    blob = json.dumps(fields, sort_keys=True, default=sorted)
+    return hashlib.sha1(blob.encode()).hexdigest()[:16]
+
+
+def _version(job: JobListing) -> int:
+    return job.date_updated or job.date_posted or 0
+
+
+def newest_per_key(jobs: List[JobListing]) -> Tuple[List[JobListing], int]:
+    """
+    One listing per key, the most recently updated (ties keep the first),
+    in first-seen order. Returns (listings, duplicates dropped).
+    """
+    kept: Dict[str, JobListing] = {}
+    for job in jobs:
+        key = listing_key(job)
+        if key not in kept or _version(job) > _version(kept[key]):
+            kept[key] = job
+    return list(kept.values()), len(jobs) - len(kept)
+
+
+class RunListings:
+    """
+    Listings parsed and fetched so far in one run, shared by every repo in
+    it (on one event loop): the first repo to enrich a listing fetches it,
+    and any other repo waits for that fetch and reuses its description and
+    tags instead of fetching the page again.
+    """
+
+    def __init__(self):
+        self._fetches: Dict[str, asyncio.Future] = {}
+        self._seen_by: Dict[str, str] = {}  # key -> first repo that parsed it
+
+    def seen_elsewhere(self, key: str, repo_name: str) -> bool:
+        """Record that `repo_name` parsed `key`; True if another repo did first."""
+        return self._seen_by.setdefault(key, repo_name) != repo_name
+
+    def claim(self, key: str) -> Optional[asyncio.Future]:
+        """
+        None if the caller should fetch `key` (and then call done()), else a
+        future resolving to the listing another repo fetched.
+        """
+        fut = self._fetches.get(key)
+        if fut is None:
+            self._fetches[key] = asyncio.get_running_loop().create_future()
+        return fut
+
+    def done(self, key: str, job: JobListing) -> None:
+        """Publish the fetched listing (description None if it failed)."""
+        fut = self._fetches.get(key)
+        if fut is not None and not fut.done():
+            fut.set_result(job)
@@ -1,5 +1,7 @@
-from typing import Iterable
+import heapq
+from typing import Iterable, List, Optional
 from common.models import JobListing, UserPreferences
+from common.tags import canonical_tag
 
 
 def _norm(s: str) -> str:
@@ -14,6 +16,44 @@ def _any_keyword_in_text(keywords: Iterable[str], text: str) -> bool:
     return False
 
 
+def _description_text(job: JobListing) -> str:
+    return _norm(job.description or "")
+
+
+class _ListingText:
+    """A listing's normalized title/company, and description once needed."""
+
+    def __init__(self, job: JobListing):
+        self.job = job
+        self.head = _norm(f"{job.title} {job.company_name}")
+        self._description: Optional[str] = None
+
+    def has(self, keyword: str) -> bool:
+        kw = _norm(keyword) if keyword else ""
+        if not kw:
+            return False
+        tags = self.job.tags
+        if tags is not None:
+            # Known keywords hit the tags of an enriched listing (synonyms
+            # included), as do other keywords enrichment looked for in the
+            # full text (see uncovered_terms)
+            tag = canonical_tag(keyword)
+            if (tag or kw) in tags:
+                return True
+            if tag is not None:
+                # Tagged from the whole page, so it isn't in the excerpt
+                return kw in self.head
+        if kw in self.head:
+            return True
+        if self._description is None:
+            self._description = _description_text(self.job)
+        return kw in self._description
+
+
+def _any_keyword_in_job(keywords: Iterable[str], text: _ListingText) -> bool:
+    return any(text.has(kw) for kw in keywords)
+
+
 def _locations_match(job_locations: Iterable[str],
                      location_keywords: Iterable[str]) -> bool:
     # Require at least one keyword to be contained in at least one job location
@@ -33,6 +73,26 @@ def _locations_match(job_locations: Iterable[str],
 
 class MatchingEngine:
 
+    @staticmethod
+    def cheap_match(job: JobListing,
+                    prefs: UserPreferences) -> Optional[bool]:
+        """
+        matches() decided from title/company/locations alone, or None when the
+        answer still depends on the description.
+        """
+        if prefs.receive_all:
+            return True
+        if not _locations_match(job.locations, prefs.location_keywords):
+            return False
+        if not prefs.role_keywords and not prefs.tech_keywords:
+            return True
+        blob = f"{job.title} {job.company_name}".lower()
+        if _any_keyword_in_text(prefs.role_keywords, blob):
+            return True
+        if _any_keyword_in_text(prefs.tech_keywords, blob):
+            return True
+        return None
+
     @staticmethod
     def matches(job: JobListing, prefs: UserPreferences) -> bool:
         # 0) Match everything if user opted in
@@ -43,16 +103,16 @@ class MatchingEngine:
         if not _locations_match(job.locations, prefs.location_keywords):
             return False
 
-        # 2) Build searchable blob for role/tech
-        desc = (job.description or "")
-        blob = f"{job.title} {job.company_name} {desc}".lower()
+        # 2) Searchable title/company/description for role/tech; an enriched
+        #    listing's tags decide known keywords without the description
+        text = _ListingText(job)
 
         # 3) Role keyword match
-        if _any_keyword_in_text(prefs.role_keywords, blob):
+        if _any_keyword_in_job(prefs.role_keywords, text):
             return True
 
         # 4) Tech keyword match
-        if _any_keyword_in_text(prefs.tech_keywords, blob):
+        if _any_keyword_in_job(prefs.tech_keywords, text):
             return True
 
         # 5) If user provided role/tech lists and none matched, it's a no.
@@ -61,3 +121,40 @@ class MatchingEngine:
             return True
 
         return False
+
+    @staticmethod
+    def keyword_hits(job: JobListing, prefs: UserPreferences) -> int:
+        """
+        How many of the user's role, tech and location keywords the job hits
+        (each counted once), as a strength for ranking matches.
+        """
+        text = _ListingText(job)
+        hits = 0
+        for kw in (*prefs.role_keywords, *prefs.tech_keywords):
+            if text.has(kw):
+                hits += 1
+        for kw in prefs.location_keywords:
+            if kw and _locations_match(job.locations, [kw]):
+                hits += 1
+        return hits
+
+
+def rank_matches(jobs: List[JobListing],
+                 prefs: UserPreferences,
+                 k: Optional[int] = None) -> List[JobListing]:
+    """
+    The `k` best of a user's matched `jobs` (all if k is None), best first:
+    most keyword hits, then most recently updated, then input order. A heap
+    keeps this O(n log k) when a catch-up run matches hundreds of jobs.
+    """
+
+    def key(i: int):
+        job = jobs[i]
+        return (MatchingEngine.keyword_hits(job, prefs), job.date_updated
+                or job.date_posted or 0, -i)
+
+    if k is None or k >= len(jobs):
+        order = sorted(range(len(jobs)), key=key, reverse=True)
+    else:
+        order = heapq.nlargest(k, range(len(jobs)), key=key)
+    return [jobs[i] for i in order]
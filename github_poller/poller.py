@@ -1,5 +1,6 @@
+import os
 import time
-from typing import Tuple, List
+from typing import Iterator, Tuple, List
 import requests
 from requests.adapters import HTTPAdapter, Retry
 
@@ -7,6 +8,7 @@ from github_poller.parser import DiffParser
 from common.models import JobListing
 
 DEFAULT_TIMEOUT = (5, 20)  # (connect, read) seconds
+DEFAULT_API_BASE = "https://api.github.com"
 
 
 def _timed_get(session: requests.Session, url: str,
@@ -21,10 +23,19 @@ def _timed_get(session: requests.Session, url: str,
 
 class GithubPoller:
 
-    def __init__(self, owner: str, repo: str, token: str, branch: str = "dev"):
+    def __init__(self,
+                 owner: str,
+                 repo: str,
+                 token: str,
+                 branch: str = "dev",
+                 api_base: str = ""):
         self.owner = owner
         self.repo = repo
         self.branch = branch
+        self.last_commit_count = 0  # Commits seen by the last fetch_new_listings
+        # GITHUB_API_URL lets GHE installs (or a local stand-in) replace api.github.com
+        self.api_base = (api_base or os.getenv("GITHUB_API_URL")
+                         or DEFAULT_API_BASE).rstrip("/")
 
         self.headers = {
             "Accept": "application/vnd.github.v3+json",
@@ -50,7 +61,7 @@ class GithubPoller:
         """
     Returns newest-first list of SHAs that are newer than `since_sha`.
     """
-        url = f"https://api.github.com/repos/{self.owner}/{self.repo}/commits"
+        url = f"{self.api_base}/repos/{self.owner}/{self.repo}/commits"
         params = {"sha": self.branch, "per_page": 100}
         resp = _timed_get(self.session,
                           url,
@@ -72,7 +83,7 @@ class GithubPoller:
         """
     Returns the patch for .github/scripts/listings.json split into lines.
     """
-        url = f"https://api.github.com/repos/{self.owner}/{self.repo}/commits/{sha}"
+        url = f"{self.api_base}/repos/{self.owner}/{self.repo}/commits/{sha}"
         resp = _timed_get(self.session, url, headers=self.headers)
         resp.raise_for_status()
         data = resp.json()
@@ -82,26 +93,36 @@ class GithubPoller:
                 return file["patch"].splitlines()
         return []
 
-    def fetch_new_listings(self,
-                           since_sha: str) -> Tuple[List[JobListing], str]:
+    def commit_diffs(self,
+                     since_sha: str) -> Tuple[Iterator[List[str]], str]:
+        """
+        Lazy form of fetch_new_listings: returns (diffs, latest_sha), where
+        each commit's diff is only fetched when `diffs` reaches it.
         """
-    Returns (all_new_listings, latest_sha).
-    """
         try:
             new_shas = self.get_new_commits(since_sha)
         except requests.RequestException as e:
             print(f"[poller] error get_new_commits: {e}")
-            return [], since_sha
+            return iter(()), since_sha
+        self.last_commit_count = len(new_shas)
 
-        all_jobs: List[JobListing] = []
-        for sha in new_shas:
-            try:
-                diff = self.get_commit_diff(sha)
-            except requests.RequestException as e:
-                print(f"[poller] error get_commit_diff {sha}: {e}")
-                continue
-            jobs = DiffParser.parse_added_listings(diff)
-            all_jobs.extend(jobs)
+        def diffs() -> Iterator[List[str]]:
+            for sha in new_shas:
+                try:
+                    yield self.get_commit_diff(sha)
+                except requests.RequestException as e:
+                    print(f"[poller] error get_commit_diff {sha}: {e}")
 
         latest_sha = new_shas[0] if new_shas else since_sha
+        return diffs(), latest_sha
+
+    def fetch_new_listings(self,
+                           since_sha: str) -> Tuple[List[JobListing], str]:
+        """
+    Returns (all_new_listings, latest_sha).
+    """
+        diffs, latest_sha = self.commit_diffs(since_sha)
+        all_jobs: List[JobListing] = []
+        for diff in diffs:
+            all_jobs.extend(DiffParser.parse_added_listings(diff))
         return all_jobs, latest_sha
@@ -0,0 +1,103 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any
+
+
+@dataclass
+class PollDecision:
+    next_poll_at: datetime
+    interval_seconds: float
+    reason: str
+    rate_per_hour: float  # Smoothed commit arrival rate
+    idle_polls: int  # Consecutive polls that found no commits
+
+
+def _parse_iso(s: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(s) if s else None
+
+
+class AdaptivePollScheduler:
+    """
+    Picks the next poll time per repo from its observed commit rate.
+
+    - Active (new commits seen): aim for ~1 commit per poll, i.e. an interval of
+      3600 / rate seconds, never slower than `base_interval`.
+    - Idle: multiply the previous interval by `backoff` each empty poll.
+    Intervals are always clamped to [min_interval, max_interval].
+
+    The rate is an EWMA of commits/hour samples, kept in repo_state between runs.
+    """
+
+    def __init__(self,
+                 min_interval: float = 60,
+                 max_interval: float = 3600,
+                 base_interval: float = 900,
+                 backoff: float = 2.0,
+                 smoothing: float = 0.3):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.base_interval = base_interval
+        self.backoff = backoff
+        self.smoothing = smoothing
+
+    @classmethod
+    def from_env(cls) -> "AdaptivePollScheduler":
+        return cls(
+            min_interval=float(os.getenv("POLL_MIN_INTERVAL_SECONDS", "60")),
+            max_interval=float(os.getenv("POLL_MAX_INTERVAL_SECONDS",
+                                         "3600")),
+            base_interval=float(
+                os.getenv("POLL_BASE_INTERVAL_SECONDS", "900")),
+            backoff=float(os.getenv("POLL_BACKOFF_FACTOR", "2.0")),
+        )
+
+    def _clamp(self, seconds: float) -> float:
+        return max(self.min_interval, min(self.max_interval, seconds))
+
+    def is_due(self,
+               state: Optional[Dict[str, Any]],
+               now: Optional[datetime] = None) -> bool:
+        """A repo with no schedule yet is always due."""
+        now = now or datetime.now(timezone.utc)
+        next_at = _parse_iso((state or {}).get("next_poll_at"))
+        return next_at is None or now >= next_at
+
+    def next_poll(self,
+                  state: Optional[Dict[str, Any]],
+                  commits_seen: int,
+                  now: Optional[datetime] = None) -> PollDecision:
+        now = now or datetime.now(timezone.utc)
+        state = state or {}
+        prev_rate = float(state.get("commit_rate_per_hour") or 0.0)
+        prev_interval = float(
+            state.get("interval_seconds") or self.base_interval)
+        idle_polls = int(state.get("idle_polls") or 0)
+
+        last_polled = _parse_iso(state.get("last_polled_at"))
+        elapsed = ((now - last_polled).total_seconds()
+                   if last_polled else prev_interval)
+        sample = commits_seen / max(elapsed / 3600.0, 1e-6)
+        rate = (self.smoothing * sample +
+                (1 - self.smoothing) * prev_rate if last_polled else sample)
+
+        if commits_seen > 0:
+            idle_polls = 0
+            # Bursts push the sample well above the average; react to it now
+            effective = max(rate, sample)
+            interval = self._clamp(
+                min(self.base_interval, 3600.0 / effective))
+            reason = (f"active: {commits_seen} new commit(s), "
+                      f"~{effective:.1f}/h")
+        else:
+            idle_polls += 1
+            interval = self._clamp(prev_interval * self.backoff)
+            reason = f"idle x{idle_polls}: backing off"
+        if interval in (self.min_interval, self.max_interval):
+            reason += " (at bound)"
+
+        return PollDecision(next_poll_at=now + timedelta(seconds=interval),
+                            interval_seconds=interval,
+                            reason=reason,
+                            rate_per_hour=rate,
+                            idle_polls=idle_polls)
@@ -0,0 +1,34 @@
+from common.models import JobListing
+from github_poller.dedupe import canonical_url, listing_key, newest_per_key
+
+
+def _job(id, url="https://ex.com/1", date_updated=None):
+    return JobListing(id=id,
+                      date_posted=0,
+                      url=url,
+                      company_name="Acme",
+                      title="Software Engineer",
+                      locations=["Remote"],
+                      sponsorship="None",
+                      active=True,
+                      date_updated=date_updated)
+
+
+def test_canonical_url_drops_tracking_and_formatting():
+    assert canonical_url(
+        "HTTPS://Jobs.Ex.com/apply/42/?utm_source=simplify&b=2&a=1#top"
+    ) == "https://jobs.ex.com/apply/42?a=1&b=2"
+    assert canonical_url("https://ex.com/42?ref=gh") == "https://ex.com/42"
+
+
+def test_listing_key_prefers_id_then_url():
+    assert listing_key(_job("abc")) == "id:abc"
+    a = _job("", url="https://ex.com/42/?utm_medium=x")
+    b = _job("", url="https://EX.com/42")
+    assert listing_key(a) == listing_key(b) != listing_key(_job("", "https://ex.com/43"))
+
+
+def test_newest_per_key_keeps_latest_update_in_first_seen_order():
+    old, other, new = _job("1", date_updated=10), _job("2"), _job("1", date_updated=20)
+    kept, dropped = newest_per_key([old, other, new])
+    assert kept == [new, other] and dropped == 1
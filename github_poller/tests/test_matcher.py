@@ -1,6 +1,6 @@
 import pytest
 from common.models import JobListing, UserPreferences
-from github_poller.matcher import MatchingEngine
+from github_poller.matcher import MatchingEngine, rank_matches
 
 
 @pytest.fixture
@@ -134,3 +134,77 @@ def test_tech_keyword_matches_description(sample_job):
                             role_keywords=[],
                             location_keywords=[])
     assert MatchingEngine.matches(sample_job, prefs)
+
+
+def _prefs(**kw):
+    base = dict(subscribe_new_grad=True,
+                subscribe_internship=False,
+                receive_all=False,
+                tech_keywords=[],
+                role_keywords=[],
+                location_keywords=[])
+    base.update(kw)
+    return UserPreferences(**base)
+
+
+def test_cheap_match_defers_only_on_description(sample_job):
+    cheap = MatchingEngine.cheap_match
+    assert cheap(sample_job, _prefs(receive_all=True)) is True
+    assert cheap(sample_job, _prefs(location_keywords=["canada"],
+                                    tech_keywords=["go"])) is False
+    assert cheap(sample_job, _prefs(role_keywords=["backend"])) is True
+    assert cheap(sample_job, _prefs()) is True
+    assert cheap(sample_job, _prefs(tech_keywords=["kafka"])) is None
+
+
+def test_cheap_match_agrees_with_matches_whatever_the_description(sample_job):
+    import itertools
+
+    descriptions = [None, "", "We use Kafka and Go", "backend kafka canada"]
+    options = {
+        "receive_all": [False, True],
+        "tech_keywords": [[], ["kafka"], ["postgresql"]],
+        "role_keywords": [[], ["backend"], ["frontend"]],
+        "location_keywords": [[], ["remote"], ["canada"]],
+    }
+    for combo in itertools.product(*options.values()):
+        prefs = _prefs(**dict(zip(options, combo)))
+        decided = MatchingEngine.cheap_match(sample_job, prefs)
+        results = set()
+        for desc in descriptions:
+            sample_job.description = desc
+            results.add(MatchingEngine.matches(sample_job, prefs))
+        if decided is not None:
+            assert results == {decided}, prefs
+
+
+def test_rank_matches_by_keyword_hits_then_recency():
+
+    def job(i, title, updated=None, locs=("Remote", )):
+        return JobListing(id=str(i),
+                          date_posted=100,
+                          url=f"https://ex.com/{i}",
+                          company_name="C",
+                          title=title,
+                          locations=list(locs),
+                          sponsorship="None",
+                          active=True,
+                          date_updated=updated)
+
+    prefs = UserPreferences(subscribe_new_grad=True,
+                            subscribe_internship=False,
+                            receive_all=True,
+                            tech_keywords=["python", "k8s"],
+                            role_keywords=["backend"],
+                            location_keywords=["new york"])
+    plain, newer = job(1, "Engineer"), job(2, "Engineer", updated=200)
+    strong = job(3, "Backend Engineer (Python)", locs=["New York, NY"])
+    strong.tags = frozenset({"kubernetes"})  # k8s hits via its synonym tag
+    some = job(4, "Python Engineer")
+    assert MatchingEngine.keyword_hits(strong, prefs) == 4
+    assert rank_matches([plain, newer, strong, some], prefs) == [
+        strong, some, newer, plain
+    ]
+    assert rank_matches([plain, newer, strong, some], prefs, k=2) == [strong, some]
+    # Ties keep input order
+    assert rank_matches([plain, job(5, "Engineer")], prefs)[0] is plain
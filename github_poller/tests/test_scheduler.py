@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta, timezone
+
+from github_poller.scheduler import AdaptivePollScheduler
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _state(decision, polled_at):
+    return {
+        "commit_rate_per_hour": decision.rate_per_hour,
+        "idle_polls": decision.idle_polls,
+        "interval_seconds": decision.interval_seconds,
+        "last_polled_at": polled_at.isoformat(),
+        "next_poll_at": decision.next_poll_at.isoformat(),
+    }
+
+
+def test_first_poll_is_due_and_burst_polls_fast():
+    s = AdaptivePollScheduler(min_interval=60, max_interval=3600)
+    assert s.is_due(None, now=T0)
+
+    # 20 commits in the last 15 minutes -> clamp to the minimum interval
+    d = s.next_poll(None, commits_seen=20, now=T0)
+    assert d.interval_seconds == 60
+    assert d.reason.startswith("active")
+    assert d.next_poll_at == T0 + timedelta(seconds=60)
+
+
+def test_idle_backs_off_exponentially_up_to_max():
+    s = AdaptivePollScheduler(min_interval=60,
+                              max_interval=1000,
+                              base_interval=100,
+                              backoff=2.0)
+    now = T0
+    d = s.next_poll(None, commits_seen=1, now=now)
+    assert d.interval_seconds == 100
+
+    intervals = []
+    for _ in range(5):
+        state = _state(d, now)
+        now = d.next_poll_at
+        assert s.is_due(state, now=now)
+        assert not s.is_due(state, now=now - timedelta(seconds=1))
+        d = s.next_poll(state, commits_seen=0, now=now)
+        intervals.append(d.interval_seconds)
+
+    assert intervals == [200, 400, 800, 1000, 1000]
+    assert d.idle_polls == 5
+    assert "at bound" in d.reason
+
+    # Activity after the idle stretch snaps back to at most the base interval
+    d = s.next_poll(_state(d, now), commits_seen=1, now=d.next_poll_at)
+    assert d.interval_seconds <= 100 and d.idle_polls == 0
+
+
+def test_rate_is_smoothed_across_polls():
+    s = AdaptivePollScheduler(smoothing=0.5)
+    d1 = s.next_poll(None, commits_seen=4, now=T0)  # 4 per 900s -> 16/h
+    assert round(d1.rate_per_hour) == 16
+    t1 = T0 + timedelta(hours=1)
+    d2 = s.next_poll(_state(d1, T0), commits_seen=0, now=t1)
+    assert round(d2.rate_per_hour) == 8
@@ -0,0 +1,296 @@
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import replace
+from datetime import datetime, timezone
+from typing import Optional, Dict, Tuple
+
+from job_scraper.scraper import JobDescription, normalize_url
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS description_cache (
+  url TEXT PRIMARY KEY,
+  source TEXT NOT NULL,
+  body BLOB NOT NULL,
+  size INTEGER NOT NULL,
+  fetched_at REAL NOT NULL,
+  expires_at REAL NOT NULL,
+  last_access REAL NOT NULL,
+  etag TEXT,
+  last_modified TEXT,
+  nbytes INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE INDEX IF NOT EXISTS idx_description_cache_access
+  ON description_cache (last_access);
+
+-- Negative cache: postings that answered 404/410, skipped until expires_at
+CREATE TABLE IF NOT EXISTS dead_links (
+  url TEXT PRIMARY KEY,
+  status INTEGER NOT NULL,
+  expires_at REAL NOT NULL
+);
+"""
+
+DAY = 24 * 60 * 60
+
+# ATS postings rarely change once published; generic pages churn more
+DEFAULT_TTLS = {
+    "greenhouse": 7 * DAY,
+    "lever": 7 * DAY,
+    "ashby": 7 * DAY,
+    "workday": 3 * DAY,
+    "icims": 3 * DAY,
+}
+
+
+# Columns added after the first release
+CACHE_MIGRATIONS = [
+    ("etag", "TEXT"),
+    ("last_modified", "TEXT"),
+    ("nbytes", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+
+def init_cache_table(conn: sqlite3.Connection):
+    conn.executescript(CACHE_SCHEMA)
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(description_cache)")}
+    for column, ddl in CACHE_MIGRATIONS:
+        if column not in cols:
+            conn.execute(
+                f"ALTER TABLE description_cache ADD COLUMN {column} {ddl}")
+    conn.commit()
+
+
+class DescriptionCache:
+    """
+    Two-tier JobDescription cache keyed by normalize_url():
+    an in-memory LRU (`memory_items` entries) in front of a SQLite table
+    holding zlib-compressed text. Entries go stale after a per-source TTL
+    (get() misses); for `revalidate_window` seconds after that, get_stale()
+    still returns them so JobScraper can revalidate with ETag/Last-Modified
+    and refresh() them on a 304. The SQLite tier is capped at `max_bytes` of
+    compressed text, evicting least-recently-used rows first. Dead (404/410)
+    URLs are kept in a separate table via mark_dead()/dead_status().
+
+    Implements the get/put interface JobScraper expects. Thread-safe.
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 conn: Optional[sqlite3.Connection] = None,
+                 memory_items: int = 256,
+                 max_bytes: int = 64 * 1024 * 1024,
+                 ttls: Optional[Dict[str, float]] = None,
+                 default_ttl: float = DAY,
+                 revalidate_window: float = 14 * DAY,
+                 clock=time.time):
+        self.conn = conn or sqlite3.connect(path or ":memory:",
+                                            check_same_thread=False)
+        init_cache_table(self.conn)
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.default_ttl = default_ttl
+        self.revalidate_window = revalidate_window
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._memory: "OrderedDict[str, Tuple[JobDescription, float]]" = (
+            OrderedDict())
+        # Memory hits don't write to SQLite; their recency is flushed before eviction
+        self._touched: Dict[str, float] = {}
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "stale_hits": 0,
+            "refreshed": 0,
+            "evictions": 0,
+            "puts": 0,
+            "dead_hits": 0,
+        }
+        self._total_bytes = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM description_cache").fetchone(
+            )[0]
+
+    def ttl_for(self, source: str) -> float:
+        return self.ttls.get(source, self.default_ttl)
+
+    def _remember(self, url: str, jd: JobDescription,
+                  expires_at: float) -> None:
+        self._memory[url] = (jd, expires_at)
+        self._memory.move_to_end(url)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _load(self, url: str):
+        row = self.conn.execute(
+            """
+            SELECT source, body, fetched_at, expires_at, etag, last_modified, nbytes
+            FROM description_cache WHERE url = ?
+            """, (url, )).fetchone()
+        if row is None:
+            return None, None
+        source, body, fetched_at, expires_at, etag, last_modified, nbytes = row
+        jd = JobDescription(url=url,
+                            text=zlib.decompress(body).decode("utf-8"),
+                            source=source,
+                            fetched_at=datetime.fromtimestamp(
+                                fetched_at, timezone.utc),
+                            etag=etag,
+                            last_modified=last_modified,
+                            nbytes=nbytes)
+        return jd, expires_at
+
+    def get(self, url: str) -> Optional[JobDescription]:
+        """Fresh entries only."""
+        url = normalize_url(url)
+        now = self.clock()
+        with self._lock:
+            hit = self._memory.get(url)
+            if hit and hit[1] > now:
+                self._memory.move_to_end(url)
+                self._touched[url] = now
+                self.counters["memory_hits"] += 1
+                return hit[0]
+            if hit:
+                del self._memory[url]
+
+            jd, expires_at = self._load(url)
+            if jd is None:
+                self.counters["misses"] += 1
+                return None
+            if expires_at <= now:
+                self.counters["expired"] += 1
+                self.counters["misses"] += 1
+                return None
+
+            self.conn.execute(
+                "UPDATE description_cache SET last_access = ? WHERE url = ?",
+                (now, url))
+            self.conn.commit()
+            self._remember(url, jd, expires_at)
+            self.counters["disk_hits"] += 1
+            return jd
+
+    def get_stale(self, url: str) -> Optional[JobDescription]:
+        """An entry past its TTL but still inside the revalidation window."""
+        url = normalize_url(url)
+        with self._lock:
+            jd, expires_at = self._load(url)
+            if jd is None or (expires_at + self.revalidate_window
+                              <= self.clock()):
+                return None
+            self.counters["stale_hits"] += 1
+            return jd
+
+    def refresh(self, jd: JobDescription) -> JobDescription:
+        """Restart the TTL of an entry confirmed unchanged (HTTP 304)."""
+        url = normalize_url(jd.url)
+        now = self.clock()
+        fresh = replace(jd,
+                        url=url,
+                        fetched_at=datetime.fromtimestamp(now, timezone.utc))
+        expires_at = now + self.ttl_for(jd.source)
+        with self._lock:
+            self.conn.execute(
+                """
+                UPDATE description_cache SET fetched_at = ?, expires_at = ?, last_access = ?
+                WHERE url = ?
+                """, (now, expires_at, now, url))
+            self.conn.commit()
+            self._remember(url, fresh, expires_at)
+            self.counters["refreshed"] += 1
+        return fresh
+
+    def put(self, jd: JobDescription) -> None:
+        url = normalize_url(jd.url)
+        now = self.clock()
+        expires_at = now + self.ttl_for(jd.source)
+        body = zlib.compress(jd.text.encode("utf-8"), 6)
+        with self._lock:
+            old = self.conn.execute(
+                "SELECT size FROM description_cache WHERE url = ?",
+                (url, )).fetchone()
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO description_cache
+                  (url, source, body, size, fetched_at, expires_at, last_access,
+                   etag, last_modified, nbytes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, (url, jd.source, body, len(body),
+                      jd.fetched_at.timestamp(), expires_at, now, jd.etag,
+                      jd.last_modified, jd.nbytes))
+            self._total_bytes += len(body) - (old[0] if old else 0)
+            self._evict_locked()
+            self.conn.commit()
+            self._remember(url, jd, expires_at)
+            self.counters["puts"] += 1
+
+    def mark_dead(self, url: str, status: int, ttl: float) -> None:
+        now = self.clock()
+        with self._lock:
+            self.conn.execute("DELETE FROM dead_links WHERE expires_at <= ?",
+                              (now, ))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO dead_links (url, status, expires_at) "
+                "VALUES (?, ?, ?)", (normalize_url(url), status, now + ttl))
+            self.conn.commit()
+
+    def dead_status(self, url: str) -> Optional[int]:
+        """HTTP status of a URL still inside its negative TTL, else None."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT status FROM dead_links WHERE url = ? AND expires_at > ?",
+                (normalize_url(url), self.clock())).fetchone()
+            if row:
+                self.counters["dead_hits"] += 1
+            return row[0] if row else None
+
+    def _evict_locked(self) -> None:
+        """Drop rows past revalidation, then LRU rows until under max_bytes."""
+        if self._total_bytes <= self.max_bytes:
+            return
+        if self._touched:
+            self.conn.executemany(
+                "UPDATE description_cache SET last_access = ? WHERE url = ?",
+                [(t, u) for u, t in self._touched.items()])
+            self._touched.clear()
+        cutoff = self.clock() - self.revalidate_window
+        expired = self.conn.execute(
+            "SELECT url, size FROM description_cache WHERE expires_at <= ?",
+            (cutoff, )).fetchall()
+        self.conn.execute("DELETE FROM description_cache WHERE expires_at <= ?",
+                          (cutoff, ))
+        self._forget(expired)
+        if self._total_bytes <= self.max_bytes:
+            return
+        victims = []
+        over = self._total_bytes - self.max_bytes
+        for url, size in self.conn.execute(
+                "SELECT url, size FROM description_cache ORDER BY last_access"):
+            victims.append((url, size))
+            over -= size
+            if over <= 0:
+                break
+        self.conn.executemany("DELETE FROM description_cache WHERE url = ?",
+                              [(u, ) for u, _ in victims])
+        self._forget(victims)
+
+    def _forget(self, rows) -> None:
+        for url, size in rows:
+            self._total_bytes -= size
+            self._memory.pop(url, None)
+            self._touched.pop(url, None)
+            self.counters["evictions"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                **self.counters,
+                "memory_entries": len(self._memory),
+                "bytes": self._total_bytes,
+            }
@@ -1,21 +1,136 @@
 import asyncio
-from typing import List, Callable
+import copy
+import time
+from contextlib import nullcontext
+from typing import FrozenSet, List, Dict, Any, Optional
 from common.models import JobListing
-from job_scraper.scraper import JobScraper
+from common.tags import excerpt, extract_tags
+from job_scraper.scraper import DeadLinkError, JobScraper, new_counters
+from job_scraper.politeness import CircuitOpenError
+
+
+class EnrichmentRun:
+    """
+    Counters and timings for one batch (or stream) of description fetches;
+    `stats()` is what enrich_descriptions returns. `terms` are user keywords
+    outside the tag dictionary, also tagged from the full text.
+    """
+
+    def __init__(self,
+                 scraper: JobScraper,
+                 deadline: Optional[float] = None,
+                 terms: FrozenSet[str] = frozenset()):
+        self.scraper = scraper
+        self.deadline = deadline
+        self.terms = terms
+        self.jobs = 0
+        self.counts = {
+            "fetched": 0,
+            "failed": 0,
+            "circuit_open": 0,
+            "dead": 0,
+            "timed_out": 0
+        }
+        self.stragglers: List[Dict[str, str]] = []
+        # Only this run's fetches, even with other runs sharing the scraper
+        self.scraper_counters = new_counters()
+        self._wall0, self._cpu0 = time.perf_counter(), time.process_time()
+
+    async def fetch(self, job: JobListing) -> None:
+        self.jobs += 1
+        counting = getattr(self.scraper, "counting", None)
+        try:
+            with (counting(self.scraper_counters)
+                  if counting else nullcontext()):
+                jd = await self.scraper.fetch_description(job.url)
+            # Tags cover the full text; only an excerpt stays on the job
+            job.tags = extract_tags(jd.text, self.terms)
+            job.description = excerpt(jd.text)
+            self.counts["fetched"] += 1
+        except CircuitOpenError:
+            job.description = None
+            self.counts["circuit_open"] += 1
+        except DeadLinkError:
+            job.description = None
+            self.counts["dead"] += 1
+        except Exception:
+            # Leave description None on failure
+            job.description = None
+            self.counts["failed"] += 1
+
+    def timed_out(self, job: JobListing) -> None:
+        job.description = None
+        self.stragglers.append({"id": job.id, "url": job.url})
+        self.counts["timed_out"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "jobs": self.jobs,
+            **self.counts,
+            "wall_ms": round((time.perf_counter() - self._wall0) * 1000, 1),
+            # The whole process's CPU meanwhile, other runs' included
+            "process_cpu_ms": round(
+                (time.process_time() - self._cpu0) * 1000, 1),
+            # Extraction CPU for this run's fetches, wherever it ran
+            "extract_cpu_ms": round(self.scraper_counters["extract_cpu_ms"],
+                                    1),
+        }
+        if self.deadline is not None:
+            stats["deadline_s"] = self.deadline
+            stats["stragglers"] = self.stragglers
+        hosts = getattr(self.scraper, "hosts", None)
+        if hosts is not None:
+            # Per-host state is the scheduler's, since it was created
+            stats["hosts_lifetime"] = hosts.snapshot()
+        if hasattr(self.scraper, "counting"):
+            stats["scraper"] = copy.deepcopy(self.scraper_counters)
+        cache = getattr(self.scraper, "cache", None)
+        if hasattr(cache, "stats"):
+            stats["cache"] = cache.stats()
+        return stats
 
 
 async def enrich_descriptions(jobs: List[JobListing],
                               scraper: JobScraper,
-                              concurrency: int = 6) -> None:
-    sem = asyncio.Semaphore(concurrency)
+                              concurrency: int = 6,
+                              deadline: Optional[float] = None,
+                              terms: FrozenSet[str] = frozenset()) -> Dict[str, Any]:
+    """
+    Fill job.tags and a capped job.description excerpt for every job
+    (None on failure); `terms` as for EnrichmentRun.
+    After `deadline` seconds, fetches still outstanding are cancelled and
+    their jobs keep description=None; they are listed as "stragglers".
+    Returns this run's counters and wall time, the process's CPU time
+    meanwhile, plus the lifetime per-host latency/failure stats when the
+    scraper has a HostScheduler.
+    """
+    # Host-aware scrapers bound concurrency themselves (per host, then globally),
+    # so a slow host can't sit on every slot while others wait.
+    hosts = getattr(scraper, "hosts", None)
+    sem = asyncio.Semaphore(concurrency) if hosts is None else None
+    run = EnrichmentRun(scraper, deadline, terms)
+
+    # Share one pooled client across the whole batch when the scraper supports it
+    pooled = hasattr(scraper, "open_session")
+    if pooled:
+        await scraper.open_session()
 
     async def one(job: JobListing):
-        async with sem:
-            try:
-                jd = await scraper.fetch_description(job.url)
-                job.description = jd.text
-            except Exception:
-                # Leave description None on failure
-                job.description = None
-
-    await asyncio.gather(*(one(j) for j in jobs))
+        async with (sem or nullcontext()):
+            await run.fetch(job)
+
+    try:
+        tasks = {asyncio.ensure_future(one(j)): j for j in jobs}
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=deadline)
+            for t in pending:
+                t.cancel()
+                run.timed_out(tasks[t])
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+    finally:
+        if pooled:
+            await scraper.close_session()
+
+    run.jobs = len(jobs)
+    return run.stats()
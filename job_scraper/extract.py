@@ -0,0 +1,183 @@
+"""
+HTML -> description text. The same strategy runs on every backend:
+first non-empty match from CANDIDATE_SELECTORS, then a JSON-LD
+JobPosting description, then all visible text.
+
+Backends, fastest first: selectolax and lxml when installed (the `fast` extra),
+else BeautifulSoup's stdlib html.parser with a SoupStrainer so only candidate
+subtrees get built. Like bs4's get_text, every backend leaves out script,
+style and template text. HTML_EXTRACTOR picks one explicitly.
+"""
+import importlib
+import json
+import os
+from typing import Callable, Dict, List, Optional
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Platform-ish selectors, in priority order
+CANDIDATE_SELECTORS = [
+    "[data-testid='JobDescription']",
+    "[data-qa='job-description']",
+    "div.job-description",
+    "section.job-description",
+    "#content",
+    ".content",
+    "article",
+    "main",
+]
+
+# XPath equivalents of CANDIDATE_SELECTORS (lxml has no CSS without cssselect)
+_CANDIDATE_XPATHS = [
+    "//*[@data-testid='JobDescription']",
+    "//*[@data-qa='job-description']",
+    "//div[contains(concat(' ', normalize-space(@class), ' '), ' job-description ')]",
+    "//section[contains(concat(' ', normalize-space(@class), ' '), ' job-description ')]",
+    "//*[@id='content']",
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' content ')]",
+    "//article",
+    "//main",
+]
+
+
+def _ld_description(raw: Optional[str]) -> Optional[str]:
+    try:
+        data = json.loads(raw or "{}")
+    except Exception:
+        return None
+    if isinstance(data, dict) and "description" in data:
+        return BeautifulSoup(data["description"],
+                             "html.parser").get_text(" ", strip=True)
+    return None
+
+
+def _join_strings(strings) -> str:
+    return "\n".join(s.strip() for s in strings if s and s.strip())
+
+
+# Tags whose text bs4's get_text leaves out; the other backends drop them too
+_NON_TEXT_TAGS = ("script", "style", "template")
+
+
+def _is_candidate(name: str, attrs) -> bool:
+    """Could a CANDIDATE_SELECTORS entry (or the JSON-LD lookup) match this tag?"""
+    if name in ("article", "main", "script"):
+        return True
+    classes = attrs.get("class") or ""
+    if isinstance(classes, str):
+        classes = classes.split()
+    return (attrs.get("data-testid") == "JobDescription"
+            or attrs.get("data-qa") == "job-description"
+            or attrs.get("id") == "content" or "content" in classes
+            or (name in ("div", "section") and "job-description" in classes))
+
+
+class _CandidateStrainer(SoupStrainer):
+    """
+    Builds only the subtrees of tags a candidate could match, on any tag, so
+    head, nav, footer and stray body text are skipped. SoupStrainer(name=...,
+    attrs=...) ANDs its rules and candidates are an OR of them, so this uses
+    the allow_tag_creation / allow_string_creation hooks bs4 4.13 documents
+    for filter subclasses (hence the version pin in pyproject.toml).
+    """
+
+    def allow_tag_creation(self, nsprefix, name, attrs) -> bool:
+        return _is_candidate(name, attrs or {})
+
+    def allow_string_creation(self, string) -> bool:
+        return False
+
+
+_CANDIDATES_ONLY = _CandidateStrainer()
+
+
+def extract_soup(html: str, strain: bool = True) -> str:
+    """`strain=False` builds the whole tree up front (the old behaviour)."""
+    soup = BeautifulSoup(html,
+                         "html.parser",
+                         parse_only=_CANDIDATES_ONLY if strain else None)
+    for sel in CANDIDATE_SELECTORS:
+        el = soup.select_one(sel)
+        if el and el.get_text(strip=True):
+            return el.get_text(separator="\n", strip=True)
+    for s in soup.find_all("script", type="application/ld+json"):
+        text = _ld_description(s.string)
+        if text is not None:
+            return text
+    if strain:
+        # Nothing matched: pay for the full tree
+        soup = BeautifulSoup(html, "html.parser")
+    return soup.get_text("\n", strip=True)
+
+
+def extract_lxml(html: str) -> str:
+    import lxml.html
+
+    if not html.strip():
+        return ""
+    root = lxml.html.document_fromstring(html)
+    ld = [s.text for s in root.xpath("//script[@type='application/ld+json']")]
+    for el in root.xpath("|".join(f"//{t}" for t in _NON_TEXT_TAGS)):
+        el.clear(keep_tail=True)  # Tail stays a separate string, as in bs4
+    for xp in _CANDIDATE_XPATHS:
+        for el in root.xpath(xp):
+            text = _join_strings(el.itertext())
+            if text:
+                return text
+            break  # Like select_one: only the first match counts
+    for raw in ld:
+        text = _ld_description(raw)
+        if text is not None:
+            return text
+    return _join_strings(root.itertext())
+
+
+def extract_selectolax(html: str) -> str:
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    ld = [s.text() for s in tree.css("script[type='application/ld+json']")]
+    tree.strip_tags(list(_NON_TEXT_TAGS))
+    for sel in CANDIDATE_SELECTORS:
+        el = tree.css_first(sel)
+        if el is not None:
+            text = el.text(separator="\n", strip=True)
+            if text:
+                return text
+    for raw in ld:
+        text = _ld_description(raw)
+        if text is not None:
+            return text
+    root = tree.root
+    return root.text(separator="\n", strip=True) if root is not None else ""
+
+
+# Name -> (module that must import, extractor)
+BACKENDS: Dict[str, tuple] = {
+    "selectolax": ("selectolax.lexbor", extract_selectolax),
+    "lxml": ("lxml.html", extract_lxml),
+    "html.parser": ("bs4", extract_soup),
+}
+
+
+def available_backends() -> List[str]:
+    names = []
+    for name, (module, _) in BACKENDS.items():
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_extractor(name: Optional[str] = None) -> Callable[[str], str]:
+    """Extractor for `name` (or HTML_EXTRACTOR), else the fastest installed."""
+    name = name or os.getenv("HTML_EXTRACTOR")
+    available = available_backends()
+    if name:
+        if name not in available:
+            raise ValueError(f"HTML extractor {name!r} is not installed "
+                             f"(available: {', '.join(available)})")
+        return BACKENDS[name][1]
+    return BACKENDS[available[0]][1]
@@ -0,0 +1,102 @@
+"""
+Native JSON endpoints for ATS platforms whose public job APIs return the
+description directly, so we can skip downloading and parsing the full page.
+Each extractor rewrites a posting URL to its API URL and pulls the text out of
+the JSON; JobScraper falls back to the HTML path when either step fails.
+"""
+import html
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+from bs4 import BeautifulSoup
+
+API_BASES = {
+    "greenhouse": "https://boards-api.greenhouse.io",
+    "lever": "https://api.lever.co",
+    "ashby": "https://api.ashbyhq.com",
+}
+
+_GREENHOUSE_RE = re.compile(
+    r"^https?://(?:boards|job-boards)\.greenhouse\.io/([^/?#]+)/jobs/(\d+)")
+_GREENHOUSE_EMBED_RE = re.compile(
+    r"^https?://(?:boards|job-boards)\.greenhouse\.io/embed/job_app\?.*?"
+    r"for=([^&#]+)&token=(\d+)")
+_LEVER_RE = re.compile(r"^https?://jobs\.lever\.co/([^/?#]+)/([0-9a-f-]{36})")
+_ASHBY_RE = re.compile(
+    r"^https?://jobs\.ashbyhq\.com/([^/?#]+)/([0-9a-f-]{36})")
+
+
+@dataclass
+class ApiRequest:
+    url: str
+    parse: Callable[[Any], Optional[str]]  # JSON payload -> description text
+
+
+def _html_to_text(fragment: str) -> str:
+    return BeautifulSoup(fragment, "html.parser").get_text("\n", strip=True)
+
+
+def _greenhouse(m: re.Match, base: str) -> ApiRequest:
+    board, job_id = m.group(1), m.group(2)
+
+    def parse(data):
+        # `content` is entity-escaped HTML
+        content = (data or {}).get("content")
+        return _html_to_text(html.unescape(content)) if content else None
+
+    return ApiRequest(f"{base}/v1/boards/{board}/jobs/{job_id}", parse)
+
+
+def _lever(m: re.Match, base: str) -> ApiRequest:
+    company, posting_id = m.group(1), m.group(2)
+
+    def parse(data):
+        if not isinstance(data, dict):
+            return None
+        parts = [data.get("descriptionPlain") or ""]
+        for section in data.get("lists") or []:
+            parts.append(section.get("text") or "")
+            parts.append(_html_to_text(section.get("content") or ""))
+        parts.append(data.get("additionalPlain") or "")
+        text = "\n".join(p.strip() for p in parts if p and p.strip())
+        return text or None
+
+    return ApiRequest(f"{base}/v0/postings/{company}/{posting_id}", parse)
+
+
+def _ashby(m: re.Match, base: str) -> ApiRequest:
+    org, job_id = m.group(1), m.group(2)
+
+    def parse(data):
+        # The board endpoint lists every open job; pick ours
+        for job in (data or {}).get("jobs") or []:
+            if job.get("id") == job_id:
+                return job.get("descriptionPlain") or _html_to_text(
+                    job.get("descriptionHtml") or "") or None
+        return None
+
+    return ApiRequest(f"{base}/posting-api/job-board/{org}", parse)
+
+
+_EXTRACTORS = {
+    "greenhouse": [(_GREENHOUSE_RE, _greenhouse),
+                   (_GREENHOUSE_EMBED_RE, _greenhouse)],
+    "lever": [(_LEVER_RE, _lever)],
+    "ashby": [(_ASHBY_RE, _ashby)],
+}
+
+
+def api_request_for(
+        url: str,
+        source: str,
+        bases: Optional[Dict[str, str]] = None) -> Optional[ApiRequest]:
+    """ApiRequest for a posting URL, or None if its source has no JSON API."""
+    base = (bases or API_BASES).get(source)
+    if not base:
+        return None
+    for pattern, build in _EXTRACTORS.get(source, []):
+        m = pattern.match(url)
+        if m:
+            return build(m, base.rstrip("/"))
+    return None
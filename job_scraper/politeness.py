@@ -0,0 +1,208 @@
+import asyncio
+import time
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+
+@dataclass
+class HostPolicy:
+    max_concurrency: int = 4
+    min_interval: float = 0.0  # Seconds between request starts to one host
+    failure_threshold: int = 3  # Consecutive failures that open the circuit
+    cooldown: float = 300.0  # Seconds the circuit stays open before a trial request
+
+
+# Keyed by detect_source(); ATS tenants that throttle or slow down under load get
+# fewer slots and spacing between requests.
+SOURCE_POLICIES: Dict[str, HostPolicy] = {
+    "workday": HostPolicy(max_concurrency=2, min_interval=0.5),
+    "icims": HostPolicy(max_concurrency=2, min_interval=0.5),
+    "greenhouse": HostPolicy(max_concurrency=6),
+    "lever": HostPolicy(max_concurrency=6),
+    "ashby": HostPolicy(max_concurrency=6),
+}
+DEFAULT_POLICY = HostPolicy()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of fetching while a host's circuit breaker is open."""
+
+
+@dataclass
+class HostStats:
+    requests: int = 0
+    failures: int = 0
+    short_circuited: int = 0
+    latency_ms_total: float = 0.0
+    latency_ms_max: float = 0.0
+    consecutive_failures: int = 0
+    opened_at: Optional[float] = None
+    trial_in_flight: bool = False
+
+
+def _is_failure(exc: BaseException) -> bool:
+    # 4xx means the host is up and answering; only 5xx / transport errors trip it
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return True
+
+
+class _LoopGates:
+    """One event loop's semaphores (asyncio primitives belong to a loop)."""
+
+    def __init__(self, max_total: int):
+        self.total = asyncio.Semaphore(max_total)
+        self.hosts: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+        self.active = 0  # Requests holding or waiting for a slot
+
+
+class HostScheduler:
+    """
+    Per-host politeness for description fetches, keyed by (source, hostname):
+    bounded concurrency, minimum spacing between request starts and a circuit
+    breaker. A request first takes its host slot, then one of `max_total`
+    global slots, so a slow host can never hold every global slot.
+
+    Counters are shared across event loops; semaphores are per loop, and go
+    when the loop does or on forget_loop().
+    """
+
+    def __init__(self,
+                 max_total: int = 6,
+                 max_per_host: Optional[int] = None,
+                 policies: Optional[Dict[str, HostPolicy]] = None,
+                 default_policy: HostPolicy = DEFAULT_POLICY,
+                 clock=time.monotonic,
+                 sleep=asyncio.sleep):
+        self.max_total = max_total
+        self.max_per_host = max_per_host  # Optional cap over every policy
+        self.policies = SOURCE_POLICIES if policies is None else policies
+        self.default_policy = default_policy
+        self.clock = clock
+        self.sleep = sleep  # Waits out min_interval; tests pass a fake
+        self._stats: Dict[Tuple[str, str], HostStats] = {}
+        self._next_start: Dict[Tuple[str, str], float] = {}
+        # loop -> _LoopGates
+        self._loop_gates = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def key_for(url: str, source: str) -> Tuple[str, str]:
+        return source, (urlsplit(url).hostname or "").lower()
+
+    def policy_for(self, key: Tuple[str, str]) -> HostPolicy:
+        return self.policies.get(key[0], self.default_policy)
+
+    def _gates(self) -> _LoopGates:
+        loop = asyncio.get_running_loop()
+        gates = self._loop_gates.get(loop)
+        if gates is None:
+            gates = self._loop_gates[loop] = _LoopGates(self.max_total)
+        return gates
+
+    def _host_gate(self, gates: _LoopGates, key: Tuple[str, str],
+                   policy: HostPolicy) -> asyncio.Semaphore:
+        host_gate = gates.hosts.get(key)
+        if host_gate is None:
+            n = policy.max_concurrency
+            if self.max_per_host:
+                n = min(n, self.max_per_host)
+            host_gate = gates.hosts[key] = asyncio.Semaphore(n)
+        return host_gate
+
+    def forget_loop(self) -> None:
+        """
+        Drop the running loop's semaphores unless a request is using them.
+        Long-lived workers call this (JobScraper.close_session does) since a
+        semaphore that has waited holds its loop, so the weak key never dies.
+        """
+        loop = asyncio.get_running_loop()
+        gates = self._loop_gates.get(loop)
+        if gates is not None and not gates.active:
+            del self._loop_gates[loop]
+
+    def _check_circuit(self, st: HostStats, policy: HostPolicy) -> bool:
+        """Returns True if this request is the half-open trial."""
+        if st.opened_at is None:
+            return False
+        if (self.clock() - st.opened_at < policy.cooldown
+                or st.trial_in_flight):
+            st.short_circuited += 1
+            raise CircuitOpenError(f"circuit open after "
+                                   f"{st.consecutive_failures} failures")
+        st.trial_in_flight = True
+        return True
+
+    @asynccontextmanager
+    async def slot(self, url: str, source: str):
+        """`source` is detect_source(url); it picks the HostPolicy."""
+        key = self.key_for(url, source)
+        policy = self.policy_for(key)
+        st = self._stats.setdefault(key, HostStats())
+        gates = self._gates()
+        host_gate = self._host_gate(gates, key, policy)
+
+        gates.active += 1
+        try:
+            async with host_gate:
+                if policy.min_interval:
+                    # Reserve the next start time, then wait for it
+                    now = self.clock()
+                    start = max(now, self._next_start.get(key, now))
+                    self._next_start[key] = start + policy.min_interval
+                    if start > now:
+                        await self.sleep(start - now)
+                async with gates.total:
+                    # Checked last, so requests queued behind a failing one
+                    # see it
+                    trial = self._check_circuit(st, policy)
+                    t0 = self.clock()
+                    try:
+                        yield
+                    except asyncio.CancelledError:
+                        # Says nothing about the host: leave the breaker as is
+                        raise
+                    except BaseException as e:
+                        self._record(st, policy, t0, failed=_is_failure(e))
+                        raise
+                    else:
+                        self._record(st, policy, t0, failed=False)
+                    finally:
+                        if trial:
+                            st.trial_in_flight = False
+        finally:
+            gates.active -= 1
+
+    def _record(self, st: HostStats, policy: HostPolicy, t0: float,
+                failed: bool) -> None:
+        ms = (self.clock() - t0) * 1000
+        st.requests += 1
+        st.latency_ms_total += ms
+        st.latency_ms_max = max(st.latency_ms_max, ms)
+        if failed:
+            st.failures += 1
+            st.consecutive_failures += 1
+            if st.consecutive_failures >= policy.failure_threshold:
+                st.opened_at = self.clock()
+        else:
+            st.consecutive_failures = 0
+            st.opened_at = None
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Per-host counters for run stats, keyed "source:host"."""
+        out = {}
+        for (source, host), st in self._stats.items():
+            d = asdict(st)
+            d.pop("trial_in_flight")
+            d["latency_ms_avg"] = round(
+                st.latency_ms_total / st.requests, 1) if st.requests else 0.0
+            d["latency_ms_max"] = round(st.latency_ms_max, 1)
+            d["latency_ms_total"] = round(st.latency_ms_total, 1)
+            d["circuit_open"] = st.opened_at is not None
+            d.pop("opened_at")
+            out[f"{source}:{host}"] = d
+        return out
@@ -1,9 +1,63 @@
+import asyncio
+import time
 import re, json
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import AsyncExitStack, contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Any, Callable, Iterator, List, Optional, Dict, Union
 import httpx
-from bs4 import BeautifulSoup
+from job_scraper.politeness import HostScheduler
+from job_scraper.extractors import ApiRequest, api_request_for
+from job_scraper.extract import extract_soup, get_extractor
+
+# Workday/iCIMS pages can run to megabytes; the description is near the top
+MAX_BODY_BYTES = 2 * 1024 * 1024
+
+# Seconds a 404/410 posting is remembered as dead before it's tried again
+NEGATIVE_TTL = 60.0 * 60
+DEAD_STATUSES = (404, 410)
+
+API_MEMO_TTL = 60.0  # Seconds to reuse a JSON API payload (Ashby returns whole boards)
+
+# Entries kept in the in-process memos; the least recently used go first
+API_MEMO_ITEMS = 64
+DEAD_MEMO_ITEMS = 10_000
+
+# Pool-wide caps; per-host concurrency is enforced by HostScheduler (httpx has no per-host limit)
+POOL_LIMITS = httpx.Limits(max_connections=32,
+                           max_keepalive_connections=16,
+                           keepalive_expiry=30)
+
+
+
+
+def new_counters() -> Dict[str, Any]:
+    """Zeroed fetch counters, as kept in JobScraper.counters."""
+    return {
+        "fetched": 0,
+        "bytes_downloaded": 0,
+        "revalidated": 0,  # 304 Not Modified on a stale cache entry
+        "bytes_saved": 0,  # Body bytes those 304s didn't transfer
+        "truncated": 0,  # Pages cut off at max_body_bytes
+        "extracted": 0,
+        "extract_cpu_ms": 0.0,  # CPU spent parsing, summed over workers
+        "extract_wall_ms": 0.0,  # Queueing + parsing, as seen by fetches
+        "coalesced": 0,  # Callers that joined an in-flight fetch
+        "dead_skipped": 0,  # Fetches skipped: URL recently 404/410
+        "api_fetched": 0,
+        "api_fallbacks": 0,  # JSON API failed or had no text -> HTML path
+        # "<source>:<api|html>" -> {"requests", "bytes", "ms"}
+        "paths": {},
+    }
+
+
+# Counters of the run the current task fetches for (see JobScraper.counting);
+# tasks started by a fetch inherit it, so a shared fetch counts for its starter
+_run_counters: ContextVar[Optional[Dict[str, Any]]] = ContextVar(
+    "run_counters", default=None)
 
 
 # Factory wrapper so we can monkeypatch in tests
@@ -13,6 +67,7 @@ def AsyncClientFactory():
         headers={"User-Agent": "swe-repo-notify/1.0"},
         http2=True,
         follow_redirects=True,
+        limits=POOL_LIMITS,
     )
 
 
@@ -22,6 +77,29 @@ class JobDescription:
     text: str
     source: str
     fetched_at: datetime
+    # HTTP validators for conditional revalidation, and the body size they save
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    nbytes: int = 0
+
+
+class DeadLinkError(Exception):
+    """The posting answered 404/410 (now or within the negative-cache TTL)."""
+
+    def __init__(self, url: str, status: int):
+        super().__init__(f"{status} for {url}")
+        self.url = url
+        self.status = status
+
+
+@dataclass
+class _Page:
+    status: int
+    text: str = ""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    nbytes: int = 0
+    truncated: bool = False  # Body cut off at max_bytes
 
 
 def normalize_url(url: str) -> str:
@@ -46,44 +124,50 @@ def detect_source(url: str) -> str:
     return "generic"
 
 
-async def _fetch_html(url: str) -> str:
-    async with AsyncClientFactory() as client:
-        resp = await client.get(url)
+async def _fetch_html(url: str,
+                      client=None,
+                      headers: Optional[Dict[str, str]] = None,
+                      max_bytes: Optional[int] = None) -> _Page:
+    """
+    GET url, streaming at most `max_bytes` of body; a 304 (conditional
+    request) comes back as an empty _Page.
+    """
+    if client is None:
+        # No pooled session open: one-shot client
+        async with AsyncClientFactory() as client:
+            return await _fetch_html(url, client, headers, max_bytes)
+    async with client.stream("GET", url, headers=headers or None) as resp:
+        if resp.status_code == 304:
+            return _Page(status=304)
         resp.raise_for_status()
-        return resp.text
+        chunks, size = [], 0
+        async for chunk in resp.aiter_bytes():
+            chunks.append(chunk)
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                break  # Closing the stream drops the rest of the body
+        body = b"".join(chunks)
+        truncated = bool(max_bytes) and len(body) > max_bytes
+        if truncated:
+            body = body[:max_bytes]
+        return _Page(status=resp.status_code,
+                     text=body.decode(resp.encoding or "utf-8",
+                                      errors="replace"),
+                     etag=resp.headers.get("etag"),
+                     last_modified=resp.headers.get("last-modified"),
+                     nbytes=len(body),
+                     truncated=truncated)
 
 
 def _extract_text_static(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-
-    # Platform-ish selectors first
-    candidates = [
-        "[data-testid='JobDescription']",
-        "[data-qa='job-description']",
-        "div.job-description",
-        "section.job-description",
-        "#content",
-        ".content",
-        "article",
-        "main",
-    ]
-    for sel in candidates:
-        el = soup.select_one(sel)
-        if el and el.get_text(strip=True):
-            return el.get_text(separator="\n", strip=True)
-
-    # Try ld+json description
-    for s in soup.find_all("script", type="application/ld+json"):
-        try:
-            data = json.loads(s.string or "{}")
-            if isinstance(data, dict) and "description" in data:
-                return BeautifulSoup(data["description"],
-                                     "html.parser").get_text(" ", strip=True)
-        except Exception:
-            pass
+    return extract_soup(html)
+
 
-    # Fallback: page visible text
-    return soup.get_text("\n", strip=True)
+def _timed_extract(extract: Callable[[str], str], html: str):
+    """Runs in the extraction pool; returns (text, CPU seconds spent)."""
+    t0 = time.thread_time()
+    text = extract(html)
+    return text, time.thread_time() - t0
 
 
 async def _fetch_headless_text(url: str) -> str:
@@ -92,26 +176,343 @@ async def _fetch_headless_text(url: str) -> str:
     return ""
 
 
+class _TTLMemo:
+    """Bounded LRU whose entries expire after a per-entry TTL (monotonic)."""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items: "OrderedDict[Any, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key) -> Optional[Any]:
+        hit = self._items.get(key)
+        if hit is None:
+            return None
+        if hit[0] <= time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return hit[1]
+
+    def put(self, key, value, ttl: float) -> None:
+        now = time.monotonic()
+        self._items[key] = (now + ttl, value)
+        self._items.move_to_end(key)
+        # From the least recently used end: anything expired, then whatever
+        # is over the cap (expired entries elsewhere go when next looked up)
+        while self._items:
+            exp, _ = next(iter(self._items.values()))
+            if exp > now and len(self._items) <= self.max_items:
+                break
+            self._items.popitem(last=False)
+
+
+@dataclass
+class _Flight:
+    """One in-flight fetch and how many callers are waiting on it."""
+    task: asyncio.Task
+    waiters: int = 0
+
+
+@dataclass
+class _Session:
+    """Pooled client shared by every fetch on one event loop."""
+    client: object
+    stack: AsyncExitStack
+    refs: int = 0
+
+
 class JobScraper:
+    """
+    Fetches and extracts job descriptions.
+
+    Use `async with scraper:` (or open_session/close_session) around a batch so all
+    fetches share one keep-alive/HTTP/2 connection pool. Sessions are reference
+    counted per event loop; fetches outside a session use a one-shot client.
+
+    Every fetch goes through `hosts` (a HostScheduler): per-host concurrency
+    (capped at `max_per_host`), spacing and circuit breaking, then at most
+    `max_concurrency` fetches in flight overall.
+
+    With `use_json_api`, greenhouse/lever/ashby postings are read from the
+    platform's public JSON API (see extractors.py), falling back to the HTML
+    page when that fails. `api_bases` overrides the API hosts (tests).
+
+    HTML and API bodies are streamed and cut off at `max_body_bytes` (a cut-off
+    API payload falls back to the HTML page); `extractor` is a
+    backend name from extract.BACKENDS or a callable (default: fastest installed).
+    Extraction runs in a pool of `extract_workers` threads (or processes, with
+    extract_executor="process") so parsing never blocks the event loop;
+    extract_workers=0 extracts inline. Call close() to shut the pool down.
+
+    Concurrent fetches of the same normalized URL share one request, and
+    404/410 answers are remembered for `negative_ttl` seconds (in the cache
+    too, when it supports mark_dead) and raise DeadLinkError without a fetch.
+    """
 
     def __init__(self,
                  cache: Optional[object],
-                 use_headless_fallback: bool = True):
+                 use_headless_fallback: bool = True,
+                 max_per_host: Optional[int] = None,
+                 max_concurrency: int = 6,
+                 host_scheduler: Optional[HostScheduler] = None,
+                 use_json_api: bool = True,
+                 api_bases: Optional[Dict[str, str]] = None,
+                 max_body_bytes: Optional[int] = MAX_BODY_BYTES,
+                 extractor: Union[str, Callable[[str], str], None] = None,
+                 extract_workers: int = 4,
+                 extract_executor: str = "thread",
+                 negative_ttl: float = NEGATIVE_TTL):
+        if extract_executor not in ("thread", "process"):
+            raise ValueError(
+                f"extract_executor must be 'thread' or 'process', "
+                f"not {extract_executor!r}")
         self.cache = cache
+        self.extract_workers = extract_workers
+        self.extract_executor = extract_executor
+        self._pool: Optional[Executor] = None
+        self.negative_ttl = negative_ttl
+        self._dead = _TTLMemo(DEAD_MEMO_ITEMS)  # url -> status
+        self._inflight: Dict[tuple, _Flight] = {}  # (loop, url) -> fetch
+        self.max_body_bytes = max_body_bytes
+        self.extract = (extractor if callable(extractor) else
+                        get_extractor(extractor))
         self.use_headless = use_headless_fallback
+        self.use_json_api = use_json_api
+        self.api_bases = api_bases
+        self._api_memo = _TTLMemo(API_MEMO_ITEMS)  # API url -> payload
+        self.hosts = host_scheduler or HostScheduler(
+            max_total=max_concurrency, max_per_host=max_per_host)
+        self._sessions: Dict[asyncio.AbstractEventLoop, _Session] = {}
+        self.counters = new_counters()  # Lifetime totals
+
+    @contextmanager
+    def counting(self, counters: Dict[str, Any]) -> Iterator[None]:
+        """
+        Also count this task's fetches (made inside the block) in
+        `counters`, a new_counters() dict, so concurrent runs sharing the
+        scraper each see only their own.
+        """
+        token = _run_counters.set(counters)
+        try:
+            yield
+        finally:
+            _run_counters.reset(token)
+
+    def _sinks(self) -> List[Dict[str, Any]]:
+        run = _run_counters.get()
+        return [self.counters] if run is None else [self.counters, run]
+
+    def _count(self, **deltas: float) -> None:
+        for c in self._sinks():
+            for key, n in deltas.items():
+                c[key] = (round(c[key] + n, 1)
+                          if isinstance(n, float) else c[key] + n)
+
+    async def open_session(self) -> None:
+        loop = asyncio.get_running_loop()
+        sess = self._sessions.get(loop)
+        if sess is None:
+            stack = AsyncExitStack()
+            client = await stack.enter_async_context(AsyncClientFactory())
+            sess = self._sessions[loop] = _Session(client, stack)
+        sess.refs += 1
+
+    async def close_session(self) -> None:
+        loop = asyncio.get_running_loop()
+        sess = self._sessions.get(loop)
+        if sess is None:
+            return
+        sess.refs -= 1
+        if sess.refs <= 0:
+            del self._sessions[loop]
+            await sess.stack.aclose()
+            self.hosts.forget_loop()
+
+    async def __aenter__(self) -> "JobScraper":
+        await self.open_session()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close_session()
+
+    def _extract_pool(self) -> Optional[Executor]:
+        if self._pool is None and self.extract_workers > 0:
+            cls = (ProcessPoolExecutor if self.extract_executor == "process"
+                   else ThreadPoolExecutor)
+            self._pool = cls(max_workers=self.extract_workers)
+        return self._pool
+
+    def close(self) -> None:
+        """Shut down the extraction pool (recreated on next use)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    async def _extract_text(self, html: str) -> str:
+        t0 = time.perf_counter()
+        pool = self._extract_pool()
+        if pool is None:
+            text, cpu = _timed_extract(self.extract, html)
+        else:
+            text, cpu = await asyncio.get_running_loop().run_in_executor(
+                pool, _timed_extract, self.extract, html)
+        self._count(extracted=1,
+                    extract_cpu_ms=cpu * 1000,
+                    extract_wall_ms=(time.perf_counter() - t0) * 1000)
+        return text
+
+    def _session(self) -> Optional[_Session]:
+        return self._sessions.get(asyncio.get_running_loop())
+
+    async def _get_page(self,
+                        url: str,
+                        source: str,
+                        headers: Optional[Dict[str, str]] = None,
+                        max_bytes: Optional[int] = None) -> _Page:
+        sess = self._session()
+        async with self.hosts.slot(url, source):
+            return await _fetch_html(url, sess.client if sess else None,
+                                     headers, max_bytes)
+
+    def _record_path(self, source: str, path: str, nbytes: int,
+                     t0: float) -> None:
+        ms = (time.perf_counter() - t0) * 1000
+        for c in self._sinks():
+            st = c["paths"].setdefault(f"{source}:{path}", {
+                "requests": 0,
+                "bytes": 0,
+                "ms": 0.0
+            })
+            st["requests"] += 1
+            st["bytes"] += nbytes
+            st["ms"] = round(st["ms"] + ms, 1)
+
+    async def _fetch_api_text(self, api: ApiRequest,
+                              source: str) -> Optional[str]:
+        data = self._api_memo.get(api.url)
+        if data is None:
+            t0 = time.perf_counter()
+            try:
+                page = await self._get_page(api.url, source,
+                                            {"Accept": "application/json"},
+                                            self.max_body_bytes)
+            except Exception:
+                self._count(api_fallbacks=1)
+                return None
+            self._record_path(source, "api", page.nbytes, t0)
+            self._count(bytes_downloaded=page.nbytes,
+                        truncated=page.truncated)
+            try:
+                if page.truncated:
+                    raise ValueError("API payload over max_body_bytes")
+                data = json.loads(page.text)
+            except ValueError:
+                self._count(api_fallbacks=1)
+                return None
+            self._api_memo.put(api.url, data, API_MEMO_TTL)
+        try:
+            text = api.parse(data)
+        except Exception:
+            text = None
+        if not text:
+            self._count(api_fallbacks=1)
+            return None
+        self._count(api_fetched=1)
+        return text
+
+    def _dead_status(self, url: str) -> Optional[int]:
+        status = self._dead.get(url)
+        if status is not None:
+            return status
+        dead_status = getattr(self.cache, "dead_status", None)
+        return dead_status(url) if dead_status else None
+
+    def _mark_dead(self, url: str, status: int) -> None:
+        self._dead.put(url, status, self.negative_ttl)
+        mark_dead = getattr(self.cache, "mark_dead", None)
+        if mark_dead:
+            mark_dead(url, status, self.negative_ttl)
 
     async def fetch_description(self, url: str) -> JobDescription:
         nurl = normalize_url(url)
+        status = self._dead_status(nurl)
+        if status is not None:
+            self._count(dead_skipped=1)
+            raise DeadLinkError(nurl, status)
+
+        key = (asyncio.get_running_loop(), nurl)
+        flight = self._inflight.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(self._fetch_description(nurl))
+            flight = self._inflight[key] = _Flight(task)
+            task.add_done_callback(lambda t: self._fetch_done(key, t))
+        else:
+            self._count(coalesced=1)
+        flight.waiters += 1
+        try:
+            # Shielded: one caller giving up doesn't cancel the others' fetch...
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            # ...but once every caller has, the fetch itself is cancelled
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _fetch_done(self, key: tuple, task: asyncio.Task) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Retrieved here in case every caller went away
+
+    async def _fetch_description(self, nurl: str) -> JobDescription:
         source = detect_source(nurl)
 
-        # Cache read
+        # Cache read; past its soft TTL an entry may still be revalidated
+        stale = None
         if self.cache:
             cached = self.cache.get(nurl)
             if cached:
                 return cached
+            get_stale = getattr(self.cache, "get_stale", None)
+            stale = get_stale(nurl) if get_stale else None
+
+        # Validators only come from the HTML path (API payloads carry none),
+        # and a 304 there skips download and extraction, so it goes first
+        revalidate = bool(stale and (stale.etag or stale.last_modified))
+        api = (api_request_for(nurl, source, self.api_bases)
+               if self.use_json_api and not revalidate else None)
+        text = await self._fetch_api_text(api, source) if api else None
+        page = _Page(status=200)
+
+        if text is None:
+            headers = {}
+            if stale and stale.etag:
+                headers["If-None-Match"] = stale.etag
+            if stale and stale.last_modified:
+                headers["If-Modified-Since"] = stale.last_modified
+
+            t0 = time.perf_counter()
+            try:
+                page = await self._get_page(nurl, source, headers,
+                                            self.max_body_bytes)
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                if status not in DEAD_STATUSES:
+                    raise
+                self._mark_dead(nurl, status)
+                raise DeadLinkError(nurl, status) from e
+            if page.status == 304 and stale:
+                # Unchanged: keep the cached text, skip download and extraction
+                self._count(revalidated=1, bytes_saved=stale.nbytes)
+                return self.cache.refresh(stale)
 
-        html = await _fetch_html(nurl)
-        text = _extract_text_static(html)
+            self._count(fetched=1,
+                        bytes_downloaded=page.nbytes,
+                        truncated=page.truncated)
+            text = await self._extract_text(page.text)
+            self._record_path(source, "html", page.nbytes, t0)
 
         # Optionally try headless if too little text
         if self.use_headless and len(text) < 500:
@@ -127,6 +528,9 @@ class JobScraper:
             text=text,
             source=source,
             fetched_at=datetime.now(timezone.utc),
+            etag=page.etag,
+            last_modified=page.last_modified,
+            nbytes=page.nbytes,
         )
 
         # Cache write
@@ -0,0 +1,67 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class LocalSite:
+    """
+    Keep-alive HTTP/1.1 server on 127.0.0.1 serving `routes`
+    (path -> (status, content_type, body bytes[, extra headers]) or a callable
+    taking the request headers and returning that tuple). Counts TCP connections
+    and requests so tests can compare client connection reuse.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.connections = 0
+        self.requests = []
+        self._lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with site._lock:
+                    site.connections += 1
+
+            def do_GET(self):
+                with site._lock:
+                    site.requests.append((self.path, dict(self.headers)))
+                route = site.routes.get(self.path.split("?")[0])
+                if callable(route):
+                    route = route(self.headers)
+                if route is None:
+                    route = (404, "text/plain", b"not found")
+                status, ctype, body = route[:3]
+                extra = route[3] if len(route) > 3 else {}
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                for k, v in extra.items():
+                    self.send_header(k, v)
+                self.end_headers()
+                if status != 304:
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def url(self, path: str) -> str:
+        return self.base + path
+
+
+@pytest.fixture
+def local_site():
+    site = LocalSite()
+    t = threading.Thread(target=site.server.serve_forever, daemon=True)
+    t.start()
+    yield site
+    site.server.shutdown()
+    site.server.server_close()
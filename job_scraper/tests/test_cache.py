@@ -0,0 +1,139 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from job_scraper.cache import DescriptionCache
+from job_scraper.scraper import JobDescription, JobScraper
+
+
+def JD(url, text="x" * 200, source="greenhouse"):
+    return JobDescription(url=url,
+                          text=text,
+                          source=source,
+                          fetched_at=datetime.now(timezone.utc))
+
+
+def test_roundtrip_is_keyed_by_normalized_url_and_compressed(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = DescriptionCache(path)
+    cache.put(JD("https://boards.greenhouse.io/acme/jobs/1", "Python " * 500))
+
+    # Memory tier
+    got = cache.get("https://boards.greenhouse.io/acme/jobs/1/apply")
+    assert got.text.startswith("Python")
+    assert cache.stats()["memory_hits"] == 1
+    assert cache.stats()["bytes"] < len("Python " * 500) // 10
+
+    # Fresh process: served from SQLite
+    cache2 = DescriptionCache(path)
+    got = cache2.get("https://boards.greenhouse.io/acme/jobs/1")
+    assert got.text.startswith("Python") and got.source == "greenhouse"
+    assert cache2.stats()["disk_hits"] == 1
+    assert cache2.get("https://boards.greenhouse.io/acme/jobs/2") is None
+    assert cache2.stats()["misses"] == 1
+
+
+def test_per_source_ttl_expiry():
+    now = [1000.0]
+    cache = DescriptionCache(ttls={"workday": 10},
+                             default_ttl=100,
+                             clock=lambda: now[0])
+    cache.put(JD("https://a.wd5.myworkdayjobs.com/j/1", source="workday"))
+    cache.put(JD("https://example.com/j/1", source="generic"))
+
+    now[0] += 50
+    assert cache.get("https://a.wd5.myworkdayjobs.com/j/1") is None
+    assert cache.get("https://example.com/j/1") is not None
+    assert cache.stats()["expired"] == 1
+
+
+def test_size_cap_evicts_least_recently_used():
+    now = [0.0]
+    cache = DescriptionCache(max_bytes=600,
+                             memory_items=2,
+                             clock=lambda: now[0])
+    texts = {}
+    for i in range(3):
+        now[0] += 1
+        # Incompressible-ish text so each row is a few hundred bytes
+        texts[i] = " ".join(str(i * 7919 + k * 104729) for k in range(60))
+        cache.put(JD(f"https://example.com/{i}", texts[i]))
+        if i == 1:
+            now[0] += 1
+            assert cache.get("https://example.com/0")  # 0 is now newer than 1
+
+    stats = cache.stats()
+    assert stats["bytes"] <= 600
+    assert stats["evictions"] >= 1
+    assert stats["memory_entries"] <= 2
+    assert cache.get("https://example.com/1") is None  # LRU victim
+    assert cache.get("https://example.com/2").text == texts[2]
+
+
+@pytest.mark.asyncio
+async def test_scraper_skips_fetch_on_cache_hit(local_site):
+    local_site.routes["/job"] = (200, "text/html",
+                                 b"<main>" + b"Kubernetes " * 20 + b"</main>")
+    cache = DescriptionCache()
+    scraper = JobScraper(cache=cache, use_headless_fallback=False)
+
+    first = await scraper.fetch_description(local_site.url("/job"))
+    second = await scraper.fetch_description(local_site.url("/job/apply"))
+    assert first.text == second.text
+    assert len(local_site.requests) == 1
+    assert cache.stats()["memory_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_entry_revalidates_with_etag_and_304(
+        local_site, monkeypatch):
+    body = b"<main>" + b"Distributed systems, Go, Kafka. " * 40 + b"</main>"
+
+    def route(headers):
+        if headers.get("If-None-Match") == '"v1"':
+            return (304, "text/html", b"", {"ETag": '"v1"'})
+        return (200, "text/html", body, {
+            "ETag": '"v1"',
+            "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"
+        })
+
+    local_site.routes["/job"] = route
+    now = [0.0]
+    cache = DescriptionCache(default_ttl=60, clock=lambda: now[0])
+    scraper = JobScraper(cache=cache, use_headless_fallback=False)
+
+    first = await scraper.fetch_description(local_site.url("/job"))
+    assert first.etag == '"v1"' and first.nbytes == len(body)
+
+    now[0] += 120  # Past the soft TTL
+    calls = []
+    monkeypatch.setattr(scraper, "extract",
+                        lambda html: calls.append(html) or "")
+    second = await scraper.fetch_description(local_site.url("/job"))
+
+    path, headers = local_site.requests[-1]
+    assert headers["If-None-Match"] == '"v1"'
+    assert headers["If-Modified-Since"] == "Wed, 01 Jan 2025 00:00:00 GMT"
+    assert second.text == first.text
+    assert calls == []  # No re-extraction on 304
+    assert scraper.counters["revalidated"] == 1
+    assert scraper.counters["bytes_saved"] == len(body)
+    assert scraper.counters["bytes_downloaded"] == len(body)
+
+    # Refreshed entry is fresh again: no request at all
+    n = len(local_site.requests)
+    await scraper.fetch_description(local_site.url("/job"))
+    assert len(local_site.requests) == n
+
+
+def test_stale_entries_outside_window_are_gone():
+    now = [0.0]
+    cache = DescriptionCache(default_ttl=10,
+                             revalidate_window=100,
+                             clock=lambda: now[0])
+    cache.put(JD("https://example.com/1", source="generic"))
+    now[0] = 50
+    assert cache.get("https://example.com/1") is None
+    assert cache.get_stale("https://example.com/1") is not None
+    now[0] = 200
+    assert cache.get_stale("https://example.com/1") is None
@@ -0,0 +1,91 @@
+from pathlib import Path
+
+import pytest
+
+from bs4 import BeautifulSoup
+
+from job_scraper.extract import (_CANDIDATES_ONLY, BACKENDS, available_backends,
+                                 extract_soup, get_extractor)
+from job_scraper.scraper import JobScraper
+
+FIXTURES = Path(__file__).parent / "fixtures"
+PAGES = sorted(FIXTURES.glob("*.html"))
+
+
+@pytest.mark.parametrize("page", PAGES, ids=lambda p: p.stem)
+def test_backends_agree_with_full_tree(page):
+    html = page.read_text()
+    expected = extract_soup(html, strain=False)
+    assert "Kubernetes" in expected
+    for name in available_backends():
+        assert BACKENDS[name][1](html) == expected, name
+
+
+@pytest.mark.parametrize("html,expected", [
+    ('<script type="application/ld+json">{"description": "<p>LD text</p>"}'
+     '</script><p>body</p>', "LD text"),
+    ("<html><body><p>plain</p><p>two</p></body></html>", "plain\ntwo"),
+    ("<div class='content'></div><main>Main text</main>", "Main text"),
+    ("", ""),
+    ('<div>Menu</div><span data-testid="JobDescription">Real job text</span>'
+     '<footer>foot</footer>', "Real job text"),
+    ("<table><tr><td id='content'>Cell text</td></tr></table>"
+     "<main>Main text</main>", "Cell text"),
+])
+def test_strained_parse_matches_fallbacks(html, expected):
+    assert extract_soup(html) == expected
+    assert extract_soup(html, strain=False) == expected
+
+
+def test_strainer_skips_non_candidate_subtrees():
+    # Fails if bs4 stops calling the filter hooks _CandidateStrainer overrides
+    soup = BeautifulSoup(
+        "<nav>Menu</nav><p>stray</p><div class='content'>Job</div>",
+        "html.parser",
+        parse_only=_CANDIDATES_ONLY)
+    assert soup.find("nav") is None and soup.find("p") is None
+    assert soup.get_text() == "Job"
+
+
+@pytest.mark.parametrize("html", [
+    "<main>Job<script>track()</script> text<style>p{}</style></main>",
+    "<body><p>Job</p><script>track()</script><template>t</template>"
+    "<p>text</p></body>",
+])
+def test_backends_skip_script_and_style_text(html):
+    expected = extract_soup(html, strain=False)
+    assert "track" not in expected and "p{}" not in expected
+    for name in available_backends():
+        assert BACKENDS[name][1](html) == expected, name
+
+
+def test_get_extractor_rejects_missing_backend(monkeypatch):
+    monkeypatch.delenv("HTML_EXTRACTOR", raising=False)
+    assert get_extractor() is BACKENDS[available_backends()[0]][1]
+    with pytest.raises(ValueError):
+        get_extractor("no-such-parser")
+
+
+@pytest.mark.asyncio
+async def test_body_is_capped_while_streaming(local_site):
+    head = b"<html><body><div class='job-description'>Go, Kafka</div>"
+    filler = b"<p>" + b"x" * 1000 + b"</p>"
+    local_site.routes["/big"] = (200, "text/html; charset=utf-8",
+                                 head + filler * 3000 + b"</body></html>")
+
+    async with JobScraper(cache=None,
+                          use_headless_fallback=False,
+                          max_body_bytes=64 * 1024) as scraper:
+        jd = await scraper.fetch_description(local_site.url("/big"))
+
+    assert jd.text == "Go, Kafka"
+    assert scraper.counters["bytes_downloaded"] == 64 * 1024
+    assert scraper.counters["truncated"] == 1
+
+
+def test_bench_reports_every_backend():
+    from bin.bench_extract import bench
+
+    results = bench([PAGES[0].read_text()], repeat=1)
+    assert set(results) == set(available_backends()) | {"html.parser-full"}
+    assert all(ms >= 0 for ms in results.values())
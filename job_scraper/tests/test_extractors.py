@@ -0,0 +1,189 @@
+from pathlib import Path
+
+import httpx
+import pytest
+
+import job_scraper.scraper as scr
+from job_scraper.extractors import api_request_for
+from job_scraper.scraper import JobScraper
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+LEVER_ID = "5f1c2d3e-4a5b-4c6d-8e9f-0a1b2c3d4e5f"
+ASHBY_ID = "8c2f0b6a-1d3e-4f5a-9b7c-6d5e4f3a2b1c"
+
+# source -> (posting URL, posting path, API path, HTML fixture, JSON fixture)
+CASES = {
+    "greenhouse":
+    ("https://boards.greenhouse.io/acme/jobs/4012345", "/acme/jobs/4012345",
+     "/v1/boards/acme/jobs/4012345", "greenhouse_job.html",
+     "greenhouse_job.json"),
+    "lever": (f"https://jobs.lever.co/acme/{LEVER_ID}", f"/acme/{LEVER_ID}",
+              f"/v0/postings/acme/{LEVER_ID}", "lever_posting.html",
+              "lever_posting.json"),
+    "ashby": (f"https://jobs.ashbyhq.com/acme/{ASHBY_ID}", f"/acme/{ASHBY_ID}",
+              "/posting-api/job-board/acme", "ashby_posting.html",
+              "ashby_board.json"),
+}
+
+
+def _fixture(name: str) -> bytes:
+    return (FIXTURES / name).read_bytes()
+
+
+@pytest.fixture
+def ats_site(local_site, monkeypatch):
+    """Serve every recorded posting page from local_site, whatever its host."""
+    for _, path, _, html_name, _ in CASES.values():
+        local_site.routes[path] = (200, "text/html", _fixture(html_name))
+
+    class ToLocalSite(httpx.AsyncBaseTransport):
+
+        def __init__(self):
+            self.inner = httpx.AsyncHTTPTransport()
+
+        async def handle_async_request(self, request):
+            port = local_site.server.server_address[1]
+            request.url = request.url.copy_with(scheme="http",
+                                                host="127.0.0.1",
+                                                port=port)
+            return await self.inner.handle_async_request(request)
+
+        async def aclose(self):
+            await self.inner.aclose()
+
+    monkeypatch.setattr(scr, "AsyncClientFactory",
+                        lambda: httpx.AsyncClient(transport=ToLocalSite()))
+    return local_site
+
+
+def test_api_request_for_maps_posting_urls():
+    for source, (url, _, api_path, _, _) in CASES.items():
+        req = api_request_for(url, source)
+        assert req is not None and req.url.endswith(api_path)
+    embed = ("https://boards.greenhouse.io/embed/job_app?for=acme&token=4012345")
+    assert api_request_for(embed, "greenhouse").url.endswith(
+        "/v1/boards/acme/jobs/4012345")
+    assert api_request_for("https://jobs.lever.co/acme", "lever") is None
+    assert api_request_for("https://acme.wd5.myworkdayjobs.com/x",
+                           "workday") is None
+
+
+@pytest.mark.asyncio
+async def test_json_api_matches_html_with_fewer_bytes(ats_site):
+    for _, _, api_path, _, json_name in CASES.values():
+        ats_site.routes[api_path] = (200, "application/json",
+                                     _fixture(json_name))
+
+    api = JobScraper(cache=None,
+                     use_headless_fallback=False,
+                     api_bases={s: ats_site.base
+                                for s in CASES})
+    page = JobScraper(cache=None,
+                      use_headless_fallback=False,
+                      use_json_api=False)
+    async with api, page:
+        for source, (url, *_) in CASES.items():
+            via_api = await api.fetch_description(url)
+            via_html = await page.fetch_description(url)
+            for phrase in ("New Grad Software Engineer", "Kubernetes",
+                           "distributed systems"):
+                assert phrase in via_api.text
+                assert phrase in via_html.text
+            assert via_api.source == source
+
+    assert api.counters["api_fetched"] == len(CASES)
+    assert api.counters["fetched"] == 0  # No HTML page downloaded
+    for source in CASES:
+        a = api.counters["paths"][f"{source}:api"]
+        h = page.counters["paths"][f"{source}:html"]
+        assert a["bytes"] * 4 < h["bytes"]
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_html_when_api_fails(ats_site):
+    # No API routes: every API call 404s
+    scraper = JobScraper(cache=None,
+                         use_headless_fallback=False,
+                         api_bases={s: ats_site.base
+                                    for s in CASES})
+    async with scraper:
+        for url, *_ in CASES.values():
+            jd = await scraper.fetch_description(url)
+            assert "Kubernetes" in jd.text
+
+    assert scraper.counters["api_fallbacks"] == len(CASES)
+    assert scraper.counters["fetched"] == len(CASES)
+
+
+@pytest.mark.asyncio
+async def test_ashby_board_payload_is_reused(ats_site):
+    url, _, api_path, _, json_name = CASES["ashby"]
+    ats_site.routes[api_path] = (200, "application/json", _fixture(json_name))
+    scraper = JobScraper(cache=None,
+                         use_headless_fallback=False,
+                         api_bases={"ashby": ats_site.base})
+    async with scraper:
+        for _ in range(3):
+            await scraper.fetch_description(url)
+
+    board_hits = [p for p, _ in ats_site.requests if p == api_path]
+    assert len(board_hits) == 1
+    assert scraper.counters["api_fetched"] == 3
+
+
+@pytest.mark.asyncio
+async def test_api_payload_over_byte_cap_falls_back_to_html(ats_site):
+    url, _, api_path, html_name, json_name = CASES["greenhouse"]
+    cap = len(_fixture(html_name)) + 1024
+    # Valid JSON, but bigger than the cap
+    payload = _fixture(json_name) + b" " * cap
+    ats_site.routes[api_path] = (200, "application/json", payload)
+    scraper = JobScraper(cache=None,
+                         use_headless_fallback=False,
+                         api_bases={"greenhouse": ats_site.base},
+                         max_body_bytes=cap)
+    async with scraper:
+        jd = await scraper.fetch_description(url)
+
+    assert "Kubernetes" in jd.text
+    assert scraper.counters["api_fallbacks"] == 1
+    assert scraper.counters["truncated"] == 1
+    assert scraper.counters["paths"]["greenhouse:api"]["bytes"] == cap
+    assert scraper.counters["fetched"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_html_entry_revalidates_before_trying_the_api(ats_site):
+    from job_scraper.cache import DescriptionCache
+
+    url, path, api_path, html_name, json_name = CASES["greenhouse"]
+    page = _fixture(html_name)
+
+    def route(headers):
+        if headers.get("If-None-Match") == '"v1"':
+            return (304, "text/html", b"", {"ETag": '"v1"'})
+        return (200, "text/html", page, {"ETag": '"v1"'})
+
+    ats_site.routes[path] = route
+    now = [0.0]
+    cache = DescriptionCache(ttls={}, default_ttl=60, clock=lambda: now[0])
+    html_first = JobScraper(cache=cache,
+                            use_headless_fallback=False,
+                            use_json_api=False)
+    async with html_first:
+        first = await html_first.fetch_description(url)
+    assert first.etag == '"v1"'
+
+    ats_site.routes[api_path] = (200, "application/json",
+                                 _fixture(json_name))
+    now[0] += 120  # Past the soft TTL
+    scraper = JobScraper(cache=cache,
+                         use_headless_fallback=False,
+                         api_bases={"greenhouse": ats_site.base})
+    async with scraper:
+        second = await scraper.fetch_description(url)
+
+    assert second.text == first.text
+    assert scraper.counters["revalidated"] == 1
+    assert not [p for p, _ in ats_site.requests if p == api_path]
@@ -0,0 +1,178 @@
+import asyncio
+
+import pytest
+
+from common.models import JobListing
+from job_scraper.enrich import enrich_descriptions
+from job_scraper.politeness import HostScheduler, HostPolicy, CircuitOpenError
+from job_scraper.scraper import JobScraper
+
+
+def _job(i, url):
+    return JobListing(id=str(i),
+                      date_posted=0,
+                      url=url,
+                      company_name="A",
+                      title="T",
+                      locations=[],
+                      sponsorship="",
+                      active=True)
+
+
+@pytest.mark.asyncio
+async def test_slow_host_cannot_starve_other_hosts():
+    hosts = HostScheduler(max_total=6,
+                          policies={"workday": HostPolicy(max_concurrency=2)})
+    release = asyncio.Event()
+    workday = {"in_flight": 0, "max": 0}
+    done = []
+
+    async def slow(i):
+        async with hosts.slot(f"https://x.wd5.myworkdayjobs.com/{i}",
+                              "workday"):
+            workday["in_flight"] += 1
+            workday["max"] = max(workday["max"], workday["in_flight"])
+            await release.wait()
+            workday["in_flight"] -= 1
+
+    async def fast(i):
+        async with hosts.slot(f"https://boards.greenhouse.io/{i}",
+                              "greenhouse"):
+            done.append(i)
+
+    stuck = [asyncio.ensure_future(slow(i)) for i in range(6)]
+    await asyncio.sleep(0)  # Six workday jobs queued first, two hold slots
+    # Greenhouse gets through while workday is still held up; the timeout
+    # only stops a starved run from hanging
+    await asyncio.wait_for(asyncio.gather(*(fast(i) for i in range(3))), 5)
+    assert done == [0, 1, 2] and workday["in_flight"] == 2
+
+    release.set()
+    await asyncio.gather(*stuck)
+    assert workday["max"] == 2  # Workday ran two at a time
+    assert hosts.snapshot()["workday:x.wd5.myworkdayjobs.com"]["requests"] == 6
+
+
+@pytest.mark.asyncio
+async def test_min_interval_spaces_request_starts():
+    delays = []
+
+    async def fake_sleep(seconds):
+        delays.append(seconds)
+        await asyncio.sleep(0)
+
+    # The clock stands still: all four arrive at once and queue up
+    hosts = HostScheduler(
+        policies={"icims": HostPolicy(max_concurrency=4, min_interval=0.05)},
+        clock=lambda: 100.0,
+        sleep=fake_sleep)
+
+    async def fetch():
+        async with hosts.slot("https://careers-x.icims.com/jobs/1", "icims"):
+            pass
+
+    await asyncio.gather(*(fetch() for _ in range(4)))
+    assert delays == pytest.approx([0.05, 0.10, 0.15])
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_after_consecutive_5xx(local_site):
+    for i in range(8):
+        local_site.routes[f"/bad/{i}"] = (503, "text/plain", b"down")
+    local_site.routes["/ok"] = (200, "text/html",
+                                b"<main>Python developer</main>")
+
+    hosts = HostScheduler(max_total=1,
+                          default_policy=HostPolicy(failure_threshold=3,
+                                                    cooldown=60))
+    scraper = JobScraper(cache=None,
+                         use_headless_fallback=False,
+                         host_scheduler=hosts)
+    jobs = [_job(i, local_site.url(f"/bad/{i}")) for i in range(8)]
+    stats = await enrich_descriptions(jobs, scraper)
+
+    host = stats["hosts_lifetime"]["generic:127.0.0.1"]
+    assert stats["failed"] == 3 and stats["circuit_open"] == 5
+    assert host["failures"] == 3 and host["short_circuited"] == 5
+    assert host["circuit_open"] is True
+    assert len(local_site.requests) == 3  # Only the first three hit the host
+    assert all(j.description is None for j in jobs)
+
+    # Still open for this host until the cooldown passes
+    with pytest.raises(CircuitOpenError):
+        await scraper.fetch_description(local_site.url("/ok"))
+
+
+@pytest.mark.asyncio
+async def test_half_open_trial_closes_circuit_on_success():
+    clock = [0.0]
+    hosts = HostScheduler(default_policy=HostPolicy(failure_threshold=1,
+                                                    cooldown=10),
+                          clock=lambda: clock[0])
+    url = "https://example.com/job"
+
+    with pytest.raises(RuntimeError):
+        async with hosts.slot(url, "generic"):
+            raise RuntimeError("boom")
+    with pytest.raises(CircuitOpenError):
+        async with hosts.slot(url, "generic"):
+            pass
+
+    clock[0] = 11.0  # Cooldown elapsed -> one trial request allowed
+    async with hosts.slot(url, "generic"):
+        pass
+    snap = hosts.snapshot()["generic:example.com"]
+    assert snap["circuit_open"] is False and snap["consecutive_failures"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_leaves_breaker_state_alone():
+    clock = [0.0]
+    hosts = HostScheduler(default_policy=HostPolicy(failure_threshold=2,
+                                                    cooldown=10),
+                          clock=lambda: clock[0])
+    url = "https://example.com/job"
+
+    async def fail():
+        async with hosts.slot(url, "generic"):
+            raise RuntimeError("boom")
+
+    async def hang():
+        async with hosts.slot(url, "generic"):
+            await asyncio.sleep(10)
+
+    async def cancelled():
+        task = asyncio.ensure_future(hang())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with pytest.raises(RuntimeError):
+        await fail()
+    await cancelled()  # Doesn't reset the failure streak...
+    with pytest.raises(RuntimeError):
+        await fail()
+    assert hosts.snapshot()["generic:example.com"]["circuit_open"] is True
+
+    clock[0] = 11.0
+    await cancelled()  # ...nor close the circuit as a half-open trial
+    snap = hosts.snapshot()["generic:example.com"]
+    assert snap["circuit_open"] is True and snap["consecutive_failures"] == 2
+    assert snap["requests"] == 2
+
+
+def test_gates_are_dropped_with_the_session():
+    hosts = HostScheduler()
+    scraper = JobScraper(cache=None,
+                         use_headless_fallback=False,
+                         host_scheduler=hosts)
+
+    async def run():
+        async with scraper:
+            async with hosts.slot("https://example.com/job", "generic"):
+                assert len(hosts._loop_gates) == 1
+
+    for _ in range(3):
+        asyncio.run(run())
+    assert len(hosts._loop_gates) == 0
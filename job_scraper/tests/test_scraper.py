@@ -1,3 +1,7 @@
+import asyncio
+import threading
+import time
+import httpx
 import pytest
 from job_scraper.scraper import JobScraper, JobDescription, normalize_url, detect_source
 
@@ -8,9 +12,7 @@ async def test_ashby_application_rewrite_and_extract(monkeypatch):
     url = "https://jobs.ashbyhq.com/ramp/8c...f4da/application"
     normalized = "https://jobs.ashbyhq.com/ramp/8c...f4da"
 
-    class FakeResp:
-        status_code = 200
-        text = """
+    html = """
         <html><body>
           <div data-testid="JobDescription">
             <p>We’re looking for a Backend Engineer with Python, Postgres, and AWS.</p>
@@ -18,23 +20,14 @@ async def test_ashby_application_rewrite_and_extract(monkeypatch):
         </body></html>
         """
 
-        def raise_for_status(self):
-            pass
-
-    class FakeClient:
-
-        async def __aenter__(self):
-            return self
-
-        async def __aexit__(self, *args):
-            return False
-
-        async def get(self, url, **kwargs):
-            assert url == normalized
-            return FakeResp()
+    def handler(request):
+        assert str(request.url) == normalized
+        return httpx.Response(200, html=html)
 
     import job_scraper.scraper as scr
-    monkeypatch.setattr(scr, "AsyncClientFactory", lambda: FakeClient())
+    monkeypatch.setattr(
+        scr, "AsyncClientFactory",
+        lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
 
     scraper = JobScraper(cache=None, use_headless_fallback=False)
     jd = await scraper.fetch_description(url)
@@ -47,26 +40,13 @@ async def test_ashby_application_rewrite_and_extract(monkeypatch):
 async def test_generic_fallback_extracts_visible_text(monkeypatch):
     url = "https://example.com/job/123"
 
-    class FakeResp:
-        status_code = 200
-        text = "<html><body><main><h1>Title</h1><div class='job-description'>Kubernetes, Go, gRPC</div></main></body></html>"
-
-        def raise_for_status(self):
-            pass
-
-    class FakeClient:
-
-        async def __aenter__(self):
-            return self
-
-        async def __aexit__(self, *args):
-            return False
-
-        async def get(self, url, **kwargs):
-            return FakeResp()
+    html = "<html><body><main><h1>Title</h1><div class='job-description'>Kubernetes, Go, gRPC</div></main></body></html>"
 
     import job_scraper.scraper as scr
-    monkeypatch.setattr(scr, "AsyncClientFactory", lambda: FakeClient())
+    monkeypatch.setattr(
+        scr, "AsyncClientFactory", lambda: httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda r: httpx.Response(
+                200, html=html))))
 
     scraper = JobScraper(cache=None, use_headless_fallback=False)
     jd = await scraper.fetch_description(url)
@@ -81,3 +61,268 @@ def test_normalize_basic_rules():
                          ) == "https://boards.greenhouse.io/x/jobs/123"
     assert normalize_url(
         "https://jobs.lever.co/x/123/apply") == "https://jobs.lever.co/x/123"
+
+
+def _job_page(i):
+    return (b"<html><body><div class='job-description'>Role " +
+            str(i).encode() + b": Python, Kubernetes</div></body></html>")
+
+
+@pytest.mark.asyncio
+async def test_pooled_session_reuses_connections(local_site):
+    n = 30
+    for i in range(n):
+        local_site.routes[f"/jobs/{i}"] = (200, "text/html", _job_page(i))
+    urls = [local_site.url(f"/jobs/{i}") for i in range(n)]
+
+    # One-shot client per URL: a fresh TCP connection every time
+    scraper = JobScraper(cache=None, use_headless_fallback=False)
+    await asyncio.gather(*(scraper.fetch_description(u) for u in urls))
+    unpooled = local_site.connections
+
+    # Shared pool: bounded by the per-host limit, reused across the batch
+    local_site.connections = 0
+    async with JobScraper(cache=None,
+                          use_headless_fallback=False,
+                          max_per_host=4) as pooled:
+        results = await asyncio.gather(*(pooled.fetch_description(u)
+                                         for u in urls))
+    reused = local_site.connections
+
+    assert all("Kubernetes" in jd.text for jd in results)
+    assert unpooled == n
+    assert reused <= 4
+
+
+@pytest.mark.asyncio
+async def test_enrich_descriptions_shares_one_pool(local_site):
+    from common.models import JobListing
+    from job_scraper.enrich import enrich_descriptions
+
+    jobs = []
+    for i in range(12):
+        local_site.routes[f"/jobs/{i}"] = (200, "text/html", _job_page(i))
+        jobs.append(
+            JobListing(id=str(i),
+                       date_posted=0,
+                       url=local_site.url(f"/jobs/{i}"),
+                       company_name="A",
+                       title="T",
+                       locations=[],
+                       sponsorship="",
+                       active=True))
+
+    scraper = JobScraper(cache=None,
+                         use_headless_fallback=False,
+                         max_per_host=2)
+    await enrich_descriptions(jobs, scraper, concurrency=6)
+
+    assert all("Python" in j.description for j in jobs)
+    assert all(j.tags == {"python", "kubernetes"} for j in jobs)
+    assert local_site.connections <= 2
+    assert scraper._sessions == {}  # Pool closed after the batch
+
+
+def _threaded_extract(threads):
+    """Extractor that records the thread each call runs on."""
+
+    def extract(html):
+        threads.append(threading.get_ident())
+        return "Python, Kubernetes " * 5
+
+    return extract
+
+
+@pytest.mark.asyncio
+async def test_extraction_runs_off_the_event_loop(local_site):
+    urls = []
+    for i in range(4):
+        local_site.routes[f"/jobs/{i}"] = (200, "text/html", _job_page(i))
+        urls.append(local_site.url(f"/jobs/{i}"))
+    loop_thread = threading.get_ident()
+
+    inline_threads, pooled_threads = [], []
+    inline = JobScraper(cache=None,
+                        use_headless_fallback=False,
+                        extractor=_threaded_extract(inline_threads),
+                        extract_workers=0)
+    pooled = JobScraper(cache=None,
+                        use_headless_fallback=False,
+                        extractor=_threaded_extract(pooled_threads),
+                        extract_workers=4)
+    for scraper in (inline, pooled):
+        async with scraper:
+            await asyncio.gather(*(scraper.fetch_description(u)
+                                   for u in urls))
+    pooled.close()
+
+    assert inline_threads == [loop_thread] * 4
+    assert len(pooled_threads) == 4
+    assert loop_thread not in pooled_threads
+    assert pooled.counters["extracted"] == 4
+
+
+@pytest.mark.asyncio
+async def test_enrich_reports_wall_and_cpu_time(local_site):
+    from common.models import JobListing
+    from job_scraper.enrich import enrich_descriptions
+
+    local_site.routes["/jobs/0"] = (200, "text/html", _job_page(0))
+    job = JobListing(id="0",
+                     date_posted=0,
+                     url=local_site.url("/jobs/0"),
+                     company_name="A",
+                     title="T",
+                     locations=[],
+                     sponsorship="",
+                     active=True)
+    scraper = JobScraper(cache=None, use_headless_fallback=False)
+    stats = await enrich_descriptions([job], scraper)
+    scraper.close()
+
+    assert stats["wall_ms"] > 0
+    assert stats["process_cpu_ms"] >= 0
+    assert stats["extract_cpu_ms"] > 0
+    assert stats["scraper"]["extracted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_enrich_runs_report_their_own_counters(local_site):
+    from common.models import JobListing
+    from job_scraper.enrich import enrich_descriptions
+
+    for i in range(3):
+        local_site.routes[f"/jobs/{i}"] = (200, "text/html", _job_page(i))
+
+    def jobs(ids):
+        return [
+            JobListing(id=str(i),
+                       date_posted=0,
+                       url=local_site.url(f"/jobs/{i}"),
+                       company_name="A",
+                       title="T",
+                       locations=[],
+                       sponsorship="",
+                       active=True) for i in ids
+        ]
+
+    scraper = JobScraper(cache=None, use_headless_fallback=False)
+    # Two repos' runs sharing one scraper on one loop
+    first, second = await asyncio.gather(
+        enrich_descriptions(jobs([0, 1]), scraper),
+        enrich_descriptions(jobs([2]), scraper))
+    scraper.close()
+
+    assert first["scraper"]["fetched"] == 2
+    assert first["scraper"]["extracted"] == 2
+    assert second["scraper"]["fetched"] == 1
+    assert second["scraper"]["extracted"] == 1
+    assert second["scraper"]["paths"]["generic:html"]["requests"] == 1
+    # The scraper's own counters stay lifetime totals
+    assert scraper.counters["fetched"] == 3
+
+
+@pytest.mark.asyncio
+async def test_concurrent_fetches_of_one_posting_share_a_request(local_site):
+
+    def slow_page(headers):
+        time.sleep(0.2)  # Keep the first fetch in flight while the rest arrive
+        return (200, "text/html", _job_page(1))
+
+    local_site.routes["/jobs/1"] = slow_page
+    variants = ["/jobs/1", "/jobs/1/apply", "/jobs/1/application"] * 3
+
+    async with JobScraper(cache=None, use_headless_fallback=False) as scraper:
+        results = await asyncio.gather(*(scraper.fetch_description(
+            local_site.url(v)) for v in variants))
+
+    assert len(local_site.requests) == 1
+    assert scraper.counters["coalesced"] == len(variants) - 1
+    assert all(jd is results[0] for jd in results)
+    assert scraper._inflight == {}
+
+
+@pytest.mark.asyncio
+async def test_dead_links_are_not_refetched(local_site):
+    from job_scraper.cache import DescriptionCache
+    from job_scraper.scraper import DeadLinkError
+
+    local_site.routes["/gone"] = (410, "text/html", b"closed")
+    now = [0.0]
+    cache = DescriptionCache(clock=lambda: now[0])
+
+    scraper = JobScraper(cache=cache, use_headless_fallback=False)
+    with pytest.raises(DeadLinkError) as e:
+        await scraper.fetch_description(local_site.url("/gone"))
+    assert e.value.status == 410
+    with pytest.raises(DeadLinkError):
+        await scraper.fetch_description(local_site.url("/gone/apply"))
+    assert len(local_site.requests) == 1
+    assert scraper.counters["dead_skipped"] == 1
+
+    # Next poll (new scraper, same cache file) skips it too...
+    later = JobScraper(cache=cache, use_headless_fallback=False)
+    with pytest.raises(DeadLinkError):
+        await later.fetch_description(local_site.url("/gone"))
+    assert len(local_site.requests) == 1
+
+    # ...until the negative TTL runs out
+    now[0] += scraper.negative_ttl + 1
+    local_site.routes["/gone"] = (200, "text/html", _job_page(2))
+    jd = await later.fetch_description(local_site.url("/gone"))
+    assert "Kubernetes" in jd.text
+    assert len(local_site.requests) == 2
+
+
+def test_ttl_memo_is_bounded_and_drops_expired_entries(monkeypatch):
+    from job_scraper import scraper as scr
+
+    now = [0.0]
+    monkeypatch.setattr(scr.time, "monotonic", lambda: now[0])
+    memo = scr._TTLMemo(max_items=3)
+    for i in range(3):
+        memo.put(i, f"v{i}", ttl=10)
+    assert memo.get(0) == "v0"  # 0 is now the most recently used
+    memo.put(3, "v3", ttl=10)
+    assert memo.get(1) is None and len(memo) == 3  # LRU entry evicted
+
+    now[0] = 11.0
+    memo.put(4, "v4", ttl=10)
+    assert len(memo) == 1 and memo.get(4) == "v4"  # Expired ones dropped
+    now[0] = 22.0
+    assert memo.get(4) is None and len(memo) == 0
+
+
+@pytest.mark.asyncio
+async def test_enrich_deadline_cancels_outstanding_fetches(local_site):
+    from common.models import JobListing
+    from job_scraper.enrich import enrich_descriptions
+
+    def hang(headers):
+        time.sleep(2)
+        return (200, "text/html", _job_page(9))
+
+    local_site.routes["/fast"] = (200, "text/html", _job_page(1))
+    local_site.routes["/hang"] = hang
+    jobs = [
+        JobListing(id=p,
+                   date_posted=0,
+                   url=local_site.url(f"/{p}"),
+                   company_name="A",
+                   title="T",
+                   locations=[],
+                   sponsorship="",
+                   active=True) for p in ("fast", "hang")
+    ]
+    scraper = JobScraper(cache=None, use_headless_fallback=False)
+    t0 = time.monotonic()
+    stats = await enrich_descriptions(jobs, scraper, deadline=0.5)
+
+    assert time.monotonic() - t0 < 1.5
+    assert "Python" in jobs[0].description
+    assert jobs[1].description is None
+    assert stats["fetched"] == 1 and stats["timed_out"] == 1
+    assert stats["stragglers"] == [{"id": "hang", "url": jobs[1].url}]
+    await asyncio.sleep(0.1)  # Let the cancelled fetch unwind
+    assert scraper._inflight == {}  # The hanging fetch itself was cancelled
+    scraper.close()
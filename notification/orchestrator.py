@@ -1,102 +1,724 @@
 import asyncio
-from typing import List, Dict, Any
+import time
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
 from common.models import UserContact, JobListing, UserPreferences
 from github_poller.matcher import MatchingEngine
-from persistence.repositories import RepoStateRepository, SentNotificationsRepository
+from github_poller.parser import DiffParser
+from github_poller.dedupe import RunListings, content_hash, listing_key, newest_per_key
+from persistence.repositories import RepoStateRepository, SentNotificationsRepository, EnrichmentQueueRepository, OutboxRepository, SeenListingsRepository, UserShardRepository
+from persistence.lock import Lease, LeaseLost
 from notification.service import NotificationService
+from notification.users import description_terms
 from job_scraper.scraper import JobScraper
-from job_scraper.enrich import enrich_descriptions
+from job_scraper.enrich import EnrichmentRun
 
 NEW_GRAD_REPO = "SimplifyJobs/New-Grad-Positions"
 INTERNSHIP_REPO = "SimplifyJobs/Summer2026-Internships"  # Update if repo name changes
 
+# Keys of the seeded repos; the legacy subscribe_* flags map onto these
+NEW_GRAD_KEY = "new_grad"
+INTERNSHIP_KEY = "internship"
+_LEGACY_REPO_KEYS = {
+    NEW_GRAD_REPO: NEW_GRAD_KEY,
+    INTERNSHIP_REPO: INTERNSHIP_KEY,
+}
 
-def _user_subscribed_to_repo(prefs: UserPreferences, repo_name: str) -> bool:
-    if repo_name == NEW_GRAD_REPO:
-        return bool(prefs.subscribe_new_grad)
-    if repo_name == INTERNSHIP_REPO:
-        return bool(prefs.subscribe_internship)
-    # Default: unknown repo -> treat as not subscribed
-    return False
 
+def subscribed_repo_keys(prefs: UserPreferences) -> Set[str]:
+    keys = set(prefs.subscribed_repos or [])
+    if prefs.subscribe_new_grad:
+        keys.add(NEW_GRAD_KEY)
+    if prefs.subscribe_internship:
+        keys.add(INTERNSHIP_KEY)
+    return keys
 
-def _run_async(coro):
+
+def user_subscribed_to_repo(prefs: UserPreferences, repo_key: str) -> bool:
+    # Unknown repo keys -> treat as not subscribed
+    return repo_key in subscribed_repo_keys(prefs)
+
+
+def plan_enrichment(jobs: List[JobListing],
+                    users: List[UserContact]) -> List[JobListing]:
     """
-    Safely run an async coroutine from sync context.
-    If there is already a running loop (e.g., in some environments), use it.
+    Jobs worth scraping: those where at least one of `users` (already filtered
+    to verified subscribers) can't be decided on title/company/locations.
     """
-    try:
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        loop = None
+    return [j for j in jobs if _needs_description(j, users)]
+
+
+def _needs_description(job: JobListing, users: List[UserContact]) -> bool:
+    return any(MatchingEngine.cheap_match(job, u.prefs) is None for u in users)
+
+
+def _claimed_digests(
+    recipients: List[UserContact], unsent: Dict[str, List[JobListing]],
+    claimed_pairs: List[Tuple[str, str]]
+) -> List[Tuple[UserContact, List[JobListing]]]:
+    """(user, jobs) per recipient with at least one claimed job, in order."""
+    claimed = set(claimed_pairs)
+    out = []
+    for user in recipients:
+        new_matches = []
+        for j in unsent.get(user.id, []):
+            if (user.id, j.id) in claimed:
+                claimed.discard((user.id, j.id))  # duplicate listing ids
+                new_matches.append(j)
+        if new_matches:
+            out.append((user, new_matches))
+    return out
 
-    if loop and loop.is_running():
-        # We're already inside an event loop - create a task and wait
-        # NOTE: only safe if caller itself is async; for pure sync code, prefer asyncio.run
-        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+def fan_out_batch(jobs: List[JobListing],
+                  users: List[UserContact],
+                  repo_key: str,
+                  repo_label: str,
+                  sent_repo: SentNotificationsRepository,
+                  notifier: NotificationService,
+                  outbox: Optional[OutboxRepository] = None,
+                  cheap_only: bool = False,
+                  heartbeat: Optional[Callable[[], Any]] = None
+                  ) -> Dict[str, Any]:
+    """
+    Match already parsed (and enriched) `jobs` against `users`, then dedupe,
+    claim and send one digest per user, as the pipeline's last stages do.
+    Used for one user shard of a batch; `cheap_only` matches on listing
+    fields only, as two-phase mode does. `heartbeat` (e.g. renewing the
+    shard's lease) is called before claiming and before each send.
+    Returns counts.
+    """
+    recipients = [
+        u for u in users
+        if u.is_verified and user_subscribed_to_repo(u.prefs, repo_key)
+    ]
+    unsent: Dict[str, List[JobListing]] = {}
+    for user in recipients:
+        if cheap_only:
+            hits = [
+                j for j in jobs
+                if MatchingEngine.cheap_match(j, user.prefs) is True
+            ]
+        else:
+            hits = [j for j in jobs if MatchingEngine.matches(j, user.prefs)]
+        if hits:
+            fresh = set(sent_repo.filter_unsent(user.id, [j.id for j in hits]))
+            unsent[user.id] = [j for j in hits if j.id in fresh]
+    pairs = [(uid, j.id) for uid, js in unsent.items() for j in js]
+    beat = heartbeat or (lambda: None)
+
+    messages = []
+    beat()
+    if outbox is not None:
+        digests: List[Tuple[UserContact, List[JobListing]]] = []
+
+        def render(claimed):
+            digests.extend(_claimed_digests(recipients, unsent, claimed))
+            messages.extend(m for user, js in digests
+                            for m in notifier.render(user, js, repo_label))
+            return messages
+
+        outbox.stage(pairs, render)
     else:
+        digests = _claimed_digests(recipients, unsent,
+                                   sent_repo.mark_sent_many(pairs))
+        for user, js in digests:
+            beat()
+            notifier.send_summary(user, js, repo_label=repo_label)
+    return {
+        "users": len(recipients),
+        "users_notified": len(digests),
+        "jobs_sent_total": sum(len(js) for _, js in digests),
+        "messages_queued": len(messages),
+    }
+
+
+def run_async(coro):
+    """
+    Run an async coroutine to completion from sync code. Inside a running
+    event loop that would block the loop the coroutine needs, so it raises
+    RuntimeError instead: async callers await the *_async variant directly.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
         return asyncio.run(coro)
+    coro.close()  # Never started; closing avoids a "never awaited" warning
+    raise RuntimeError(
+        "run_async() called from a running event loop; await the coroutine "
+        "(e.g. run_poll_for_repo_async) instead")
+
+
+class RunDigest:
+    """
+    Cross-repo aggregation for one run: each repo adds its users' unsent
+    matches instead of claiming and sending them, then flush() claims every
+    pair in one transaction, sends one message per user per channel with a
+    section per repo label, and only then records the repos' processed
+    listings and advances their SHAs.
+    """
+
+    def __init__(self):
+        # user_id -> (user, [(repo_label, jobs)]) in the order repos added them
+        self.users: Dict[str, Tuple[UserContact,
+                                    List[Tuple[str, List[JobListing]]]]] = {}
+        self.shas: List[Tuple[RepoStateRepository, str, str,
+                              Optional[int]]] = []
+        self.seen: List[Tuple[SeenListingsRepository, str,
+                              List[Tuple[str, str]]]] = []
+
+    def add(self, user: UserContact, repo_label: str,
+            jobs: List[JobListing]) -> None:
+        self.users.setdefault(user.id, (user, []))[1].append(
+            (repo_label, jobs))
+
+    def defer_sha(self,
+                  state_repo: RepoStateRepository,
+                  repo_name: str,
+                  sha: str,
+                  fence_token: Optional[int] = None) -> None:
+        self.shas.append((state_repo, repo_name, sha, fence_token))
+
+    def defer_seen(self, seen_listings: SeenListingsRepository,
+                   repo_name: str, entries: List[Tuple[str, str]]) -> None:
+        self.seen.append((seen_listings, repo_name, entries))
+
+    def flush(self,
+              sent_repo: SentNotificationsRepository,
+              notifier: NotificationService,
+              outbox: Optional[OutboxRepository] = None) -> Dict[str, Any]:
+        """
+        Claim, send (or queue in `outbox`) and advance SHAs. Returns counts,
+        including the messages saved versus one message per repo and the
+        SHAs not advanced because the repo's lease was taken over meanwhile.
+        """
+        pairs = [(uid, j.id) for uid, (_, sections) in self.users.items()
+                 for _, jobs in sections for j in jobs]
+        counts = {
+            "users_notified": 0,
+            "messages_sent": 0,
+            "messages_saved": 0,
+            "shas_fenced": 0
+        }
+        messages = []
+
+        def render(claimed_pairs):
+            claimed = set(claimed_pairs)
+            for user, sections in self.users.values():
+                kept = []
+                for repo_label, jobs in sections:
+                    new = []
+                    for j in jobs:
+                        if (user.id, j.id) in claimed:
+                            # A job listed in two repos goes out once
+                            claimed.discard((user.id, j.id))
+                            new.append(j)
+                    if new:
+                        kept.append((repo_label, new))
+                msgs = notifier.render_sections(user, kept)
+                if msgs:
+                    counts["users_notified"] += 1
+                    counts["messages_sent"] += len(msgs)
+                    counts["messages_saved"] += len(msgs) * (len(kept) - 1)
+                messages.extend(msgs)
+            return messages
+
+        if outbox is not None:
+            outbox.stage(pairs, render)
+        else:
+            for msg in render(sent_repo.mark_sent_many(pairs)):
+                notifier.deliver(msg)
+        for seen_listings, repo_name, entries in self.seen:
+            seen_listings.record(repo_name, entries)
+        for state_repo, repo_name, sha, fence_token in self.shas:
+            if not state_repo.upsert_last_sha(repo_name, sha, fence_token):
+                counts["shas_fenced"] += 1
+        self.users.clear()
+        self.shas.clear()
+        self.seen.clear()
+        return counts
+
+
+_DONE = object()  # End-of-stream marker between pipeline stages
+
+
+class _Stage:
+    """
+    A pipeline stage's bounded input queue plus the counters reported under
+    stats["stages"]: items handled, peak queue depth, busy time, throughput.
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.items = 0
+        self.max_depth = 0
+        self.busy = 0.0
+        self._first: Optional[float] = None
+        self._last: Optional[float] = None
+
+    async def put(self, item) -> None:
+        await self.queue.put(item)
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def done(self, t0: float, n: int = 1) -> None:
+        """Record `n` items handled by work that started at `t0`."""
+        now = time.perf_counter()
+        self.items += n
+        self.busy += now - t0
+        if self._first is None:
+            self._first = t0
+        self._last = now
+
+    def stats(self) -> Dict[str, Any]:
+        span = (self._last - self._first) if self.items else 0.0
+        return {
+            "items": self.items,
+            "max_queue_depth": self.max_depth,
+            "busy_ms": round(self.busy * 1000, 1),
+            "items_per_s": round(self.items / span, 1) if span > 0 else None,
+        }
 
 
 def run_poll_for_repo(
     repo_name: str,
     repo_label: str,
-    poller,  # Must have fetch_new_listings(since_sha) -> (List[JobListing], latest_sha)
+    poller,  # fetch_new_listings(since_sha) -> (jobs, latest_sha); commit_diffs optional
     users: List[UserContact],
     sent_repo: SentNotificationsRepository,
     state_repo: RepoStateRepository,
     notifier: NotificationService,
     scraper: JobScraper,
+    repo_key: Optional[str] = None,
+    enrichment_queue: Optional[EnrichmentQueueRepository] = None,
+    enrich_deadline: Optional[float] = None,
+    outbox: Optional[OutboxRepository] = None,
+    seen_listings: Optional[SeenListingsRepository] = None,
+    user_shards: Optional[UserShardRepository] = None,
+    lease: Optional[Lease] = None,
 ) -> Dict[str, Any]:
     """
+    Sync wrapper around run_poll_for_repo_async.
     Polls a single repo, matches jobs to users, sends at most ONE notification per user,
     dedupes via sent_notifications, and updates last_sha when done.
+    `repo_key` is the subscription key from the repos table; it defaults to the
+    key of the seeded repo with this name.
+    With `enrichment_queue` (two-phase mode), nothing is scraped here: jobs that
+    match on listing fields are sent right away, and jobs that need a
+    description are queued for drain_enrichment_queue's follow-up digest.
+    `enrich_deadline` (seconds from the start of the run) bounds scraping:
+    stragglers are cancelled and matched without a description, so the run
+    always finishes and advances the SHA.
+    With an `outbox`, digests are queued (committed with their dedupe marks)
+    for drain_outbox instead of sent inline.
+    With `seen_listings`, listings this repo already processed with the same
+    content are dropped after parsing, so a reprocessed commit page costs only
+    its new or edited listings; processed ones (stragglers excepted) are
+    recorded with the SHA.
+    With `user_shards`, the run stops after enrichment: its jobs are written
+    once as a batch with a pending row per user shard, for drain_user_shards
+    to match and send on whichever workers hold the shards' leases.
+    With the repo's `lease`, claims and writes stop with LeaseLost once it
+    has been taken over, and the SHA write is fenced with its token.
     Returns stats for logging/metrics.
     """
+    return run_async(
+        run_poll_for_repo_async(repo_name=repo_name,
+                                repo_label=repo_label,
+                                poller=poller,
+                                users=users,
+                                sent_repo=sent_repo,
+                                state_repo=state_repo,
+                                notifier=notifier,
+                                scraper=scraper,
+                                repo_key=repo_key,
+                                enrichment_queue=enrichment_queue,
+                                enrich_deadline=enrich_deadline,
+                                outbox=outbox,
+                                seen_listings=seen_listings,
+                                user_shards=user_shards,
+                                lease=lease))
+
+
+async def run_poll_for_repo_async(
+    repo_name: str,
+    repo_label: str,
+    poller,
+    users: List[UserContact],
+    sent_repo: SentNotificationsRepository,
+    state_repo: RepoStateRepository,
+    notifier: NotificationService,
+    scraper: JobScraper,
+    repo_key: Optional[str] = None,
+    enrichment_queue: Optional[EnrichmentQueueRepository] = None,
+    enrich_deadline: Optional[float] = None,
+    outbox: Optional[OutboxRepository] = None,
+    concurrency: int = 6,
+    queue_size: int = 64,
+    dedupe_chunk: int = 500,
+    send_concurrency: int = 1,
+    run_digest: Optional[RunDigest] = None,
+    run_listings: Optional[RunListings] = None,
+    seen_listings: Optional[SeenListingsRepository] = None,
+    user_shards: Optional[UserShardRepository] = None,
+    lease: Optional[Lease] = None,
+) -> Dict[str, Any]:
+    """
+    run_poll_for_repo as a staged pipeline:
+
+        poll -> parse -> enrich -> match -> dedupe -> send
+
+    Stages are joined by bounded asyncio.Queues (`queue_size`), so each starts
+    on the first item upstream produces and a slow stage backs up the ones
+    before it rather than buffering. Pollers with commit_diffs() stream one
+    commit at a time; others are read with fetch_new_listings() in one go.
+    Parsing drops repeat copies of a listing (same id, or same canonical URL
+    without one): commit diffs arrive newest first, so the first copy is the
+    newest; batches keep the most recently updated. Jobs are matched as soon
+    as they are parsed (or enriched, when their match depends on the
+    description). With `run_listings` (shared by the repos of one run), a
+    listing another repo already enriched isn't fetched again. Once matching ends, users are
+    deduped and claimed in chunks of `dedupe_chunk`, and `send_concurrency`
+    senders deliver each chunk's digests while later chunks are claimed.
+    With a `run_digest`, unsent matches and the new SHA are handed to it
+    instead; its flush() claims and sends them across repos.
+    Stats add per-stage counters under "stages".
+    """
+    t_start = time.perf_counter()
+    first_sent_ms: Optional[int] = None
+    repo_key = repo_key or _LEGACY_REPO_KEYS.get(repo_name, repo_name)
     last_sha = state_repo.get_last_sha(repo_name) or ""
-    jobs, latest_sha = poller.fetch_new_listings(last_sha)
+    latest_sha = last_sha
+    two_phase = enrichment_queue is not None
+    deadline_at = (None if enrich_deadline is None else t_start +
+                   enrich_deadline)
 
-    # Enrich descriptions for all new jobs (bounded concurrency inside)
-    if jobs:
-        _run_async(enrich_descriptions(jobs, scraper, concurrency=6))
+    recipients = [
+        u for u in users
+        if u.is_verified and user_subscribed_to_repo(u.prefs, repo_key)
+    ]
 
-    users_notified = 0
-    jobs_sent_total = 0
-    jobs_considered = len(jobs)
+    stages = {
+        name: _Stage(queue_size)
+        for name in ("poll", "parse", "enrich", "match", "dedupe", "send")
+    }
+    parse, enrich, match = stages["parse"], stages["enrich"], stages["match"]
+    dedupe, send = stages["dedupe"], stages["send"]
 
-    # For each user: filter by subscription, match, dedupe, batch send
-    for user in users:
-        if not user.is_verified:
-            continue
-        if not _user_subscribed_to_repo(user.prefs, repo_name):
-            continue
-
-        # Apply matching
-        candidates = [j for j in jobs if MatchingEngine.matches(j, user.prefs)]
-
-        # Idempotent dedupe: mark before send; only keep newly marked
-        new_matches: List[JobListing] = []
-        for j in candidates:
-            if not sent_repo.was_sent(user.id, j.id):
-                sent_repo.mark_sent(user.id, j.id)
-                new_matches.append(j)
+    jobs: List[JobListing] = []
+    order: Dict[int, int] = {}  # id(job) -> parse order, for digest order
+    seen: Set[str] = set()  # listing keys parsed so far
+    processed: List[Tuple[str, str]] = []  # (key, content hash) for the ledger
+    duplicates = {
+        "in_repo": 0,
+        "cross_repo": 0,
+        "enrich_reused": 0,
+        "already_seen": 0
+    }
+    to_scrape: List[JobListing] = []
+    matched: Dict[str, List[JobListing]] = {}  # user_id -> candidates
+    digests: List[Tuple[UserContact, List[JobListing]]] = []
+    enrich_run: Optional[EnrichmentRun] = None
+    messages_queued = 0
+
+    async def poll_stage():
+        nonlocal latest_sha
+        t0 = time.perf_counter()
+        if hasattr(poller, "commit_diffs"):
+            diffs, latest_sha = await asyncio.to_thread(poller.commit_diffs,
+                                                        last_sha)
+            while True:
+                t0 = time.perf_counter()
+                diff = await asyncio.to_thread(next, diffs, _DONE)
+                if diff is _DONE:
+                    break
+                stages["poll"].done(t0)
+                await parse.put(("diff", diff))
+        else:
+            found, latest_sha = await asyncio.to_thread(
+                poller.fetch_new_listings, last_sha)
+            stages["poll"].done(t0)
+            await parse.put(("jobs", found))
+        await parse.put(_DONE)
+
+    async def parse_stage():
+        while (item := await parse.queue.get()) is not _DONE:
+            t0 = time.perf_counter()
+            kind, payload = item
+            if kind == "diff":
+                found = DiffParser.parse_added_listings(payload)
+            else:
+                found, dropped = newest_per_key(payload)
+                duplicates["in_repo"] += dropped
+            fresh = []
+            for job in found:
+                key = listing_key(job)
+                if key in seen:
+                    duplicates["in_repo"] += 1
+                    continue
+                seen.add(key)
+                fresh.append((key, job))
+            if seen_listings is not None and fresh:
+                # Processed by an earlier run and unchanged since
+                entries = [(key, content_hash(job)) for key, job in fresh]
+                unseen = set(seen_listings.filter_unseen(repo_name, entries))
+                duplicates["already_seen"] += len(entries) - len(unseen)
+                fresh = [(key, job) for (key, job), e in zip(fresh, entries)
+                         if e in unseen]
+                processed.extend(e for e in entries if e in unseen)
+            found = []
+            for key, job in fresh:
+                if run_listings is not None and run_listings.seen_elsewhere(
+                        key, repo_name):
+                    duplicates["cross_repo"] += 1
+                found.append(job)
+            routed = []
+            for job in found:
+                order[id(job)] = len(jobs)
+                jobs.append(job)
+                # Only jobs whose match still depends on the description are
+                # scraped; two-phase mode queues them for the enrichment worker
+                undecided = _needs_description(job, recipients)
+                if undecided:
+                    to_scrape.append(job)
+                routed.append(enrich if undecided and not two_phase else match)
+            parse.done(t0, len(found))
+            for stage, job in zip(routed, found):
+                await stage.put(job)
+        await enrich.put(_DONE)
+
+    async def enrich_stage():
+        nonlocal enrich_run
+        # Host-aware scrapers bound concurrency themselves (per host, then
+        # globally), so a slow host can't sit on every slot while others wait
+        hosts = getattr(scraper, "hosts", None)
+        sem = asyncio.Semaphore(concurrency) if hosts is None else None
+        pooled = hasattr(scraper, "open_session")
+        in_flight: Set[asyncio.Future] = set()
+        claimed: Dict[str, JobListing] = {}  # fetches other repos wait on
+
+        async def one(job: JobListing, shared: Optional[asyncio.Future]):
+            t0 = time.perf_counter()
+            try:
+                remaining = (None if deadline_at is None else deadline_at -
+                             time.perf_counter())
+                if remaining is not None and remaining <= 0:
+                    enrich_run.timed_out(job)
+                elif shared is not None:
+                    # Another repo in this run is fetching (or fetched) it
+                    try:
+                        other = await asyncio.wait_for(asyncio.shield(shared),
+                                                       remaining)
+                        job.description, job.tags = other.description, other.tags
+                        duplicates["enrich_reused"] += 1
+                    except asyncio.TimeoutError:
+                        enrich_run.timed_out(job)
+                else:
+                    try:
+                        await asyncio.wait_for(enrich_run.fetch(job),
+                                               remaining)
+                    except asyncio.TimeoutError:
+                        enrich_run.timed_out(job)
+            finally:
+                if run_listings is not None and shared is None:
+                    run_listings.done(listing_key(job), job)
+                    claimed.pop(listing_key(job), None)
+                if sem is not None and shared is None:
+                    sem.release()
+            enrich.done(t0)
+            await match.put(job)
+
+        try:
+            while (job := await enrich.queue.get()) is not _DONE:
+                shared = (run_listings.claim(listing_key(job))
+                          if run_listings is not None else None)
+                if run_listings is not None and shared is None:
+                    claimed[listing_key(job)] = job
+                if enrich_run is None:
+                    enrich_run = EnrichmentRun(scraper, enrich_deadline,
+                                               description_terms(users))
+                    # One pooled client for the whole run
+                    if pooled:
+                        await scraper.open_session()
+                # Waiting on another repo's fetch doesn't take a fetch slot
+                if sem is not None and shared is None:
+                    await sem.acquire()
+                task = asyncio.ensure_future(one(job, shared))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            if in_flight:
+                await asyncio.gather(*in_flight)
+        finally:
+            # Cancelled (or a fetch failed): stop the fetches still running
+            # before their pooled session is closed under them
+            pending = list(in_flight)
+            for task in pending:
+                task.cancel()
+            try:
+                await asyncio.gather(*pending, return_exceptions=True)
+            finally:
+                # Claims whose fetch never ran or finished: publish them
+                # undescribed so repos waiting on them don't hang
+                for key, job in claimed.items():
+                    run_listings.done(key, job)
+                if enrich_run is not None and pooled:
+                    await scraper.close_session()
+        await match.put(_DONE)
 
-        if not new_matches:
-            continue
+    async def match_stage():
+        while (job := await match.queue.get()) is not _DONE:
+            t0 = time.perf_counter()
+            # Sharded: matching happens per shard, from the batch
+            for user in (recipients if user_shards is None else ()):
+                # Two-phase: only what's decided without a description
+                if two_phase:
+                    hit = MatchingEngine.cheap_match(job, user.prefs) is True
+                else:
+                    hit = MatchingEngine.matches(job, user.prefs)
+                if hit:
+                    matched.setdefault(user.id, []).append(job)
+            match.done(t0)
+        with_matches = [u for u in recipients if u.id in matched]
+        for i in range(0, len(with_matches), dedupe_chunk):
+            await dedupe.put(with_matches[i:i + dedupe_chunk])
+        await dedupe.put(_DONE)
 
-        notifier.send_summary(user, new_matches, repo_label=repo_label)
-        users_notified += 1
-        jobs_sent_total += len(new_matches)
+    async def dedupe_stage():
+        nonlocal messages_queued
+        while (chunk := await dedupe.queue.get()) is not _DONE:
+            if lease is not None:
+                lease.check()  # Taken over: its new holder redoes the run
+            t0 = time.perf_counter()
+            # Drop jobs already sent, then mark the rest in one transaction
+            # before sending; only pairs this run claimed are sent
+            unsent: Dict[str, List[JobListing]] = {}
+            for user in chunk:
+                candidates = sorted(matched[user.id],
+                                    key=lambda j: order[id(j)])
+                fresh = set(
+                    sent_repo.filter_unsent(user.id,
+                                            [j.id for j in candidates]))
+                unsent[user.id] = [j for j in candidates if j.id in fresh]
+            pairs = [(uid, j.id) for uid, js in unsent.items() for j in js]
+            if run_digest is not None:
+                claimed_digests = [(u, unsent[u.id]) for u in chunk
+                                   if unsent[u.id]]
+                for user, js in claimed_digests:
+                    run_digest.add(user, repo_label, js)
+            elif outbox is not None:
+                claimed_digests: List[Tuple[UserContact,
+                                            List[JobListing]]] = []
+                messages = []
 
-    # Advance SHA after processing; safe even if no users were notified
+                def render(claimed):
+                    claimed_digests.extend(
+                        _claimed_digests(chunk, unsent, claimed))
+                    messages.extend(
+                        m for user, js in claimed_digests
+                        for m in notifier.render(user, js, repo_label))
+                    return messages
+
+                outbox.stage(pairs, render)
+                messages_queued += len(messages)
+            else:
+                claimed_digests = _claimed_digests(
+                    chunk, unsent, sent_repo.mark_sent_many(pairs))
+            digests.extend(claimed_digests)
+            dedupe.done(t0, len(chunk))
+            if outbox is None and run_digest is None:
+                for digest in claimed_digests:
+                    await send.put(digest)
+        for _ in range(send_concurrency):
+            await send.put(_DONE)
+
+    async def send_worker():
+        nonlocal first_sent_ms
+        while (digest := await send.queue.get()) is not _DONE:
+            t0 = time.perf_counter()
+            user, new_matches = digest
+            await asyncio.to_thread(notifier.send_summary,
+                                    user,
+                                    new_matches,
+                                    repo_label=repo_label)
+            if first_sent_ms is None:
+                first_sent_ms = int((time.perf_counter() - t_start) * 1000)
+            send.done(t0)
+
+    tasks = [
+        asyncio.ensure_future(c)
+        for c in (poll_stage(), parse_stage(), enrich_stage(), match_stage(),
+                  dedupe_stage(), *(send_worker()
+                                    for _ in range(send_concurrency)))
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # A failed stage stops the rest instead of leaving them blocked
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    jobs_deferred = 0
+    if to_scrape and two_phase:
+        jobs_deferred = enrichment_queue.enqueue(repo_name, repo_key,
+                                                 repo_label, to_scrape)
+    if lease is not None:
+        lease.check()
+    shard_batch_id = None
+    if user_shards is not None and jobs and recipients:
+        shard_batch_id = user_shards.create_batch(repo_name,
+                                                  repo_key,
+                                                  repo_label,
+                                                  jobs,
+                                                  cheap_only=two_phase)
+    enrich_stats: Dict[str, Any] = {}
+    if enrich_run is not None:
+        enrich_run.jobs = len(to_scrape)
+        enrich_stats = enrich_run.stats()
+
+    # Listings whose scrape was cut off were matched without a description;
+    # leaving them out of the ledger gives a later re-read another go
+    if enrich_run is not None and enrich_run.stragglers:
+        cut_off = {s["id"] for s in enrich_run.stragglers}
+        cut_keys = {listing_key(j) for j in jobs if j.id in cut_off}
+        processed = [e for e in processed if e[0] not in cut_keys]
+
+    # Record processed listings, then advance SHA; safe even if no users were
+    # notified. Both wait for the run's claims, so a crash just reprocesses.
+    if processed:
+        if run_digest is not None:
+            run_digest.defer_seen(seen_listings, repo_name, processed)
+        else:
+            seen_listings.record(repo_name, processed)
+    fence_token = lease.token if lease is not None else None
     if latest_sha and latest_sha != last_sha:
-        state_repo.upsert_last_sha(repo_name, latest_sha)
+        if run_digest is not None:
+            run_digest.defer_sha(state_repo, repo_name, latest_sha,
+                                 fence_token)
+        elif not state_repo.upsert_last_sha(repo_name, latest_sha,
+                                            fence_token):
+            raise LeaseLost(f"{repo_name}: a later lease advanced the SHA")
 
+    # Pollers that don't count commits: any SHA movement counts as one
+    commits_seen = getattr(poller, "last_commit_count", None)
+    if commits_seen is None:
+        commits_seen = int(bool(latest_sha) and latest_sha != last_sha)
+
+    jobs_considered = len(jobs)
     return {
         "repo_name": repo_name,
         "last_sha_before": last_sha,
         "last_sha_after": latest_sha or last_sha,
+        "commits_seen": commits_seen,
         "jobs_considered": jobs_considered,
-        "users_notified": users_notified,
-        "jobs_sent_total": jobs_sent_total,
+        "jobs_scraped": len(to_scrape),
+        "jobs_scrape_skipped": jobs_considered - len(to_scrape),
+        "jobs_deferred": jobs_deferred,
+        "users_notified": len(digests),
+        "jobs_sent_total": sum(len(js) for _, js in digests),
+        "messages_queued": messages_queued,
+        "shard_batch_id": shard_batch_id,
+        # Run start -> first send returned (None if nothing was sent)
+        "time_to_first_notification_ms": first_sent_ms,
+        "enrichment": enrich_stats,
+        "duplicates": duplicates,
+        "stages": {name: st.stats() for name, st in stages.items()},
     }
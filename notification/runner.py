@@ -1,13 +1,140 @@
-from typing import Dict, Any, List
+import asyncio
+import time
+import uuid
+from contextlib import AsyncExitStack, nullcontext
+from datetime import datetime, timezone
+from typing import Callable, Dict, Any, List, Optional
 from persistence.repositories import (RepoStateRepository,
                                       SentNotificationsRepository,
-                                      UserRepository)
+                                      UserRepository, WebhookEventRepository,
+                                      RepoConfigRepository,
+                                      EnrichmentQueueRepository,
+                                      OutboxRepository,
+                                      SeenListingsRepository,
+                                      UserShardRepository)
+from persistence.lock import acquire_lock_async
 from notification.service import NotificationService
-from notification.orchestrator import (run_poll_for_repo, NEW_GRAD_REPO,
-                                       INTERNSHIP_REPO)
-from notification.users import hydrate_users
+from notification.orchestrator import (RunDigest, fan_out_batch, run_async,
+                                       run_poll_for_repo_async,
+                                       user_subscribed_to_repo)
+from notification.users import description_terms, hydrate_users, shard_of
 from job_scraper.scraper import JobScraper
+from job_scraper.enrich import enrich_descriptions
+from github_poller.matcher import MatchingEngine
 from github_poller.poller import GithubPoller
+from github_poller.dedupe import RunListings
+from github_poller.scheduler import AdaptivePollScheduler
+from common.models import RepoConfig
+
+
+def _make_poller(cfg: RepoConfig, github_token: str) -> GithubPoller:
+    return GithubPoller(cfg.owner,
+                        cfg.repo,
+                        token=github_token,
+                        branch=cfg.branch)
+
+
+async def _run_repo_locked(cfg: RepoConfig,
+                           lock_conn,
+                           lock_owner: Optional[str],
+                           scheduler: Optional[AdaptivePollScheduler] = None,
+                           leases: Optional[AsyncExitStack] = None,
+                           **kwargs) -> Optional[Dict[str, Any]]:
+    """
+    Run one repo under its own `poller:{repo}` lock (if lock_owner is given).
+    The lock's lease renews itself for as long as the run takes, and the
+    run's SHA write is fenced with its token. With `leases`, the lock is
+    entered on that stack instead, and stays held until the caller closes it.
+    With a scheduler, the next poll time is recorded in repo_state afterwards.
+    Stats gain the repo's `run_ms`, `lock_wait_ms` and `lease_renewals`.
+    Returns None when another instance holds the lock.
+    """
+    t0 = time.monotonic()
+    if lock_owner:
+        lock = acquire_lock_async(lock_conn,
+                                  name=f"poller:{cfg.full_name}",
+                                  owner=lock_owner,
+                                  ttl_seconds=120)
+    else:
+        lock = nullcontext(None)
+    async with AsyncExitStack() as stack:
+        lease = await (stack if leases is None else
+                       leases).enter_async_context(lock)
+        if lock_owner and lease is None:
+            print(f"[{cfg.key}] Another instance holds the lock; skipping.")
+            return None
+        t_locked = time.monotonic()
+        state_repo = kwargs["state_repo"]
+        state_before = state_repo.get_state(cfg.full_name)
+        polled_at = datetime.now(timezone.utc)
+        stats = await run_poll_for_repo_async(repo_name=cfg.full_name,
+                                              repo_label=cfg.label,
+                                              repo_key=cfg.key,
+                                              lease=lease,
+                                              **kwargs)
+        if scheduler is not None:
+            decision = scheduler.next_poll(state_before,
+                                           stats["commits_seen"],
+                                           now=polled_at)
+            state_repo.record_schedule(cfg.full_name, decision, polled_at)
+            stats["next_poll_at"] = decision.next_poll_at.isoformat()
+            stats["next_poll_reason"] = decision.reason
+        stats["lock_wait_ms"] = int((t_locked - t0) * 1000)
+        stats["run_ms"] = int((time.monotonic() - t_locked) * 1000)
+        if lease is not None:
+            stats["lease_renewals"] = lease.renewals
+        return stats
+
+
+async def _run_repos(
+        repo_configs: List[RepoConfig], scraper: JobScraper,
+        max_concurrent: int,
+        repo_kwargs: Callable[[RepoConfig], Dict[str, Any]],
+        run_digest: Optional[RunDigest] = None,
+        flush_kwargs: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Every repo as a task on this loop, sharing the scraper's HTTP pool.
+    With a `run_digest`, it's flushed (with `flush_kwargs`) once every repo
+    has run, while their locks are still held, into stats["digest"].
+    """
+    sem = asyncio.Semaphore(max_concurrent)
+    # A digest's matches are claimed and its SHAs advanced by the flush, so
+    # each repo's lock is kept, not released, until the flush is done
+    leases = AsyncExitStack()
+
+    async def one(cfg: RepoConfig):
+        async with sem:
+            return await _run_repo_locked(
+                cfg,
+                scraper=scraper,
+                leases=leases if run_digest is not None else None,
+                **repo_kwargs(cfg))
+
+    # One pooled client (and one set of per-host gates) for every repo
+    pooled = hasattr(scraper, "open_session")
+    if pooled:
+        await scraper.open_session()
+    async with leases:
+        try:
+            results = await asyncio.gather(
+                *(one(cfg) for cfg in repo_configs), return_exceptions=True)
+        finally:
+            if pooled:
+                await scraper.close_session()
+        digest = (run_digest.flush(**flush_kwargs)
+                  if run_digest is not None else None)
+
+    stats = {}
+    for cfg, repo_stats in zip(repo_configs, results):
+        if isinstance(repo_stats, Exception):
+            # One repo failing must not stop the others from advancing
+            print(f"[{cfg.key}] error: {repo_stats}")
+            repo_stats = {"repo_name": cfg.full_name, "error": str(repo_stats)}
+        if repo_stats is not None:
+            stats[cfg.full_name] = repo_stats
+    if digest is not None:
+        stats["digest"] = digest
+    return stats
 
 
 def run_all_repos_once(
@@ -17,33 +144,410 @@ def run_all_repos_once(
     notifier: NotificationService,
     scraper: JobScraper,
     github_token: str = "",
+    repo_configs: Optional[List[RepoConfig]] = None,
+    lock_owner: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    scheduler: Optional[AdaptivePollScheduler] = None,
+    enrichment_queue: Optional[EnrichmentQueueRepository] = None,
+    enrich_deadline: Optional[float] = None,
+    outbox: Optional[OutboxRepository] = None,
+    combine_repos: bool = False,
+    seen_listings: Optional[SeenListingsRepository] = None,
+    user_shards: Optional[UserShardRepository] = None,
 ) -> Dict[str, Any]:
-    """Run both repos once. Returns a dict of stats by repo_name."""
+    """
+    Run every configured repo once, concurrently, each under its own lock.
+    Repos run as tasks on one event loop, so they share the hydrated user
+    snapshot, the scraper's HTTP pool, per-host limits and in-flight fetches;
+    `max_workers` caps how many run at once (default: all).
+    Repos come from the repos table unless `repo_configs` is given.
+    With a scheduler, repos whose next_poll_at is in the future are skipped.
+    With an enrichment_queue, notifications are two-phase (see run_poll_for_repo).
+    `enrich_deadline` caps each repo's description scraping, in seconds.
+    With an outbox, digests are queued for drain_outbox instead of sent.
+    With `combine_repos`, each user gets one message per channel for the
+    whole run, with a section per repo; SHAs advance once it's sent, and
+    stats["digest"] reports messages sent and saved.
+    With `seen_listings`, listings a repo already processed unchanged are
+    skipped (see run_poll_for_repo).
+    With `user_shards`, each repo's jobs are written as a batch for
+    drain_user_shards instead of matched and sent here.
+    Returns a dict of stats by repo_name (repos skipped on lock contention are
+    omitted); each repo's stats include its own run_ms and lock_wait_ms.
+    """
+    if combine_repos and user_shards is not None:
+        raise ValueError("combine_repos and user_shards are exclusive")
     rows = user_repo.list_verified_users()
     users = hydrate_users(rows)
+    if repo_configs is None:
+        repo_configs = RepoConfigRepository(user_repo.conn).list_repos()
+
+    stats = {}
+    if scheduler is not None:
+        due = []
+        for cfg in repo_configs:
+            state = state_repo.get_state(cfg.full_name)
+            if scheduler.is_due(state):
+                due.append(cfg)
+            else:
+                stats[cfg.full_name] = {
+                    "repo_name": cfg.full_name,
+                    "skipped": "not due",
+                    "next_poll_at": state["next_poll_at"],
+                    "next_poll_reason": state["next_poll_reason"],
+                }
+        repo_configs = due
+    if not repo_configs:
+        return stats
+
+    run_digest = RunDigest() if combine_repos else None
+    run_listings = RunListings()
+    stats.update(
+        run_async(
+            _run_repos(repo_configs,
+                       scraper,
+                       max_workers or len(repo_configs),
+                       repo_kwargs=lambda cfg: dict(
+                           lock_conn=user_repo.conn,
+                           lock_owner=lock_owner,
+                           scheduler=scheduler,
+                           poller=_make_poller(cfg, github_token),
+                           users=users,
+                           sent_repo=sent_repo,
+                           state_repo=state_repo,
+                           notifier=notifier,
+                           enrichment_queue=enrichment_queue,
+                           enrich_deadline=enrich_deadline,
+                           outbox=outbox,
+                           run_digest=run_digest,
+                           run_listings=run_listings,
+                           seen_listings=seen_listings,
+                           user_shards=user_shards),
+                       run_digest=run_digest,
+                       flush_kwargs=dict(sent_repo=sent_repo,
+                                         notifier=notifier,
+                                         outbox=outbox))))
+    return stats
 
-    ng_poller = GithubPoller("SimplifyJobs",
-                             "New-Grad-Positions",
-                             token=github_token)
-    intern_poller = GithubPoller("SimplifyJobs",
-                                 "Summer2026-Internships",
-                                 token=github_token)
 
+def _lag_ms(received_at_iso: str) -> int:
+    received = datetime.fromisoformat(received_at_iso)
+    return int((datetime.now(timezone.utc) - received).total_seconds() * 1000)
+
+
+def drain_webhook_queue(
+    webhook_repo: WebhookEventRepository,
+    user_repo: UserRepository,
+    state_repo: RepoStateRepository,
+    sent_repo: SentNotificationsRepository,
+    notifier: NotificationService,
+    scraper: JobScraper,
+    github_token: str = "",
+    lock_owner: Optional[str] = None,
+    enrichment_queue: Optional[EnrichmentQueueRepository] = None,
+    enrich_deadline: Optional[float] = None,
+    outbox: Optional[OutboxRepository] = None,
+    seen_listings: Optional[SeenListingsRepository] = None,
+    user_shards: Optional[UserShardRepository] = None,
+) -> Dict[str, Any]:
+    """
+    Poll every repo that has pending webhook events, then mark those events
+    processed. The pushed SHAs only signal that work exists; the poller still
+    walks commits from last_sha so nothing is skipped or processed twice.
+    If lock_owner is given, each repo runs under the same `poller:{repo}` lock
+    as bin/poll_once.py; a repo whose lock is busy keeps its events pending.
+    Returns stats by repo_name (empty if the queue was empty).
+    """
+    pending = webhook_repo.pending_repos()
+    if not pending:
+        return {}
+
+    users = hydrate_users(user_repo.list_verified_users())
+    repo_configs = RepoConfigRepository(user_repo.conn)
     stats = {}
-    stats[NEW_GRAD_REPO] = run_poll_for_repo(repo_name=NEW_GRAD_REPO,
-                                             repo_label="New Grad",
-                                             poller=ng_poller,
-                                             users=users,
-                                             sent_repo=sent_repo,
-                                             state_repo=state_repo,
-                                             notifier=notifier,
-                                             scraper=scraper)
-    stats[INTERNSHIP_REPO] = run_poll_for_repo(repo_name=INTERNSHIP_REPO,
-                                               repo_label="Internships",
-                                               poller=intern_poller,
-                                               users=users,
-                                               sent_repo=sent_repo,
-                                               state_repo=state_repo,
-                                               notifier=notifier,
-                                               scraper=scraper)
+    for entry in pending:
+        repo_name = entry["repo_name"]
+        cfg = repo_configs.get_by_full_name(repo_name)
+        if cfg is None or not cfg.enabled:
+            # Not a repo we track; drop its events so they don't pile up
+            webhook_repo.mark_processed(repo_name, entry["max_id"])
+            continue
+
+        t0 = time.time()
+        repo_stats = run_async(
+            _run_repo_locked(cfg,
+                             webhook_repo.conn,
+                             lock_owner,
+                             poller=_make_poller(cfg, github_token),
+                             users=users,
+                             sent_repo=sent_repo,
+                             state_repo=state_repo,
+                             notifier=notifier,
+                             scraper=scraper,
+                             enrichment_queue=enrichment_queue,
+                             enrich_deadline=enrich_deadline,
+                             outbox=outbox,
+                             seen_listings=seen_listings,
+                             user_shards=user_shards))
+        if repo_stats is None:
+            continue
+        webhook_repo.mark_processed(repo_name, entry["max_id"])
+
+        repo_stats["webhook_events"] = entry["n"]
+        repo_stats["run_ms"] = int((time.time() - t0) * 1000)
+        # Webhook receipt -> sends finished, for the oldest event in the batch
+        repo_stats["webhook_lag_ms"] = _lag_ms(entry["oldest_received_at"])
+        stats[repo_name] = repo_stats
     return stats
+
+
+def drain_enrichment_queue(
+    queue_repo: EnrichmentQueueRepository,
+    user_repo: UserRepository,
+    sent_repo: SentNotificationsRepository,
+    notifier: NotificationService,
+    scraper: JobScraper,
+    budget_seconds: float = 60.0,
+    batch_size: int = 20,
+    outbox: Optional[OutboxRepository] = None,
+    max_attempts: int = 3,
+) -> Dict[str, Any]:
+    """
+    Second phase of two-phase notifications: enrich queued jobs in batches,
+    match them against subscribers and send each user one follow-up digest
+    per repo. Scraping is cut off when `budget_seconds` is spent; jobs not
+    reached (or whose fetch was cut off) stay queued for the next drain.
+    A job cut off on `max_attempts` drains is matched without a description.
+    Queue entries are marked processed only after their matches are claimed
+    (and, with an `outbox`, queued), so a crash mid-drain re-drains them.
+    Returns stats (empty if nothing was processed).
+    """
+    t0 = time.monotonic()
+    users = None
+    processed_ids: List[int] = []
+    given_up = 0
+    after_id = 0
+    enrichment: List[Dict[str, Any]] = []
+    candidates = []  # (user, entry, job) across every batch
+    oldest_lag_ms = None
+
+    while time.monotonic() - t0 < budget_seconds:
+        batch = queue_repo.pending(limit=batch_size, after_id=after_id)
+        if not batch:
+            break
+        after_id = batch[-1]["id"]
+        if users is None:
+            users = hydrate_users(user_repo.list_verified_users())
+        if oldest_lag_ms is None:
+            oldest_lag_ms = _lag_ms(batch[0]["enqueued_at"])
+
+        jobs = [e["job"] for e in batch]
+        remaining = budget_seconds - (time.monotonic() - t0)
+        batch_stats = run_async(
+            enrich_descriptions(jobs,
+                                scraper,
+                                concurrency=6,
+                                deadline=max(remaining, 0.0),
+                                terms=description_terms(users))) or {}
+        enrichment.append(batch_stats)
+        # Cut off by the budget: retry on a later drain rather than match
+        # blind, until the job has been cut off `max_attempts` times
+        cut_off = {s["id"] for s in batch_stats.get("stragglers", [])}
+        cut = [e for e in batch if e["job"].id in cut_off]
+        queue_repo.record_attempt([e["id"] for e in cut])
+        retry = {e["id"] for e in cut if e["attempts"] + 1 < max_attempts}
+        given_up += len(cut) - len(retry)
+        batch = [e for e in batch if e["id"] not in retry]
+        if not batch:
+            break
+
+        for entry in batch:
+            job = entry["job"]
+            for user in users:
+                if not user.is_verified or not user_subscribed_to_repo(
+                        user.prefs, entry["repo_key"]):
+                    continue
+                if not MatchingEngine.matches(job, user.prefs):
+                    continue
+                candidates.append((user, entry, job))
+        processed_ids.extend(e["id"] for e in batch)
+
+    if not processed_ids:
+        return {}
+
+    matches: Dict[tuple, Dict[str, Any]] = {}  # (user_id, repo_key) -> digest
+
+    def digests(claimed_pairs):
+        claimed = set(claimed_pairs)
+        for user, entry, job in candidates:
+            if (user.id, job.id) not in claimed:
+                continue
+            claimed.discard((user.id, job.id))  # a job queued for two repos
+            digest = matches.setdefault((user.id, entry["repo_key"]), {
+                "user": user,
+                "label": f"{entry['repo_label']} follow-up",
+                "jobs": []
+            })
+            digest["jobs"].append(job)
+        return list(matches.values())
+
+    # Dedupe everything drained in one transaction; keep only claimed pairs
+    pairs = [(user.id, job.id) for user, _, job in candidates]
+    messages: List[Any] = []
+    if outbox is not None:
+
+        def render(claimed):
+            messages.extend(
+                m for d in digests(claimed)
+                for m in notifier.render(d["user"], d["jobs"], d["label"]))
+            return messages
+
+        outbox.stage(pairs, render)
+    else:
+        for d in digests(sent_repo.mark_sent_many(pairs)):
+            notifier.send_summary(d["user"], d["jobs"], repo_label=d["label"])
+    queue_repo.mark_processed(processed_ids)
+
+    return {
+        "jobs_processed": len(processed_ids),
+        "jobs_given_up": given_up,
+        "jobs_pending": queue_repo.pending_count(),
+        "users_notified": len({uid for uid, _ in matches}),
+        "jobs_sent_total": sum(len(d["jobs"]) for d in matches.values()),
+        "digests_sent": len(matches),
+        "messages_queued": len(messages),
+        # Enqueue -> drain start, for the oldest job in this drain
+        "queue_lag_ms": oldest_lag_ms,
+        "run_ms": int((time.monotonic() - t0) * 1000),
+        "enrichment": enrichment,
+    }
+
+
+def drain_user_shards(
+    user_shards: UserShardRepository,
+    user_repo: UserRepository,
+    sent_repo: SentNotificationsRepository,
+    notifier: NotificationService,
+    owner: str,
+    outbox: Optional[OutboxRepository] = None,
+    lease_seconds: int = 120,
+    budget_seconds: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Fan out pending job batches: for each unfinished (batch, shard), lease
+    the shard to `owner` without waiting (UserShardRepository.claim), then
+    match, claim and send for the verified users hashed to that shard.
+    Shards leased by another worker are left to it, so any number of
+    replicas can drain together. The lease is renewed every
+    `lease_seconds / 3` between sends, so a long fan-out keeps it; should it
+    lapse anyway, sent_notifications claims keep a retry from sending twice.
+    Returns counts for the shards processed here.
+    """
+    t0 = time.monotonic()
+    rows = None
+    batches: Dict[int, List[Any]] = {}  # batch_id -> jobs, read once
+    stats = {
+        "shards_processed": 0,
+        "shards_busy": 0,
+        "users_notified": 0,
+        "jobs_sent_total": 0,
+        "messages_queued": 0,
+    }
+    for entry in user_shards.pending():
+        if (budget_seconds is not None
+                and time.monotonic() - t0 >= budget_seconds):
+            break
+        batch_id, shard = entry["batch_id"], entry["shard"]
+        if not user_shards.claim(batch_id, shard, owner, lease_seconds):
+            # Leased by another worker, unless it has finished it meanwhile
+            stats["shards_busy"] += int(user_shards.is_pending(batch_id, shard))
+            continue
+        renewed_at = time.monotonic()
+
+        def heartbeat():
+            nonlocal renewed_at
+            if time.monotonic() - renewed_at >= lease_seconds / 3:
+                user_shards.renew(batch_id, shard, owner, lease_seconds)
+                renewed_at = time.monotonic()
+
+        try:
+            if rows is None:
+                rows = user_repo.list_verified_users()
+            users = hydrate_users([
+                r for r in rows
+                if shard_of(r["id"], entry["n_shards"]) == shard
+            ])
+            if batch_id not in batches:
+                batches[batch_id] = user_shards.jobs(batch_id)
+            shard_stats = fan_out_batch(batches[batch_id],
+                                        users,
+                                        entry["repo_key"],
+                                        entry["repo_label"],
+                                        sent_repo,
+                                        notifier,
+                                        outbox=outbox,
+                                        cheap_only=bool(entry["cheap_only"]),
+                                        heartbeat=heartbeat)
+        except BaseException:
+            user_shards.release(batch_id, shard, owner)
+            raise
+        user_shards.mark_done(batch_id, shard)
+        stats["shards_processed"] += 1
+        for k in ("users_notified", "jobs_sent_total", "messages_queued"):
+            stats[k] += shard_stats[k]
+    stats["shards_pending"] = user_shards.pending_count()
+    stats["run_ms"] = int((time.monotonic() - t0) * 1000)
+    return stats
+
+
+def drain_outbox(
+    outbox: OutboxRepository,
+    notifier: NotificationService,
+    batch_size: int = 50,
+    max_attempts: int = 8,
+    backoff_seconds: float = 30.0,
+    budget_seconds: Optional[float] = None,
+    owner: Optional[str] = None,
+    lease_seconds: float = 300,
+) -> Dict[str, Any]:
+    """
+    Deliver due outbox messages through `notifier`'s sender. A failed send is
+    retried after `backoff_seconds`, doubling per attempt, until
+    `max_attempts`, then left as failed. Each batch is leased to `owner` for
+    `lease_seconds` first (see OutboxRepository.claim_due), so workers
+    draining the same outbox never send the same message. Only a crash
+    between a send and its delivered mark can repeat one, once the lease
+    runs out; senders that honour the idempotency key (email) drop that
+    repeat. Returns delivery counts plus outbox depth and the age of its
+    oldest pending message.
+    """
+    t0 = time.monotonic()
+    owner = owner or uuid.uuid4().hex
+    counts = {"delivered": 0, "retried": 0, "failed": 0}
+    while budget_seconds is None or time.monotonic() - t0 < budget_seconds:
+        rows = outbox.claim_due(owner,
+                                limit=batch_size,
+                                lease_seconds=lease_seconds)
+        if not rows:
+            break
+        for row in rows:
+            try:
+                notifier.deliver(row["message"])
+            except Exception as e:
+                attempts = row["attempts"] + 1
+                if attempts >= max_attempts:
+                    outbox.mark_attempt_failed(row["id"], str(e), None)
+                    counts["failed"] += 1
+                else:
+                    outbox.mark_attempt_failed(
+                        row["id"], str(e),
+                        backoff_seconds * 2**(attempts - 1))
+                    counts["retried"] += 1
+                continue
+            outbox.mark_delivered(row["id"])
+            counts["delivered"] += 1
+    return {
+        **counts,
+        "run_ms": int((time.monotonic() - t0) * 1000),
+        "outbox": outbox.stats(),
+    }
@@ -13,16 +13,28 @@ class ResendEmailSender:
         self.from_addr = from_addr or os.getenv("EMAIL_FROM",
                                                 "noreply@example.com")
 
-    def send_email(self, to_addr: str, subject: str, html_body: str,
-                   text_body: str):
+    # Resend drops a repeated send with the same Idempotency-Key (24h window)
+    accepts_email_idempotency_key = True
+
+    def send_email(self,
+                   to_addr: str,
+                   subject: str,
+                   html_body: str,
+                   text_body: str,
+                   idempotency_key: Optional[str] = None):
         # text_body is optional; Resend will auto-generate if omitted
-        self.resend.Emails.send({
+        params = {
             "from": self.from_addr,
             "to": [to_addr],
             "subject": subject,
             "html": html_body or f"<pre>{text_body}</pre>",
             "text": text_body or None,
-        })
+        }
+        if idempotency_key:
+            self.resend.Emails.send(params,
+                                    {"idempotency_key": idempotency_key})
+        else:
+            self.resend.Emails.send(params)
 
 
 class TwilioSmsSender:
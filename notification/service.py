@@ -1,6 +1,11 @@
+import hashlib
 import os
-from typing import Callable, List
-from common.models import JobListing, UserContact
+from typing import Callable, List, Optional, Tuple
+from common.models import JobListing, OutgoingMessage, UserContact
+from github_poller.matcher import rank_matches
+
+# (repo_label, jobs shown, total matches in the section)
+_Shown = Tuple[str, List[JobListing], int]
 
 
 class NotificationService:
@@ -10,13 +15,19 @@ class NotificationService:
       - send_email(to_addr, subject, html_body, text_body)
       - send_sms(to_number, text_body)
     `edit_link_builder` is a function(user_contact) -> str
+    A message lists at most `max_jobs_email` / `max_jobs_sms` jobs (None: all),
+    the user's best matches by keyword hits and recency; the rest are counted.
     """
 
     def __init__(self,
                  sender,
                  edit_link_builder: Callable[[UserContact], str],
-                 unsubscribe_link_builder=None):
+                 unsubscribe_link_builder=None,
+                 max_jobs_email: Optional[int] = 25,
+                 max_jobs_sms: Optional[int] = 5):
         self.sender = sender
+        self.max_jobs_email = max_jobs_email
+        self.max_jobs_sms = max_jobs_sms
         self.edit_link_builder = edit_link_builder
         self.unsubscribe_link_builder = unsubscribe_link_builder or (
             lambda u:
@@ -25,43 +36,129 @@ class NotificationService:
 
     def send_summary(self, user: UserContact, jobs: List[JobListing],
                      repo_label: str) -> None:
+        self.send_sections(user, [(repo_label, jobs)])
+
+    def send_sections(self, user: UserContact,
+                      sections: List[Tuple[str, List[JobListing]]]) -> None:
+        for msg in self.render_sections(user, sections):
+            self.deliver(msg)
+
+    def render(self, user: UserContact, jobs: List[JobListing],
+               repo_label: str) -> List[OutgoingMessage]:
+        """The messages send_summary would send, one per enabled channel."""
+        return self.render_sections(user, [(repo_label, jobs)])
+
+    def render_sections(
+            self, user: UserContact,
+            sections: List[Tuple[str, List[JobListing]]]
+    ) -> List[OutgoingMessage]:
+        """
+        One message per enabled channel covering every (repo_label, jobs)
+        section, so a user matched in several repos gets a single digest.
+        """
+        sections = [(label, jobs) for label, jobs in sections if jobs]
         # Guardrails
         if not user.is_verified:
-            return
-        if not jobs:
-            return
+            return []
+        if not sections:
+            return []
         if not (user.notify_email or user.notify_sms):
-            return
+            return []
 
         # Build content
         edit_link = self.edit_link_builder(user)
-        subject = self._subject(len(jobs), repo_label)
+        subject = self._subject(sum(len(jobs) for _, jobs in sections),
+                                " + ".join(label for label, _ in sections))
         ulink = self.unsubscribe_link_builder(user)
-        text_body = self._text_body(jobs, edit_link, repo_label, ulink)
-        html_body = self._html_body(jobs, edit_link, repo_label, ulink)
+        # Every job is claimed (and keyed) but only the top K are rendered
+        shown = self._top_jobs(user, sections, self.max_jobs_email)
+        text_body = self._text_body(shown, edit_link, ulink)
+        html_body = self._html_body(shown, edit_link, ulink)
+        key = self._idempotency_key(user, sections)
 
         # Channels
+        out = []
         if user.notify_email and user.email:
-            self.sender.send_email(user.email, subject, html_body, text_body)
+            out.append(
+                OutgoingMessage(user_id=user.id,
+                                channel="email",
+                                to_addr=user.email,
+                                text_body=text_body,
+                                idempotency_key=f"{key}-email",
+                                subject=subject,
+                                html_body=html_body))
         if user.notify_sms and user.phone:
-            # Keep SMS short; reuse text_body (built with brevity in mind)
-            self.sender.send_sms(user.phone, text_body)
+            # Keep SMS short: same plain text, fewer jobs
+            sms_body = (text_body
+                        if self.max_jobs_sms == self.max_jobs_email else
+                        self._text_body(
+                            self._top_jobs(user, sections, self.max_jobs_sms),
+                            edit_link, ulink))
+            out.append(
+                OutgoingMessage(user_id=user.id,
+                                channel="sms",
+                                to_addr=user.phone,
+                                text_body=sms_body,
+                                idempotency_key=f"{key}-sms"))
+        return out
+
+    def deliver(self, msg: OutgoingMessage) -> None:
+        """
+        Hand one message to the sender. A sender that sets
+        `accepts_email_idempotency_key` / `accepts_sms_idempotency_key` gets
+        the key on that channel, so a retried send is a no-op.
+        """
+        flag = f"accepts_{msg.channel}_idempotency_key"
+        extra = ({
+            "idempotency_key": msg.idempotency_key
+        } if getattr(self.sender, flag, False) else {})
+        if msg.channel == "email":
+            self.sender.send_email(msg.to_addr, msg.subject, msg.html_body,
+                                   msg.text_body, **extra)
+        else:
+            self.sender.send_sms(msg.to_addr, msg.text_body, **extra)
+
+    @staticmethod
+    def _top_jobs(user: UserContact, sections: List[Tuple[str,
+                                                          List[JobListing]]],
+                  k: Optional[int]) -> List[_Shown]:
+        """The message's `k` best jobs overall, ranked within each section."""
+        ranked = rank_matches([j for _, jobs in sections for j in jobs],
+                              user.prefs, k)
+        rank = {id(j): r for r, j in enumerate(ranked)}
+        return [(label,
+                 sorted((j for j in jobs if id(j) in rank),
+                        key=lambda j: rank[id(j)]), len(jobs))
+                for label, jobs in sections]
+
+    @staticmethod
+    def _idempotency_key(user: UserContact,
+                         sections: List[Tuple[str, List[JobListing]]]) -> str:
+        parts = [user.id]
+        for repo_label, jobs in sections:
+            parts += [repo_label, ",".join(sorted(j.id for j in jobs))]
+        return hashlib.sha256("|".join(parts).encode()).hexdigest()[:32]
 
     @staticmethod
     def _subject(n: int, repo_label: str) -> str:
         return f"[{repo_label}] {n} new match{'es' if n != 1 else ''} for you"
 
     @staticmethod
-    def _text_body(jobs: List[JobListing], edit_link: str, repo_label: str,
+    def _text_body(sections: List[_Shown], edit_link: str,
                    unsubscribe_link: str) -> str:
         # SMS-safe + email-compatible plain text
-        lines = [
-            f"{repo_label}: {len(jobs)} new match{'es' if len(jobs)!=1 else ''}"
-        ]
-        for j in jobs:
-            # Single-line bullet per job
-            loc = f" • {', '.join(j.locations)}" if j.locations else ""
-            lines.append(f"- {j.title} @ {j.company_name}{loc} → {j.url}")
+        lines = []
+        for repo_label, jobs, total in sections:
+            if lines:
+                lines.append("")
+            lines.append(
+                f"{repo_label}: {total} new match{'es' if total!=1 else ''}")
+            for j in jobs:
+                # Single-line bullet per job
+                loc = f" • {', '.join(j.locations)}" if j.locations else ""
+                lines.append(f"- {j.title} @ {j.company_name}{loc} → {j.url}")
+            if total > len(jobs):
+                lines.append(f"+ {total - len(jobs)} more not shown")
         lines.append("")
         lines.append(f"Edit your preferences: {edit_link}")
         lines.append(f"Unsubscribe: {unsubscribe_link}")
@@ -69,20 +166,25 @@ class NotificationService:
         return "\n".join(lines)
 
     @staticmethod
-    def _html_body(jobs: List[JobListing], edit_link: str, repo_label: str,
+    def _html_body(sections: List[_Shown], edit_link: str,
                    unsubscribe_link: str) -> str:
-        lis = []
-        for j in jobs:
-            loc = f" &middot; {', '.join(j.locations)}" if j.locations else ""
-            lis.append(
-                f"<li><a href='{j.url}'>{j.title}</a> @ {j.company_name}{loc}</li>"
-            )
-        return f"""
-        <div>
-          <p><strong>{repo_label}:</strong> {len(jobs)} new match{'es' if len(jobs)!=1 else ''}</p>
+        parts = []
+        for repo_label, jobs, total in sections:
+            lis = []
+            for j in jobs:
+                loc = f" &middot; {', '.join(j.locations)}" if j.locations else ""
+                lis.append(
+                    f"<li><a href='{j.url}'>{j.title}</a> @ {j.company_name}{loc}</li>"
+                )
+            if total > len(jobs):
+                lis.append(f"<li>+ {total - len(jobs)} more not shown</li>")
+            parts.append(f"""
+          <p><strong>{repo_label}:</strong> {total} new match{'es' if total!=1 else ''}</p>
           <ul>
             {''.join(lis)}
-          </ul>
+          </ul>""")
+        return f"""
+        <div>{''.join(parts)}
           <p><a href="{edit_link}">Edit your preferences</a> · <a href="{unsubscribe_link}">Unsubscribe</a></p>
         </div>
         """.strip()
@@ -1,4 +1,5 @@
 import sqlite3
+import time
 import pytest
 from persistence.db import init_db
 from persistence.repositories import (UserRepository, RepoStateRepository,
@@ -127,18 +128,18 @@ def test_run_all_repos_once_hydrates_users_sends_batched_and_updates_sha(
     # Monkeypatch the GithubPoller used inside the runner to use the fakes
     import notification.runner as runner_mod
 
-    def fake_ng(owner, repo, token=""):
+    def fake_ng(owner, repo, token="", **kwargs):
         assert owner == "SimplifyJobs" and repo == "New-Grad-Positions"
         return FakePollerNG()
 
-    def fake_intern(owner, repo, token=""):
+    def fake_intern(owner, repo, token="", **kwargs):
         assert owner == "SimplifyJobs" and repo == "Summer2026-Internships"
         return FakePollerIntern()
 
     monkeypatch.setattr(
         runner_mod,
         "GithubPoller",
-        lambda owner, repo, token="": fake_ng(owner, repo, token)
+        lambda owner, repo, token="", **kwargs: fake_ng(owner, repo, token)
         if repo == "New-Grad-Positions" else fake_intern(owner, repo, token))
 
     # Fake notifier + real NotificationService
@@ -182,3 +183,702 @@ def test_run_all_repos_once_hydrates_users_sends_batched_and_updates_sha(
         github_token="",
     )
     assert sender.emails == []  # Nothing new sent
+
+
+def test_run_all_repos_once_polls_configured_repos_concurrently(
+        monkeypatch, tmp_path):
+    import threading
+    import time
+    import notification.runner as runner_mod
+    from common.models import RepoConfig
+    from persistence.db import get_conn
+
+    # File-backed, so each pool thread can open its own connection
+    conn = get_conn(str(tmp_path / "db.sqlite3"))
+    init_db(conn)
+    user_repo = UserRepository(conn)
+    state_repo = RepoStateRepository(conn)
+    sent_repo = SentNotificationsRepository(conn)
+    prefs = UserPreferences(False, False, True, [], [], [],
+                            subscribed_repos=["a", "b"])
+    user_repo.create_user("u1", "dev@user.com", None, True, prefs, True,
+                          False)
+
+    running = {"now": 0, "max": 0}
+    guard = threading.Lock()
+
+    class SlowPoller:
+
+        def __init__(self, owner, repo, token="", branch="dev"):
+            self.repo = repo
+
+        def fetch_new_listings(self, since_sha):
+            with guard:
+                running["now"] += 1
+                running["max"] = max(running["max"], running["now"])
+            time.sleep(0.2)
+            with guard:
+                running["now"] -= 1
+            job = JobListing(id=f"{self.repo}-1",
+                             date_posted=0,
+                             url=f"https://ex.com/{self.repo}",
+                             company_name="Acme",
+                             title=f"Engineer {self.repo}",
+                             locations=["Remote"],
+                             sponsorship="None",
+                             active=True)
+            return [job], f"sha-{self.repo}"
+
+    monkeypatch.setattr(runner_mod, "GithubPoller", SlowPoller)
+    sender = FakeSender()
+    notifier = NotificationService(
+        sender, edit_link_builder=lambda u: "http://edit/link")
+    scraper = DummyScraper()
+
+    configs = [
+        RepoConfig(key="a", owner="o", repo="ra", label="A"),
+        RepoConfig(key="b", owner="o", repo="rb", label="B"),
+    ]
+    stats = run_all_repos_once(user_repo,
+                               state_repo,
+                               sent_repo,
+                               notifier,
+                               scraper,
+                               repo_configs=configs,
+                               lock_owner="tester")
+
+    assert running["max"] == 2  # Both repos polled at the same time
+    assert set(stats) == {"o/ra", "o/rb"}
+    assert state_repo.get_last_sha("o/ra") == "sha-ra"
+    assert state_repo.get_last_sha("o/rb") == "sha-rb"
+    assert sorted(s for _, s, _ in sender.emails) == [
+        "[A] 1 new match for you", "[B] 1 new match for you"
+    ]
+
+
+class PooledScraper(DummyScraper):
+    """Records the loop and session each fetch ran under."""
+
+    def __init__(self):
+        self.refs = 0
+        self.sessions_opened = 0
+        self.fetches = []
+
+    async def open_session(self):
+        if self.refs == 0:
+            self.sessions_opened += 1
+        self.refs += 1
+
+    async def close_session(self):
+        self.refs -= 1
+
+    async def fetch_description(self, url: str):
+        import asyncio
+        self.fetches.append((id(asyncio.get_running_loop()), self.refs))
+        await asyncio.sleep(0.05)
+        return await super().fetch_description(url)
+
+
+def test_run_all_repos_once_shares_one_loop_and_http_pool(monkeypatch, repos):
+    import notification.runner as runner_mod
+
+    user_repo, state_repo, sent_repo = repos
+    # Description-dependent match, so both repos scrape
+    k8s = UserPreferences(True, True, False, ["kubernetes"], [], [])
+    user_repo.create_user("u1", "dev@user.com", None, True, k8s, True, False)
+    monkeypatch.setattr(runner_mod, "GithubPoller",
+                        lambda *a, **kw: FakePollerNG())
+    scraper = PooledScraper()
+
+    stats = run_all_repos_once(user_repo,
+                               state_repo,
+                               sent_repo,
+                               NotificationService(
+                                   FakeSender(),
+                                   edit_link_builder=lambda u: "x"),
+                               scraper,
+                               lock_owner="tester")
+
+    # Both repos list the same two jobs: fetched once, reused by the other
+    assert len(scraper.fetches) == 2
+    dupes = [s["duplicates"] for s in stats.values()]
+    assert sum(d["cross_repo"] for d in dupes) == 2
+    assert sum(d["enrich_reused"] for d in dupes) == 2
+    assert len({loop for loop, _ in scraper.fetches}) == 1
+    assert all(refs >= 1 for _, refs in scraper.fetches)
+    assert scraper.sessions_opened == 1 and scraper.refs == 0
+    for repo_stats in stats.values():
+        assert repo_stats["run_ms"] >= 0 and repo_stats["lock_wait_ms"] >= 0
+    assert state_repo.get_last_sha(NEW_GRAD_REPO) == "sha-ng-2"
+
+
+def test_combined_digest_sends_one_message_per_user_per_channel(
+        monkeypatch, repos):
+    import notification.runner as runner_mod
+    from common.models import RepoConfig
+
+    user_repo, state_repo, sent_repo = repos
+    both = UserPreferences(False, False, True, [], [], [],
+                           subscribed_repos=["a", "b"])
+    only_a = UserPreferences(False, False, True, [], [], [],
+                             subscribed_repos=["a"])
+    user_repo.create_user("u1", "both@user.com", "+15550001", True, both,
+                          True, True)
+    user_repo.create_user("u2", "a@user.com", None, True, only_a, True, False)
+
+    class RepoPoller:
+
+        def __init__(self, owner, repo, token="", branch="dev"):
+            self.repo = repo
+
+        def fetch_new_listings(self, since_sha):
+            job = JobListing(id=f"{self.repo}-1",
+                             date_posted=0,
+                             url=f"https://ex.com/{self.repo}",
+                             company_name="Acme",
+                             title=f"Engineer {self.repo}",
+                             locations=["Remote"],
+                             sponsorship="None",
+                             active=True)
+            return [job], f"sha-{self.repo}"
+
+    monkeypatch.setattr(runner_mod, "GithubPoller", RepoPoller)
+    sender = FakeSender()
+    notifier = NotificationService(sender, edit_link_builder=lambda u: "x")
+    configs = [
+        RepoConfig(key="a", owner="o", repo="ra", label="A"),
+        RepoConfig(key="b", owner="o", repo="rb", label="B"),
+    ]
+
+    stats = run_all_repos_once(user_repo,
+                               state_repo,
+                               sent_repo,
+                               notifier,
+                               DummyScraper(),
+                               repo_configs=configs,
+                               combine_repos=True)
+
+    subjects = sorted((to, subject) for to, subject, _ in sender.emails)
+    assert subjects == [("a@user.com", "[A] 1 new match for you"),
+                        ("both@user.com", "[A + B] 2 new matches for you")]
+    text = [t for to, _, t in sender.emails if to == "both@user.com"][0]
+    assert "A: 1 new match" in text and "B: 1 new match" in text
+    assert len(sender.sms) == 1
+    # Per repo, the two-repo user would have had 2 emails + 2 SMS
+    assert stats["digest"] == {
+        "users_notified": 2,
+        "messages_sent": 3,
+        "messages_saved": 2,
+        "shas_fenced": 0
+    }
+    assert state_repo.get_last_sha("o/ra") == "sha-ra"
+    assert state_repo.get_last_sha("o/rb") == "sha-rb"
+    assert sent_repo.was_sent("u1", "rb-1")
+
+
+def test_combined_digest_is_flushed_under_the_repos_locks(monkeypatch, repos):
+    import notification.runner as runner_mod
+    from common.models import RepoConfig
+    from persistence.lock import try_acquire_lock
+
+    user_repo, state_repo, sent_repo = repos
+    prefs = UserPreferences(False, False, True, [], [], [],
+                            subscribed_repos=["a", "b"])
+    user_repo.create_user("u1", "both@user.com", None, True, prefs, True,
+                          False)
+
+    class RepoPoller:
+
+        def __init__(self, owner, repo, token="", branch="dev"):
+            self.repo = repo
+
+        def fetch_new_listings(self, since_sha):
+            job = JobListing(id=f"{self.repo}-1",
+                             date_posted=0,
+                             url=f"https://ex.com/{self.repo}",
+                             company_name="Acme",
+                             title=f"Engineer {self.repo}",
+                             locations=["Remote"],
+                             sponsorship="None",
+                             active=True)
+            return [job], f"sha-{self.repo}"
+
+    class LockProbingSender(FakeSender):
+        """Records whether another instance could take a repo's lock."""
+
+        def __init__(self):
+            super().__init__()
+            self.stolen = []
+
+        def send_email(self, to_addr, subject, html_body, text_body):
+            for name in ("poller:o/ra", "poller:o/rb"):
+                self.stolen.append(
+                    try_acquire_lock(user_repo.conn, name, "other")
+                    is not None)
+            super().send_email(to_addr, subject, html_body, text_body)
+
+    monkeypatch.setattr(runner_mod, "GithubPoller", RepoPoller)
+    sender = LockProbingSender()
+    configs = [
+        RepoConfig(key="a", owner="o", repo="ra", label="A"),
+        RepoConfig(key="b", owner="o", repo="rb", label="B"),
+    ]
+
+    stats = run_all_repos_once(user_repo,
+                               state_repo,
+                               sent_repo,
+                               NotificationService(
+                                   sender, edit_link_builder=lambda u: "x"),
+                               DummyScraper(),
+                               repo_configs=configs,
+                               lock_owner="tester",
+                               combine_repos=True)
+
+    assert len(sender.emails) == 1 and sender.stolen == [False, False]
+    assert stats["digest"]["shas_fenced"] == 0
+    assert state_repo.get_last_sha("o/ra") == "sha-ra"
+    # Released once the flush is done
+    assert try_acquire_lock(user_repo.conn, "poller:o/ra", "other")
+
+
+def test_run_all_repos_once_skips_repos_not_due(monkeypatch, repos):
+    import notification.runner as runner_mod
+    from github_poller.scheduler import AdaptivePollScheduler
+
+    user_repo, state_repo, sent_repo = repos
+    calls = []
+
+    class CountingPoller(FakePollerIntern):
+
+        def fetch_new_listings(self, since_sha):
+            calls.append(since_sha)
+            return [], "sha-1"
+
+    monkeypatch.setattr(runner_mod, "GithubPoller", CountingPoller)
+    notifier = NotificationService(FakeSender(),
+                                   edit_link_builder=lambda u: "x")
+    scheduler = AdaptivePollScheduler(min_interval=60)
+
+    stats = run_all_repos_once(user_repo,
+                               state_repo,
+                               sent_repo,
+                               notifier,
+                               DummyScraper(),
+                               scheduler=scheduler)
+    assert len(calls) == 2
+    assert stats[NEW_GRAD_REPO]["next_poll_reason"].startswith("active")
+    assert state_repo.get_state(NEW_GRAD_REPO)["next_poll_at"]
+
+    # Immediately re-running: nothing is due yet
+    stats = run_all_repos_once(user_repo,
+                               state_repo,
+                               sent_repo,
+                               notifier,
+                               DummyScraper(),
+                               scheduler=scheduler)
+    assert len(calls) == 2
+    assert stats[NEW_GRAD_REPO]["skipped"] == "not due"
+
+
+class SlowScraper(DummyScraper):
+    """Every page takes `delay` seconds; records what was fetched."""
+
+    def __init__(self, delay=0.3):
+        self.delay = delay
+        self.urls = []
+
+    async def fetch_description(self, url: str):
+        import asyncio
+        self.urls.append(url)
+        await asyncio.sleep(self.delay)
+        return await super().fetch_description(url)
+
+
+def test_two_phase_sends_cheap_matches_first_then_follow_up(
+        monkeypatch, repos):
+    import notification.runner as runner_mod
+    from common.models import RepoConfig
+    from persistence.repositories import EnrichmentQueueRepository
+    from notification.runner import drain_enrichment_queue
+
+    user_repo, state_repo, sent_repo = repos
+    everything = UserPreferences(True, False, True, [], [], [])
+    k8s = UserPreferences(True, False, False, ["kubernetes"], [], [])
+    user_repo.create_user("u_all", "all@user.com", None, True, everything,
+                          True, False)
+    user_repo.create_user("u_k8s", "k8s@user.com", None, True, k8s, True,
+                          False)
+    monkeypatch.setattr(runner_mod, "GithubPoller",
+                        lambda *a, **kw: FakePollerNG())
+    ng = [RepoConfig("new_grad", "SimplifyJobs", "New-Grad-Positions",
+                     label="New Grad")]
+
+    def run(queue, scraper, sender):
+        notifier = NotificationService(sender,
+                                       edit_link_builder=lambda u: "x")
+        return run_all_repos_once(user_repo,
+                                  state_repo,
+                                  sent_repo,
+                                  notifier,
+                                  scraper,
+                                  repo_configs=ng,
+                                  enrichment_queue=queue)[NEW_GRAD_REPO]
+
+    # Single phase, for comparison: everyone waits for the slow scrape
+    single = run(None, SlowScraper(), FakeSender())
+    sent_repo.conn.execute("DELETE FROM sent_notifications")
+    state_repo.conn.execute("DELETE FROM repo_state")
+
+    queue = EnrichmentQueueRepository(sent_repo.conn)
+    scraper, sender = SlowScraper(), FakeSender()
+    stats = run(queue, scraper, sender)
+
+    assert single["time_to_first_notification_ms"] >= 300
+    assert stats["time_to_first_notification_ms"] < 300
+    assert scraper.urls == []  # Nothing scraped on the poll path
+    assert stats["jobs_deferred"] == 2
+    assert [e[0] for e in sender.emails] == ["all@user.com"]
+    assert state_repo.get_last_sha(NEW_GRAD_REPO) == "sha-ng-2"
+
+    # Phase two: descriptions resolve the kubernetes user's matches
+    notifier = NotificationService(sender, edit_link_builder=lambda u: "x")
+    drained = drain_enrichment_queue(queue, user_repo, sent_repo, notifier,
+                                     scraper)
+    assert sorted(scraper.urls) == ["https://ex.com/1", "https://ex.com/2"]
+    assert drained["jobs_processed"] == 2 and drained["jobs_pending"] == 0
+    assert drained["users_notified"] == 1
+    to, subject, text = sender.emails[-1]
+    assert to == "k8s@user.com" and "follow-up" in subject
+    assert "Backend Engineer" in text and "DevOps Engineer" in text
+    assert len(sender.emails) == 2  # No repeat for the receive-all user
+
+    assert drain_enrichment_queue(queue, user_repo, sent_repo, notifier,
+                                  scraper) == {}
+
+
+def test_enrichment_drain_respects_budget(repos):
+    from persistence.repositories import EnrichmentQueueRepository
+    from notification.runner import drain_enrichment_queue
+
+    user_repo, _, sent_repo = repos
+    queue = EnrichmentQueueRepository(sent_repo.conn)
+    jobs, _ = FakePollerNG().fetch_new_listings("")
+    assert queue.enqueue(NEW_GRAD_REPO, "new_grad", "New Grad", jobs) == 2
+    assert queue.enqueue(NEW_GRAD_REPO, "new_grad", "New Grad", jobs) == 0
+
+    notifier = NotificationService(FakeSender(),
+                                   edit_link_builder=lambda u: "x")
+    stats = drain_enrichment_queue(queue,
+                                   user_repo,
+                                   sent_repo,
+                                   notifier,
+                                   SlowScraper(delay=0.3),
+                                   budget_seconds=0.5,
+                                   batch_size=1)
+    # The first fetch fits the budget; the second is cut off and stays queued
+    assert stats["jobs_processed"] == 1
+    assert stats["jobs_pending"] == 1
+    assert stats["enrichment"][-1]["stragglers"] == [{
+        "id": "job2",
+        "url": "https://ex.com/2"
+    }]
+
+
+def test_enrichment_drain_gives_up_on_pages_that_keep_timing_out(repos):
+    from persistence.repositories import EnrichmentQueueRepository
+    from notification.runner import drain_enrichment_queue
+
+    user_repo, _, sent_repo = repos
+    everything = UserPreferences(True, False, True, [], [], [])
+    user_repo.create_user("u_all", "all@user.com", None, True, everything,
+                          True, False)
+    queue = EnrichmentQueueRepository(sent_repo.conn)
+    jobs, _ = FakePollerNG().fetch_new_listings("")
+    queue.enqueue(NEW_GRAD_REPO, "new_grad", "New Grad", jobs[:1])
+    sender = FakeSender()
+    notifier = NotificationService(sender, edit_link_builder=lambda u: "x")
+
+    def drain():
+        return drain_enrichment_queue(queue,
+                                      user_repo,
+                                      sent_repo,
+                                      notifier,
+                                      SlowScraper(delay=1),
+                                      budget_seconds=0.1,
+                                      max_attempts=2)
+
+    assert drain() == {}  # Cut off once: still queued
+    assert queue.pending()[0]["attempts"] == 1
+    stats = drain()
+    assert stats["jobs_given_up"] == 1 and stats["jobs_pending"] == 0
+    # Matched on its listing fields instead
+    assert stats["jobs_sent_total"] == 1
+    assert sender.emails[0][0] == "all@user.com"
+
+
+class FlakySender(FakeSender):
+    """Slow sender whose first `failures` sends raise; records idempotency keys."""
+    accepts_email_idempotency_key = True
+
+    def __init__(self, failures=0, delay=0.0):
+        super().__init__()
+        self.failures = failures
+        self.delay = delay
+        self.keys = []
+
+    def send_email(self, to_addr, subject, html_body, text_body,
+                   idempotency_key=None):
+        time.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("provider unavailable")
+        self.keys.append(idempotency_key)
+        super().send_email(to_addr, subject, html_body, text_body)
+
+
+def test_outbox_decouples_matching_from_slow_delivery(monkeypatch, repos):
+    import notification.runner as runner_mod
+    from common.models import RepoConfig
+    from persistence.repositories import OutboxRepository
+    from notification.runner import drain_outbox
+
+    user_repo, state_repo, sent_repo = repos
+    everything = UserPreferences(True, False, True, [], [], [])
+    for i in range(3):
+        user_repo.create_user(f"u{i}", f"u{i}@user.com", None, True,
+                              everything, True, False)
+    monkeypatch.setattr(runner_mod, "GithubPoller",
+                        lambda *a, **kw: FakePollerNG())
+    ng = [RepoConfig("new_grad", "SimplifyJobs", "New-Grad-Positions",
+                     label="New Grad")]
+    outbox = OutboxRepository(sent_repo.conn)
+    sender = FlakySender(failures=1, delay=0.2)
+    notifier = NotificationService(sender, edit_link_builder=lambda u: "x")
+
+    t0 = time.perf_counter()
+    stats = run_all_repos_once(user_repo,
+                               state_repo,
+                               sent_repo,
+                               notifier,
+                               DummyScraper(),
+                               repo_configs=ng,
+                               outbox=outbox)[NEW_GRAD_REPO]
+    # Matching finished without waiting on the slow sender (3 x 0.2s inline)
+    assert time.perf_counter() - t0 < 0.4
+    assert sender.emails == [] and stats["messages_queued"] == 3
+    assert stats["users_notified"] == 3
+    assert sent_repo.was_sent("u0", "job1")
+    assert state_repo.get_last_sha(NEW_GRAD_REPO) == "sha-ng-2"
+    assert outbox.stats()["depth"] == 3
+    assert outbox.stats()["oldest_age_seconds"] >= 0
+
+    # First send fails and is rescheduled; the rest go out
+    drained = drain_outbox(outbox, notifier, backoff_seconds=0.0)
+    assert drained["retried"] == 1
+    assert drained["outbox"]["depth"] == 0
+    assert drained["outbox"]["delivered"] == 3
+    assert sorted(e[0] for e in sender.emails) == [
+        "u0@user.com", "u1@user.com", "u2@user.com"
+    ]
+    assert len(set(sender.keys)) == 3 and all(sender.keys)
+
+    # Rerunning the repo claims nothing new
+    state_repo.conn.execute("DELETE FROM repo_state")
+    again = run_all_repos_once(user_repo,
+                               state_repo,
+                               sent_repo,
+                               notifier,
+                               DummyScraper(),
+                               repo_configs=ng,
+                               outbox=outbox)[NEW_GRAD_REPO]
+    assert again["messages_queued"] == 0
+    assert drain_outbox(outbox, notifier)["delivered"] == 0
+
+
+def test_outbox_gives_up_after_max_attempts(repos):
+    from persistence.repositories import OutboxRepository
+    from notification.runner import drain_outbox
+
+    user_repo, _, sent_repo = repos
+    user = UserContact("u1", "u1@user.com", None, True, True, False,
+                       UserPreferences(True, False, True, [], [], []))
+    jobs, _ = FakePollerNG().fetch_new_listings("")
+    notifier = NotificationService(FlakySender(failures=5),
+                                   edit_link_builder=lambda u: "x")
+    outbox = OutboxRepository(sent_repo.conn)
+    outbox.stage([("u1", j.id) for j in jobs],
+                 lambda claimed: notifier.render(user, jobs, "New Grad"))
+
+    stats = drain_outbox(outbox,
+                         notifier,
+                         max_attempts=3,
+                         backoff_seconds=0.0)
+    assert stats["retried"] == 2 and stats["failed"] == 1
+    assert stats["outbox"] == {
+        "depth": 0,
+        "oldest_age_seconds": None,
+        "delivered": 0,
+        "failed": 1
+    }
+
+
+
+def test_concurrent_outbox_workers_deliver_each_message_once(tmp_path):
+    import threading
+    from persistence.db import get_conn
+    from persistence.repositories import OutboxRepository
+    from notification.runner import drain_outbox
+
+    path = str(tmp_path / "db.sqlite3")
+    conn = get_conn(path)
+    init_db(conn)
+    users = [
+        UserContact(f"u{i}", f"u{i}@user.com", None, True, True, False,
+                    UserPreferences(True, False, True, [], [], []))
+        for i in range(6)
+    ]
+    jobs, _ = FakePollerNG().fetch_new_listings("")
+
+    class SlowSender(FakeSender):
+
+        def send_email(self, to_addr, subject, html_body, text_body):
+            time.sleep(0.02)  # Long enough for the other worker to look
+            super().send_email(to_addr, subject, html_body, text_body)
+
+    sender = SlowSender()
+    notifier = NotificationService(sender, edit_link_builder=lambda u: "x")
+    for u in users:
+        OutboxRepository(conn).stage(
+            [(u.id, j.id) for j in jobs],
+            lambda claimed, u=u: notifier.render(u, jobs, "New Grad"))
+
+    def worker(name):
+        drain_outbox(OutboxRepository(get_conn(path)),
+                     notifier,
+                     batch_size=2,
+                     owner=name)
+
+    threads = [threading.Thread(target=worker, args=(f"w{i}", ))
+               for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(to for to, _, _ in sender.emails) == sorted(
+        u.email for u in users)
+    assert OutboxRepository(conn).stats()["delivered"] == 6
+
+
+def test_outbox_lease_expires_for_a_crashed_worker(repos):
+    from persistence.repositories import OutboxRepository
+
+    _, _, sent_repo = repos
+    user = UserContact("u1", "u1@user.com", None, True, True, False,
+                       UserPreferences(True, False, True, [], [], []))
+    jobs, _ = FakePollerNG().fetch_new_listings("")
+    notifier = NotificationService(FakeSender(), edit_link_builder=lambda u: "x")
+    outbox = OutboxRepository(sent_repo.conn)
+    outbox.stage([("u1", j.id) for j in jobs],
+                 lambda claimed: notifier.render(user, jobs, "New Grad"))
+
+    assert len(outbox.claim_due("crashed", lease_seconds=0.05)) == 1
+    assert outbox.claim_due("other") == []  # Still leased
+    time.sleep(0.06)
+    rows = outbox.claim_due("other")
+    assert len(rows) == 1 and rows[0]["claimed_by"] == "other"
+    outbox.mark_delivered(rows[0]["id"])
+    assert outbox.claim_due("third", lease_seconds=0) == []
+
+def test_user_shards_fan_out_one_batch_across_workers(monkeypatch, repos):
+    import notification.runner as runner_mod
+    from common.models import RepoConfig
+    from notification.runner import drain_user_shards
+    from notification.users import shard_of
+    from persistence.repositories import UserShardRepository
+
+    user_repo, state_repo, sent_repo = repos
+    k8s = UserPreferences(True, False, False, ["kubernetes"], [], [])
+    for i in range(12):
+        user_repo.create_user(f"u{i}", f"u{i}@user.com", None, True, k8s,
+                              True, False)
+    monkeypatch.setattr(runner_mod, "GithubPoller",
+                        lambda *a, **kw: FakePollerNG())
+    scraper, sender = PooledScraper(), FakeSender()
+    notifier = NotificationService(sender, edit_link_builder=lambda u: "x")
+    shards = UserShardRepository(user_repo.conn, n_shards=3)
+
+    stats = run_all_repos_once(user_repo,
+                               state_repo,
+                               sent_repo,
+                               notifier,
+                               scraper,
+                               repo_configs=[
+                                   RepoConfig("new_grad", "SimplifyJobs",
+                                              "New-Grad-Positions")
+                               ],
+                               user_shards=shards)
+
+    # Enriched once by the poller, nothing matched or sent yet
+    assert len(scraper.fetches) == 2 and sender.emails == []
+    assert stats[NEW_GRAD_REPO]["shard_batch_id"] is not None
+    assert state_repo.get_last_sha(NEW_GRAD_REPO) == "sha-ng-2"
+    assert shards.pending_count() == 3
+
+    # Another replica holds shard 0's lease; this one drains the rest
+    batch_id = stats[NEW_GRAD_REPO]["shard_batch_id"]
+    assert shards.claim(batch_id, 0, "other")
+    first = drain_user_shards(shards, user_repo, sent_repo, notifier, "me")
+    assert first["shards_processed"] == 2 and first["shards_busy"] == 1
+    shard0 = {f"u{i}@user.com" for i in range(12) if shard_of(f"u{i}", 3) == 0}
+    assert shard0 and {e[0] for e in sender.emails}.isdisjoint(shard0)
+
+    second = drain_user_shards(shards, user_repo, sent_repo, notifier, "other")
+    assert second["shards_processed"] == 1
+    assert sorted(e[0] for e in sender.emails) == sorted(
+        f"u{i}@user.com" for i in range(12))
+    assert first["jobs_sent_total"] + second["jobs_sent_total"] == 24
+    # The batch, leases and all, is gone once every shard is done
+    assert shards.pending_count() == 0 and shards.jobs(batch_id) == []
+    assert user_repo.conn.execute(
+        "SELECT COUNT(*) FROM batch_shards").fetchone()[0] == 0
+
+
+def test_shard_lease_is_renewed_while_its_fan_out_runs(repos):
+    from notification.runner import drain_user_shards
+    from persistence.repositories import UserShardRepository
+
+    user_repo, _, sent_repo = repos
+    everything = UserPreferences(True, False, True, [], [], [])
+    for i in range(4):
+        user_repo.create_user(f"u{i}", f"u{i}@user.com", None, True,
+                              everything, True, False)
+    shards = UserShardRepository(user_repo.conn, n_shards=1)
+    jobs, _ = FakePollerNG().fetch_new_listings("")
+    batch_id = shards.create_batch(NEW_GRAD_REPO, "new_grad", "New Grad",
+                                   jobs)
+
+    class ProbingSender(FakeSender):
+        """Slow sends; records whether another worker could take the shard."""
+
+        def __init__(self):
+            super().__init__()
+            self.taken_over = []
+
+        def send_email(self, to_addr, subject, html_body, text_body):
+            time.sleep(0.15)
+            self.taken_over.append(shards.claim(batch_id, 0, "other"))
+            super().send_email(to_addr, subject, html_body, text_body)
+
+    sender = ProbingSender()
+    stats = drain_user_shards(shards,
+                              user_repo,
+                              sent_repo,
+                              NotificationService(
+                                  sender, edit_link_builder=lambda u: "x"),
+                              "me",
+                              lease_seconds=0.3)
+
+    # Four 0.15s sends outlast the 0.3s lease; renewals kept it
+    assert stats["shards_processed"] == 1 and len(sender.emails) == 4
+    assert sender.taken_over == [False] * 4
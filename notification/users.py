@@ -1,5 +1,7 @@
-from typing import List
+import hashlib
+from typing import FrozenSet, List
 from common.models import UserPreferences, UserContact
+from common.tags import uncovered_terms
 
 
 def hydrate_users(rows) -> List[UserContact]:
@@ -18,6 +20,9 @@ def hydrate_users(rows) -> List[UserContact]:
             location_keywords=[
                 x for x in (r["location_keywords"] or "").split(",") if x
             ],
+            subscribed_repos=[
+                x for x in (r["subscribed_repos"] or "").split(",") if x
+            ],
         )
         out.append(
             UserContact(
@@ -30,3 +35,18 @@ def hydrate_users(rows) -> List[UserContact]:
                 prefs=prefs,
             ))
     return out
+
+
+def shard_of(user_id: str, n_shards: int) -> int:
+    """Stable user shard, the same on every worker (unlike hash())."""
+    return int(hashlib.sha1(user_id.encode()).hexdigest()[:8], 16) % n_shards
+
+
+def description_terms(users: List[UserContact]) -> FrozenSet[str]:
+    """
+    Role/tech keywords of `users` that have no canonical tag; enrichment tags
+    them from the full description, since only an excerpt is kept.
+    """
+    return uncovered_terms(kw for u in users
+                           for kw in (*u.prefs.role_keywords,
+                                      *u.prefs.tech_keywords))
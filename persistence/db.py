@@ -15,6 +15,7 @@ CREATE TABLE IF NOT EXISTS users (
   tech_keywords TEXT NOT NULL DEFAULT '',
   role_keywords TEXT NOT NULL DEFAULT '',
   location_keywords TEXT NOT NULL DEFAULT '',
+  subscribed_repos TEXT NOT NULL DEFAULT '',
   created_at TEXT NOT NULL,
   updated_at TEXT NOT NULL
 );
@@ -22,7 +23,14 @@ CREATE TABLE IF NOT EXISTS users (
 CREATE TABLE IF NOT EXISTS repo_state (
   repo_name TEXT PRIMARY KEY,
   last_sha TEXT NOT NULL,
-  updated_at TEXT NOT NULL
+  updated_at TEXT NOT NULL,
+  commit_rate_per_hour REAL NOT NULL DEFAULT 0,
+  idle_polls INTEGER NOT NULL DEFAULT 0,
+  interval_seconds REAL,
+  last_polled_at TEXT,
+  next_poll_at TEXT,
+  next_poll_reason TEXT,
+  fence_token INTEGER
 );
 
 CREATE TABLE IF NOT EXISTS sent_notifications (
@@ -31,6 +39,113 @@ CREATE TABLE IF NOT EXISTS sent_notifications (
   sent_at TEXT NOT NULL,
   PRIMARY KEY (user_id, job_id)
 );
+
+-- Listings each repo's pipeline has fully processed, with a hash of their
+-- fields, so reprocessed commit pages skip unchanged ones
+CREATE TABLE IF NOT EXISTS seen_listings (
+  repo_name TEXT NOT NULL,
+  listing_key TEXT NOT NULL,
+  content_hash TEXT NOT NULL,
+  seen_at TEXT NOT NULL,
+  PRIMARY KEY (repo_name, listing_key)
+);
+
+CREATE TABLE IF NOT EXISTS repos (
+  key TEXT PRIMARY KEY,
+  owner TEXT NOT NULL,
+  repo TEXT NOT NULL,
+  branch TEXT NOT NULL DEFAULT 'dev',
+  label TEXT NOT NULL DEFAULT '',
+  enabled INTEGER NOT NULL DEFAULT 1,
+  UNIQUE (owner, repo)
+);
+
+INSERT OR IGNORE INTO repos (key, owner, repo, branch, label) VALUES
+  ('new_grad', 'SimplifyJobs', 'New-Grad-Positions', 'dev', 'New Grad'),
+  ('internship', 'SimplifyJobs', 'Summer2026-Internships', 'dev', 'Internships');
+
+CREATE TABLE IF NOT EXISTS webhook_events (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  repo_name TEXT NOT NULL,
+  ref TEXT NOT NULL DEFAULT '',
+  sha TEXT NOT NULL,
+  delivery_id TEXT,
+  received_at TEXT NOT NULL,
+  processed_at TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_webhook_events_pending
+  ON webhook_events (repo_name, processed_at);
+
+CREATE INDEX IF NOT EXISTS idx_webhook_events_delivery
+  ON webhook_events (delivery_id, sha);
+
+-- Jobs whose match depends on a description, waiting for the enrichment worker
+CREATE TABLE IF NOT EXISTS enrichment_queue (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  repo_name TEXT NOT NULL,
+  repo_key TEXT NOT NULL,
+  repo_label TEXT NOT NULL DEFAULT '',
+  job_id TEXT NOT NULL,
+  job_json TEXT NOT NULL,
+  enqueued_at TEXT NOT NULL,
+  processed_at TEXT,
+  attempts INTEGER NOT NULL DEFAULT 0,  -- drains whose fetch was cut off
+  UNIQUE (repo_name, job_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_enrichment_queue_pending
+  ON enrichment_queue (processed_at, id);
+
+-- A run's parsed (and enriched) jobs, written once by the repo's poller and
+-- fanned out per user shard by whichever worker holds that shard's lease
+CREATE TABLE IF NOT EXISTS job_batches (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  repo_name TEXT NOT NULL,
+  repo_key TEXT NOT NULL,
+  repo_label TEXT NOT NULL DEFAULT '',
+  jobs_json TEXT NOT NULL,
+  n_shards INTEGER NOT NULL,
+  cheap_only INTEGER NOT NULL DEFAULT 0,
+  created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS batch_shards (
+  batch_id INTEGER NOT NULL,
+  shard INTEGER NOT NULL,
+  done_at TEXT,
+  claimed_by TEXT,  -- the worker fanning it out, until claimed_until
+  claimed_until TEXT,
+  PRIMARY KEY (batch_id, shard)
+);
+
+CREATE INDEX IF NOT EXISTS idx_batch_shards_pending
+  ON batch_shards (done_at, batch_id);
+
+-- Rendered notifications, written in the same transaction as their
+-- sent_notifications rows and delivered by the outbox worker
+CREATE TABLE IF NOT EXISTS outbox (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  idempotency_key TEXT NOT NULL UNIQUE,
+  user_id TEXT NOT NULL,
+  channel TEXT NOT NULL,
+  to_addr TEXT NOT NULL,
+  subject TEXT,
+  html_body TEXT,
+  text_body TEXT NOT NULL,
+  created_at TEXT NOT NULL,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  next_attempt_at TEXT NOT NULL,
+  last_error TEXT,
+  delivered_at TEXT,
+  failed_at TEXT,
+  -- Delivery lease: set by OutboxRepository.claim_due so one worker sends it
+  claimed_by TEXT,
+  claimed_until TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_pending
+  ON outbox (delivered_at, failed_at, next_attempt_at);
 """
 
 
@@ -44,6 +159,38 @@ def get_conn(path: Optional[str] = None) -> sqlite3.Connection:
     return conn
 
 
+# Columns added after the first release: (table, column, DDL type/default)
+MIGRATIONS = [
+    ("users", "subscribed_repos", "TEXT NOT NULL DEFAULT ''"),
+    ("repo_state", "commit_rate_per_hour", "REAL NOT NULL DEFAULT 0"),
+    ("repo_state", "idle_polls", "INTEGER NOT NULL DEFAULT 0"),
+    ("repo_state", "interval_seconds", "REAL"),
+    ("repo_state", "last_polled_at", "TEXT"),
+    ("repo_state", "next_poll_at", "TEXT"),
+    ("repo_state", "next_poll_reason", "TEXT"),
+    ("repo_state", "fence_token", "INTEGER"),
+    ("outbox", "claimed_by", "TEXT"),
+    ("outbox", "claimed_until", "TEXT"),
+    ("enrichment_queue", "attempts", "INTEGER NOT NULL DEFAULT 0"),
+    ("batch_shards", "claimed_by", "TEXT"),
+    ("batch_shards", "claimed_until", "TEXT"),
+]
+
+
+def _ensure_column(conn: sqlite3.Connection, table: str, column: str,
+                   ddl: str) -> None:
+    cols = {r[1] for r in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in cols:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
 def init_db(conn: sqlite3.Connection) -> None:
+    # Older DBs: add new columns before the schema script builds indexes on them
+    for table, column, ddl in MIGRATIONS:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?",
+            (table, )).fetchone()
+        if exists:
+            _ensure_column(conn, table, column, ddl)
     conn.executescript(SCHEMA_SQL)
     conn.commit()
@@ -1,69 +1,198 @@
+import asyncio
+import random
 import sqlite3
 import time
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Optional
 
+# Rows outlive their holders (release only expires them) so `token`, the
+# fencing token, keeps increasing across acquisitions of the same name
 LOCK_SCHEMA = """
 CREATE TABLE IF NOT EXISTS poller_locks (
   name TEXT PRIMARY KEY,
   owner TEXT NOT NULL,
-  expires_at REAL NOT NULL
+  expires_at REAL NOT NULL,
+  token INTEGER NOT NULL DEFAULT 0
 );
 """
 
 
+class LeaseLost(RuntimeError):
+    """The lease expired and another owner took the lock over."""
+
+
 def init_lock_table(conn: sqlite3.Connection):
     conn.execute(LOCK_SCHEMA)
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(poller_locks)")}
+    if "token" not in cols:
+        conn.execute("ALTER TABLE poller_locks ADD COLUMN token "
+                     "INTEGER NOT NULL DEFAULT 0")
     conn.commit()
 
 
+class Lease:
+    """
+    A held lock. `token` (its fencing token) increases with every
+    acquisition of `name`, so writes fenced with it are rejected once a later
+    holder has written (see RepoStateRepository.upsert_last_sha). renew()
+    extends the lease; acquire_lock_async renews it in the background.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, name: str, owner: str,
+                 token: int, ttl_seconds: float):
+        self.conn = conn
+        self.name = name
+        self.owner = owner
+        self.token = token
+        self.ttl_seconds = ttl_seconds
+        self.renewals = 0
+        self.lost = False
+
+    def renew(self) -> bool:
+        """Extend the lease by its TTL; False (and `lost`) if taken over."""
+        try:
+            cur = self.conn.execute(
+                "UPDATE poller_locks SET expires_at = ? "
+                "WHERE name = ? AND owner = ? AND token = ?",
+                (time.time() + self.ttl_seconds, self.name, self.owner,
+                 self.token))
+            self.conn.commit()
+        except sqlite3.OperationalError:
+            return True  # DB busy; the next heartbeat retries
+        if cur.rowcount:
+            self.renewals += 1
+        else:
+            self.lost = True
+        return not self.lost
+
+    def check(self) -> None:
+        """Raise LeaseLost if a renewal found the lock taken over."""
+        if self.lost:
+            raise LeaseLost(f"lease on {self.name} was taken over")
+
+    def release(self) -> None:
+        try:
+            self.conn.execute(
+                "UPDATE poller_locks SET expires_at = 0 "
+                "WHERE name = ? AND owner = ? AND token = ?",
+                (self.name, self.owner, self.token))
+            self.conn.commit()
+        except Exception:
+            pass
+
+
+def _try_acquire(conn: sqlite3.Connection, name: str, owner: str,
+                 ttl_seconds: float) -> Optional[Lease]:
+    now = time.time()
+    exp = now + ttl_seconds
+    try:
+        # Insert if not exists
+        conn.execute(
+            "INSERT INTO poller_locks(name, owner, expires_at, token) VALUES (?,?,?,1)",
+            (name, owner, exp))
+        conn.commit()
+        return Lease(conn, name, owner, 1, ttl_seconds)
+    except sqlite3.IntegrityError:
+        # Exists -> take it over if expired, in one statement so two
+        # contenders can't both win
+        cur = conn.execute(
+            "UPDATE poller_locks SET owner = ?, expires_at = ?, token = token + 1 "
+            "WHERE name = ? AND expires_at < ?", (owner, exp, name, now))
+        conn.commit()
+        if not cur.rowcount:
+            return None
+        token = conn.execute("SELECT token FROM poller_locks WHERE name = ?",
+                             (name, )).fetchone()[0]
+        return Lease(conn, name, owner, token, ttl_seconds)
+
+
+def _retry_delay(attempt: int, min_retry: float, max_retry: float) -> float:
+    # Exponential backoff with jitter, so contenders don't retry in lockstep
+    return min(max_retry, min_retry * 2**attempt) * random.uniform(0.5, 1.0)
+
+
+def try_acquire_lock(conn: sqlite3.Connection,
+                     name: str,
+                     owner: str,
+                     ttl_seconds: float = 120) -> Optional[Lease]:
+    """One non-blocking attempt: the Lease, or None if the lock is held."""
+    init_lock_table(conn)
+    return _try_acquire(conn, name, owner, ttl_seconds)
+
+
 @contextmanager
 def acquire_lock(conn: sqlite3.Connection,
                  name: str,
                  owner: str,
                  ttl_seconds: int = 120,
                  retry_seconds: float = 0.5,
-                 max_wait_seconds: float = 10.0):
+                 max_wait_seconds: float = 10.0,
+                 min_retry_seconds: float = 0.01,
+                 sleep: Callable[[float], None] = time.sleep):
     """
     Try to acquire a named lock. If the lock is expired, steal it.
-    Yields True if acquired, else False (never raises for contention).
+    Yields the Lease if acquired, else None (never raises for contention).
+    Retries back off from `min_retry_seconds` up to `retry_seconds`, waiting
+    with `sleep`; `max_wait_seconds=0` tries exactly once. The lease isn't
+    renewed here: hold it for less than `ttl_seconds` or call renew().
     """
     start = time.time()
     init_lock_table(conn)
-    got = False
-    while time.time() - start < max_wait_seconds:
-        now = time.time()
-        exp = now + ttl_seconds
-        try:
-            # Insert if not exists
-            conn.execute(
-                "INSERT INTO poller_locks(name, owner, expires_at) VALUES (?,?,?)",
-                (name, owner, exp))
-            conn.commit()
-            got = True
+    attempt = 0
+    while True:
+        lease = _try_acquire(conn, name, owner, ttl_seconds)
+        left = max_wait_seconds - (time.time() - start)
+        if lease or left <= 0:
+            break
+        sleep(
+            min(left, _retry_delay(attempt, min_retry_seconds,
+                                   retry_seconds)))
+        attempt += 1
+    try:
+        yield lease
+    finally:
+        if lease:
+            lease.release()
+
+
+async def _heartbeat(lease: Lease, interval: float) -> None:
+    while await asyncio.sleep(interval, True) and lease.renew():
+        pass
+
+
+@asynccontextmanager
+async def acquire_lock_async(conn: sqlite3.Connection,
+                             name: str,
+                             owner: str,
+                             ttl_seconds: int = 120,
+                             retry_seconds: float = 0.5,
+                             max_wait_seconds: float = 10.0,
+                             min_retry_seconds: float = 0.01):
+    """
+    acquire_lock for event loops: waits between retries without blocking,
+    and renews the lease every `ttl_seconds / 3` while it's held, so a run
+    longer than the TTL keeps it. If a renewal finds the lock taken over,
+    the lease is marked lost (see Lease.check).
+    """
+    start = time.time()
+    init_lock_table(conn)
+    attempt = 0
+    while True:
+        lease = _try_acquire(conn, name, owner, ttl_seconds)
+        left = max_wait_seconds - (time.time() - start)
+        if lease or left <= 0:
             break
-        except sqlite3.IntegrityError:
-            # Exists -> check expiry
-            cur = conn.execute(
-                "SELECT owner, expires_at FROM poller_locks WHERE name = ?",
-                (name, ))
-            row = cur.fetchone()
-            if row and row["expires_at"] < now:
-                # Steal expired lock
-                conn.execute(
-                    "UPDATE poller_locks SET owner = ?, expires_at = ? WHERE name = ?",
-                    (owner, exp, name))
-                conn.commit()
-                got = True
-                break
-        time.sleep(retry_seconds)
+        await asyncio.sleep(
+            min(left, _retry_delay(attempt, min_retry_seconds,
+                                   retry_seconds)))
+        attempt += 1
+    beat = (asyncio.ensure_future(_heartbeat(lease, ttl_seconds / 3))
+            if lease else None)
     try:
-        yield got
+        yield lease
     finally:
-        if got:
-            try:
-                conn.execute(
-                    "DELETE FROM poller_locks WHERE name = ? AND owner = ?",
-                    (name, owner))
-                conn.commit()
-            except Exception:
-                pass
+        if beat is not None:
+            beat.cancel()
+            await asyncio.gather(beat, return_exceptions=True)
+        if lease:
+            lease.release()
@@ -1,15 +1,30 @@
+import json
 import sqlite3
 from dataclasses import asdict
-from datetime import datetime, timezone
-from typing import Optional, Dict, Any, List
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Iterable, Tuple, Callable
 
-from common.models import UserPreferences
+from common.models import UserPreferences, RepoConfig, JobListing, OutgoingMessage
 
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+# Stay under SQLite's default bound-parameter limit (999 before 3.32)
+_MAX_PARAMS = 500
+
+
+def _job_to_json(job: JobListing) -> str:
+    return json.dumps(asdict(job), default=sorted)
+
+
+def _job_from_dict(d: Dict[str, Any]) -> JobListing:
+    if d.get("tags") is not None:
+        d["tags"] = frozenset(d["tags"])
+    return JobListing(**d)
+
+
 def _list_to_csv(items: List[str]) -> str:
     return ",".join(s.strip() for s in items if s and s.strip())
 
@@ -36,15 +51,16 @@ class UserRepository:
               notify_email, notify_sms,
               subscribe_new_grad, subscribe_internship, receive_all,
               tech_keywords, role_keywords, location_keywords,
-              created_at, updated_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+              subscribed_repos, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """,
             (user_id, email, phone, int(is_verified), int(notify_email),
              int(notify_sms), int(prefs.subscribe_new_grad),
              int(prefs.subscribe_internship), int(
                  prefs.receive_all), _list_to_csv(
                      prefs.tech_keywords), _list_to_csv(prefs.role_keywords),
-             _list_to_csv(prefs.location_keywords), now, now),
+             _list_to_csv(prefs.location_keywords),
+             _list_to_csv(prefs.subscribed_repos), now, now),
         )
         self.conn.commit()
 
@@ -61,6 +77,7 @@ class UserRepository:
             tech_keywords=_csv_to_list(row["tech_keywords"]),
             role_keywords=_csv_to_list(row["role_keywords"]),
             location_keywords=_csv_to_list(row["location_keywords"]),
+            subscribed_repos=_csv_to_list(row["subscribed_repos"]),
         )
         return {
             "id": row["id"],
@@ -108,6 +125,7 @@ class UserRepository:
                 "tech_keywords = ?",
                 "role_keywords = ?",
                 "location_keywords = ?",
+                "subscribed_repos = ?",
             ])
             params.extend([
                 int(prefs.subscribe_new_grad),
@@ -116,6 +134,7 @@ class UserRepository:
                 _list_to_csv(prefs.tech_keywords),
                 _list_to_csv(prefs.role_keywords),
                 _list_to_csv(prefs.location_keywords),
+                _list_to_csv(prefs.subscribed_repos),
             ])
         fields.append("updated_at = ?")
         params.append(_now_iso())
@@ -161,17 +180,135 @@ class RepoStateRepository:
         row = cur.fetchone()
         return row["last_sha"] if row else None
 
-    def upsert_last_sha(self, repo_name: str, sha: str) -> None:
+    def upsert_last_sha(self,
+                        repo_name: str,
+                        sha: str,
+                        fence_token: Optional[int] = None) -> bool:
+        """
+        With `fence_token` (the poller lease's token), the write is rejected
+        if a later lease of the repo already wrote. Returns whether it applied.
+        """
+        now = _now_iso()
+        cur = self.conn.execute(
+            """
+            INSERT INTO repo_state (repo_name, last_sha, updated_at, fence_token)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(repo_name) DO UPDATE SET last_sha = excluded.last_sha, updated_at = excluded.updated_at,
+              fence_token = COALESCE(excluded.fence_token, repo_state.fence_token)
+            WHERE excluded.fence_token IS NULL OR repo_state.fence_token IS NULL
+              OR excluded.fence_token >= repo_state.fence_token
+            """, (repo_name, sha, now, fence_token))
+        self.conn.commit()
+        return cur.rowcount == 1
+
+    def get_state(self, repo_name: str) -> Optional[Dict[str, Any]]:
+        cur = self.conn.execute("SELECT * FROM repo_state WHERE repo_name = ?",
+                                (repo_name, ))
+        row = cur.fetchone()
+        return dict(row) if row else None
+
+    def list_states(self) -> List[Dict[str, Any]]:
+        cur = self.conn.execute("SELECT * FROM repo_state ORDER BY repo_name")
+        return [dict(r) for r in cur.fetchall()]
+
+    def record_schedule(self, repo_name: str, decision,
+                        polled_at: datetime) -> None:
+        """Persist a scheduler PollDecision (rate history + next poll time)."""
         now = _now_iso()
         self.conn.execute(
             """
-            INSERT INTO repo_state (repo_name, last_sha, updated_at)
-            VALUES (?, ?, ?)
-            ON CONFLICT(repo_name) DO UPDATE SET last_sha = excluded.last_sha, updated_at = excluded.updated_at
-            """, (repo_name, sha, now))
+            INSERT INTO repo_state (
+              repo_name, last_sha, updated_at, commit_rate_per_hour, idle_polls,
+              interval_seconds, last_polled_at, next_poll_at, next_poll_reason
+            ) VALUES (?, '', ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(repo_name) DO UPDATE SET
+              updated_at = excluded.updated_at,
+              commit_rate_per_hour = excluded.commit_rate_per_hour,
+              idle_polls = excluded.idle_polls,
+              interval_seconds = excluded.interval_seconds,
+              last_polled_at = excluded.last_polled_at,
+              next_poll_at = excluded.next_poll_at,
+              next_poll_reason = excluded.next_poll_reason
+            """, (repo_name, now, decision.rate_per_hour, decision.idle_polls,
+                  decision.interval_seconds, polled_at.isoformat(),
+                  decision.next_poll_at.isoformat(), decision.reason))
         self.conn.commit()
 
 
+class RepoConfigRepository:
+    """Repos to poll. Seeded with the Simplify repos; extendable via config file."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    @staticmethod
+    def _from_row(row) -> RepoConfig:
+        return RepoConfig(key=row["key"],
+                          owner=row["owner"],
+                          repo=row["repo"],
+                          branch=row["branch"],
+                          label=row["label"],
+                          enabled=bool(row["enabled"]))
+
+    def list_repos(self, enabled_only: bool = True) -> List[RepoConfig]:
+        sql = "SELECT * FROM repos"
+        if enabled_only:
+            sql += " WHERE enabled = 1"
+        cur = self.conn.execute(sql + " ORDER BY key")
+        return [self._from_row(r) for r in cur.fetchall()]
+
+    def get_by_full_name(self, full_name: str) -> Optional[RepoConfig]:
+        owner, _, repo = full_name.partition("/")
+        cur = self.conn.execute(
+            "SELECT * FROM repos WHERE owner = ? AND repo = ?", (owner, repo))
+        row = cur.fetchone()
+        return self._from_row(row) if row else None
+
+    def upsert_repo(self, cfg: RepoConfig) -> None:
+        self.conn.execute(
+            """
+            INSERT INTO repos (key, owner, repo, branch, label, enabled)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, repo = excluded.repo,
+              branch = excluded.branch, label = excluded.label, enabled = excluded.enabled
+            """, (cfg.key, cfg.owner, cfg.repo, cfg.branch, cfg.label
+                  or cfg.repo, int(cfg.enabled)))
+        self.conn.commit()
+
+    def set_branch(self, key: str, branch: str) -> bool:
+        """Point an existing repo at `branch`. False if `key` is unknown."""
+        cur = self.conn.execute("UPDATE repos SET branch = ? WHERE key = ?",
+                                (branch, key))
+        self.conn.commit()
+        return cur.rowcount > 0
+
+    def load_file(self, path: str) -> List[RepoConfig]:
+        """
+        Upsert repos from a JSON file: a list of objects with key, owner, repo
+        and optional branch, label, enabled. Returns the configs loaded.
+        """
+        with open(path) as f:
+            entries = json.load(f)
+        configs = [RepoConfig(**e) for e in entries]
+        for cfg in configs:
+            self.upsert_repo(cfg)
+        return configs
+
+
+def _claim_pairs(conn: sqlite3.Connection,
+                 pairs: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Insert sent_notifications rows without committing; returns the new ones."""
+    now = _now_iso()
+    claimed = []
+    for user_id, job_id in pairs:
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO sent_notifications (user_id, job_id, sent_at) VALUES (?, ?, ?)",
+            (user_id, job_id, now))
+        if cur.rowcount:
+            claimed.append((user_id, job_id))
+    return claimed
+
+
 class SentNotificationsRepository:
 
     def __init__(self, conn: sqlite3.Connection):
@@ -189,3 +326,451 @@ class SentNotificationsRepository:
             "INSERT OR IGNORE INTO sent_notifications (user_id, job_id, sent_at) VALUES (?, ?, ?)",
             (user_id, job_id, _now_iso()))
         self.conn.commit()
+
+    def filter_unsent(self, user_id: str, job_ids: List[str]) -> List[str]:
+        """The subset of `job_ids` not yet sent to `user_id`, in input order."""
+        sent = set()
+        for i in range(0, len(job_ids), _MAX_PARAMS):
+            chunk = job_ids[i:i + _MAX_PARAMS]
+            cur = self.conn.execute(
+                "SELECT job_id FROM sent_notifications WHERE user_id = ? "
+                f"AND job_id IN ({','.join('?' * len(chunk))})",
+                (user_id, *chunk))
+            sent.update(r["job_id"] for r in cur.fetchall())
+        return [j for j in job_ids if j not in sent]
+
+    def mark_sent_many(
+            self, pairs: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        Mark (user_id, job_id) pairs sent in one transaction. Returns the pairs
+        this call inserted, so concurrent runs never both claim the same pair.
+        """
+        with self.conn:
+            return _claim_pairs(self.conn, pairs)
+
+
+class SeenListingsRepository:
+    """
+    Per-repo ledger of processed listings: (listing key, content hash) pairs
+    recorded once a run has matched and claimed them.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def filter_unseen(self, repo_name: str,
+                      entries: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        The (key, content_hash) entries not yet recorded for `repo_name`, or
+        recorded with a different hash, in input order.
+        """
+        seen = set()
+        for i in range(0, len(entries), _MAX_PARAMS):
+            keys = [k for k, _ in entries[i:i + _MAX_PARAMS]]
+            cur = self.conn.execute(
+                "SELECT listing_key, content_hash FROM seen_listings "
+                f"WHERE repo_name = ? AND listing_key IN ({','.join('?' * len(keys))})",
+                (repo_name, *keys))
+            seen.update((r["listing_key"], r["content_hash"])
+                        for r in cur.fetchall())
+        return [e for e in entries if e not in seen]
+
+    def record(self, repo_name: str, entries: List[Tuple[str, str]]) -> None:
+        now = _now_iso()
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO seen_listings (repo_name, listing_key, content_hash, seen_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (repo_name, listing_key)
+                DO UPDATE SET content_hash = excluded.content_hash, seen_at = excluded.seen_at
+                """, [(repo_name, k, h, now) for k, h in entries])
+
+    def prune(self, older_than: timedelta) -> int:
+        """Forget entries recorded more than `older_than` ago; returns how many."""
+        cutoff = (datetime.now(timezone.utc) - older_than).isoformat()
+        with self.conn:
+            cur = self.conn.execute(
+                "DELETE FROM seen_listings WHERE seen_at < ?", (cutoff, ))
+        return cur.rowcount
+
+    def count(self, repo_name: str) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM seen_listings WHERE repo_name = ?",
+            (repo_name, )).fetchone()[0]
+
+
+class WebhookEventRepository:
+    """
+    Durable queue of pushed commit SHAs recorded by the GitHub webhook.
+    Rows stay pending until a poller worker has processed their repo.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def enqueue(self,
+                repo_name: str,
+                shas: List[str],
+                ref: str = "",
+                delivery_id: Optional[str] = None) -> int:
+        """
+        Queue `shas`; a SHA already recorded for the same `delivery_id` (a
+        GitHub redelivery) is skipped. Returns how many were queued.
+        """
+        now = _now_iso()
+        before = self.conn.total_changes
+        self.conn.executemany(
+            """
+            INSERT INTO webhook_events (repo_name, ref, sha, delivery_id, received_at)
+            SELECT ?, ?, ?, ?, ?
+            WHERE ? IS NULL OR NOT EXISTS (
+              SELECT 1 FROM webhook_events WHERE delivery_id = ? AND sha = ?)
+            """, [(repo_name, ref, sha, delivery_id, now, delivery_id,
+                   delivery_id, sha) for sha in shas])
+        self.conn.commit()
+        return self.conn.total_changes - before
+
+    def pending_repos(self) -> List[Dict[str, Any]]:
+        """
+        One entry per repo with unprocessed events: the newest event id
+        (used as a high-water mark) and the oldest receive time (for lag).
+        """
+        cur = self.conn.execute("""
+            SELECT repo_name, MAX(id) AS max_id, MIN(received_at) AS oldest_received_at,
+                   COUNT(*) AS n
+            FROM webhook_events
+            WHERE processed_at IS NULL
+            GROUP BY repo_name
+            ORDER BY MIN(id)
+            """)
+        return [dict(r) for r in cur.fetchall()]
+
+    def mark_processed(self, repo_name: str, up_to_id: int) -> None:
+        self.conn.execute(
+            """
+            UPDATE webhook_events SET processed_at = ?
+            WHERE repo_name = ? AND id <= ? AND processed_at IS NULL
+            """, (_now_iso(), repo_name, up_to_id))
+        self.conn.commit()
+
+
+class EnrichmentQueueRepository:
+    """
+    Jobs deferred by two-phase notifications: sent later, once the enrichment
+    worker has their description. A job is queued at most once per repo.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def enqueue(self, repo_name: str, repo_key: str, repo_label: str,
+                jobs: List[JobListing]) -> int:
+        now = _now_iso()
+        before = self.conn.total_changes
+        self.conn.executemany(
+            """
+            INSERT OR IGNORE INTO enrichment_queue
+              (repo_name, repo_key, repo_label, job_id, job_json, enqueued_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """, [(repo_name, repo_key, repo_label, j.id, _job_to_json(j), now)
+                  for j in jobs])
+        self.conn.commit()
+        return self.conn.total_changes - before
+
+    def pending(self,
+                limit: int = 20,
+                after_id: int = 0) -> List[Dict[str, Any]]:
+        """
+        Oldest unprocessed entries with id > `after_id`, each with its
+        JobListing under "job" and its cut-off fetches so far as "attempts".
+        """
+        cur = self.conn.execute(
+            """
+            SELECT id, repo_name, repo_key, repo_label, job_json, enqueued_at,
+                   attempts
+            FROM enrichment_queue
+            WHERE processed_at IS NULL AND id > ?
+            ORDER BY id
+            LIMIT ?
+            """, (after_id, limit))
+        out = []
+        for r in cur.fetchall():
+            d = dict(r)
+            d["job"] = _job_from_dict(json.loads(d.pop("job_json")))
+            out.append(d)
+        return out
+
+    def mark_processed(self, ids: List[int]) -> None:
+        self.conn.executemany(
+            "UPDATE enrichment_queue SET processed_at = ? WHERE id = ?",
+            [(_now_iso(), i) for i in ids])
+        self.conn.commit()
+
+    def record_attempt(self, ids: List[int]) -> None:
+        """Count a drain whose fetch of each entry was cut off."""
+        self.conn.executemany(
+            "UPDATE enrichment_queue SET attempts = attempts + 1 WHERE id = ?",
+            [(i, ) for i in ids])
+        self.conn.commit()
+
+    def pending_count(self) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM enrichment_queue WHERE processed_at IS NULL"
+        ).fetchone()[0]
+
+
+class UserShardRepository:
+    """
+    Job batches fanned out by user shard. A repo's poller writes each run's
+    jobs once, with one pending row per shard; any worker holding a shard's
+    lease (see claim) matches and sends for the users hashed to it (see
+    shard_of). The lease lives on the shard's row, so it goes with the batch.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, n_shards: int = 1):
+        self.conn = conn
+        self.n_shards = n_shards
+
+    def create_batch(self,
+                     repo_name: str,
+                     repo_key: str,
+                     repo_label: str,
+                     jobs: List[JobListing],
+                     cheap_only: bool = False) -> int:
+        """
+        Write `jobs` and a pending row per shard in one transaction. With
+        `cheap_only` (two-phase mode), shards match on listing fields only.
+        """
+        with self.conn:
+            cur = self.conn.execute(
+                """
+                INSERT INTO job_batches
+                  (repo_name, repo_key, repo_label, jobs_json, n_shards, cheap_only, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (repo_name, repo_key, repo_label,
+                      json.dumps([asdict(j) for j in jobs], default=sorted),
+                      self.n_shards, int(cheap_only), _now_iso()))
+            batch_id = cur.lastrowid
+            self.conn.executemany(
+                "INSERT INTO batch_shards (batch_id, shard) VALUES (?, ?)",
+                [(batch_id, shard) for shard in range(self.n_shards)])
+        return batch_id
+
+    def pending(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Unfinished shards, oldest batch first, with their batch's fields."""
+        cur = self.conn.execute(
+            """
+            SELECT s.batch_id, s.shard, b.n_shards, b.repo_name, b.repo_key,
+                   b.repo_label, b.cheap_only, b.created_at
+            FROM batch_shards s JOIN job_batches b ON b.id = s.batch_id
+            WHERE s.done_at IS NULL
+            ORDER BY s.batch_id, s.shard
+            LIMIT ?
+            """, (limit, ))
+        return [dict(r) for r in cur.fetchall()]
+
+    def claim(self,
+              batch_id: int,
+              shard: int,
+              owner: str,
+              lease_seconds: float = 120) -> bool:
+        """
+        Lease an unfinished shard to `owner` for `lease_seconds`, in one
+        conditional UPDATE; False if it's done or another worker's lease on it
+        hasn't run out. The owner's own lease is extended.
+        """
+        now = datetime.now(timezone.utc)
+        cur = self.conn.execute(
+            """
+            UPDATE batch_shards SET claimed_by = ?, claimed_until = ?
+            WHERE batch_id = ? AND shard = ? AND done_at IS NULL
+              AND (claimed_until IS NULL OR claimed_until <= ?
+                   OR claimed_by = ?)
+            """, (owner, (now + timedelta(seconds=lease_seconds)).isoformat(),
+                  batch_id, shard, now.isoformat(), owner))
+        self.conn.commit()
+        return cur.rowcount == 1
+
+    def renew(self,
+              batch_id: int,
+              shard: int,
+              owner: str,
+              lease_seconds: float = 120) -> bool:
+        """Extend `owner`'s lease; False if another worker took the shard over."""
+        until = datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)
+        cur = self.conn.execute(
+            """
+            UPDATE batch_shards SET claimed_until = ?
+            WHERE batch_id = ? AND shard = ? AND claimed_by = ?
+              AND done_at IS NULL
+            """, (until.isoformat(), batch_id, shard, owner))
+        self.conn.commit()
+        return cur.rowcount == 1
+
+    def release(self, batch_id: int, shard: int, owner: str) -> None:
+        """Give up `owner`'s lease early, so another worker can retry it."""
+        self.conn.execute(
+            """
+            UPDATE batch_shards SET claimed_by = NULL, claimed_until = NULL
+            WHERE batch_id = ? AND shard = ? AND claimed_by = ?
+            """, (batch_id, shard, owner))
+        self.conn.commit()
+
+    def is_pending(self, batch_id: int, shard: int) -> bool:
+        return self.conn.execute(
+            "SELECT 1 FROM batch_shards WHERE batch_id = ? AND shard = ? AND done_at IS NULL",
+            (batch_id, shard)).fetchone() is not None
+
+    def jobs(self, batch_id: int) -> List[JobListing]:
+        row = self.conn.execute(
+            "SELECT jobs_json FROM job_batches WHERE id = ?",
+            (batch_id, )).fetchone()
+        return [_job_from_dict(d) for d in json.loads(row["jobs_json"])
+                ] if row else []
+
+    def mark_done(self, batch_id: int, shard: int) -> None:
+        """Finish a shard; the batch is deleted once its last shard is done."""
+        with self.conn:
+            self.conn.execute(
+                "UPDATE batch_shards SET done_at = ? WHERE batch_id = ? AND shard = ? AND done_at IS NULL",
+                (_now_iso(), batch_id, shard))
+            left = self.conn.execute(
+                "SELECT COUNT(*) FROM batch_shards WHERE batch_id = ? AND done_at IS NULL",
+                (batch_id, )).fetchone()[0]
+            if not left:
+                self.conn.execute("DELETE FROM batch_shards WHERE batch_id = ?",
+                                  (batch_id, ))
+                self.conn.execute("DELETE FROM job_batches WHERE id = ?",
+                                  (batch_id, ))
+
+    def pending_count(self) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM batch_shards WHERE done_at IS NULL"
+        ).fetchone()[0]
+
+
+class OutboxRepository:
+    """
+    Notifications waiting for delivery. `stage` commits the dedupe marks and
+    the rendered messages together, so a crash can't lose a claimed digest;
+    rows stay pending until delivered or out of attempts. Workers lease rows
+    with claim_due before sending them.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def stage(
+        self, pairs: Iterable[Tuple[str, str]],
+        render: Callable[[List[Tuple[str, str]]], List[OutgoingMessage]]
+    ) -> List[Tuple[str, str]]:
+        """
+        Claim (user_id, job_id) pairs like mark_sent_many and queue the
+        messages `render` builds for the claimed ones, in one transaction.
+        Returns the claimed pairs.
+        """
+        now = _now_iso()
+        with self.conn:
+            claimed = _claim_pairs(self.conn, pairs)
+            self.conn.executemany(
+                """
+                INSERT OR IGNORE INTO outbox
+                  (idempotency_key, user_id, channel, to_addr, subject,
+                   html_body, text_body, created_at, next_attempt_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, [(m.idempotency_key, m.user_id, m.channel, m.to_addr,
+                       m.subject, m.html_body, m.text_body, now, now)
+                      for m in render(claimed)])
+        return claimed
+
+    def claim_due(self,
+                  owner: str,
+                  limit: int = 50,
+                  lease_seconds: float = 300) -> List[Dict[str, Any]]:
+        """
+        Lease the oldest pending rows whose next attempt is due to `owner` for
+        `lease_seconds` and return them, message under "message". The lease
+        is taken by one conditional UPDATE, so concurrent workers get disjoint
+        rows; a row whose worker died is claimable again once it runs out.
+        """
+        now = datetime.now(timezone.utc)
+        until = (now + timedelta(seconds=lease_seconds)).isoformat()
+        self.conn.execute(
+            """
+            UPDATE outbox SET claimed_by = ?, claimed_until = ?
+            WHERE id IN (
+              SELECT id FROM outbox
+              WHERE delivered_at IS NULL AND failed_at IS NULL
+                AND next_attempt_at <= ?
+                AND (claimed_until IS NULL OR claimed_until <= ?)
+              ORDER BY id
+              LIMIT ?)
+            """, (owner, until, now.isoformat(), now.isoformat(), limit))
+        self.conn.commit()
+        cur = self.conn.execute(
+            """
+            SELECT * FROM outbox
+            WHERE claimed_by = ? AND claimed_until = ?
+              AND delivered_at IS NULL AND failed_at IS NULL
+            ORDER BY id
+            """, (owner, until))
+        out = []
+        for r in cur.fetchall():
+            d = dict(r)
+            d["message"] = OutgoingMessage(
+                **{k: d[k] for k in OutgoingMessage.__dataclass_fields__})
+            out.append(d)
+        return out
+
+    def mark_delivered(self, outbox_id: int) -> None:
+        self.conn.execute(
+            """
+            UPDATE outbox SET delivered_at = ?, attempts = attempts + 1,
+              claimed_by = NULL, claimed_until = NULL
+            WHERE id = ?
+            """, (_now_iso(), outbox_id))
+        self.conn.commit()
+
+    def mark_attempt_failed(self, outbox_id: int, error: str,
+                            retry_in: Optional[float]) -> None:
+        """Record a failed send; retry after `retry_in` seconds, or give up if None."""
+        now = datetime.now(timezone.utc)
+        if retry_in is None:
+            self.conn.execute(
+                """
+                UPDATE outbox SET attempts = attempts + 1, last_error = ?,
+                  failed_at = ?, claimed_by = NULL, claimed_until = NULL
+                WHERE id = ?
+                """, (error, now.isoformat(), outbox_id))
+        else:
+            self.conn.execute(
+                """
+                UPDATE outbox SET attempts = attempts + 1, last_error = ?,
+                  next_attempt_at = ?, claimed_by = NULL, claimed_until = NULL
+                WHERE id = ?
+                """, (error, (now + timedelta(seconds=retry_in)).isoformat(),
+                      outbox_id))
+        self.conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, age of the oldest pending row, and terminal counts."""
+        r = self.conn.execute("""
+            SELECT
+              SUM(delivered_at IS NULL AND failed_at IS NULL) AS depth,
+              MIN(CASE WHEN delivered_at IS NULL AND failed_at IS NULL
+                       THEN created_at END) AS oldest_created_at,
+              SUM(delivered_at IS NOT NULL) AS delivered,
+              SUM(failed_at IS NOT NULL) AS failed
+            FROM outbox
+            """).fetchone()
+        oldest = r["oldest_created_at"]
+        age = ((datetime.now(timezone.utc) -
+                datetime.fromisoformat(oldest)).total_seconds()
+               if oldest else None)
+        return {
+            "depth": r["depth"] or 0,
+            "oldest_age_seconds": age,
+            "delivered": r["delivered"] or 0,
+            "failed": r["failed"] or 0,
+        }
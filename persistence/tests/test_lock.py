@@ -1,4 +1,7 @@
 import sqlite3, time
+
+import pytest
+
 from persistence.lock import acquire_lock, init_lock_table
 
 
@@ -34,3 +37,116 @@ def test_lock_expires_and_is_stolen():
                           ttl_seconds=1,
                           max_wait_seconds=0.2) as ok2:
             assert ok2  # Stolen after expiry
+
+
+def test_async_lock_waits_without_blocking_the_loop():
+    import asyncio
+    from persistence.lock import acquire_lock_async
+
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    init_lock_table(conn)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.05)
+
+    async def main():
+        async with acquire_lock_async(conn, "Z", "owner1") as ok1:
+            assert ok1
+            t = asyncio.ensure_future(ticker())
+            async with acquire_lock_async(conn,
+                                          "Z",
+                                          "owner2",
+                                          retry_seconds=0.05,
+                                          max_wait_seconds=0.3) as ok2:
+                assert not ok2
+            gave_up = time.monotonic()
+            await t
+        async with acquire_lock_async(conn, "Z", "owner2") as ok3:
+            assert ok3
+
+        return gave_up
+
+    gave_up = asyncio.run(main())
+    # Other tasks kept running while the lock was contended
+    assert sum(t < gave_up for t in ticks) >= 3
+
+
+def test_fencing_tokens_reject_a_taken_over_lease():
+    from persistence.db import init_db
+    from persistence.lock import try_acquire_lock
+    from persistence.repositories import RepoStateRepository
+
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    init_db(conn)
+    state = RepoStateRepository(conn)
+
+    first = try_acquire_lock(conn, "poller:a/b", "owner1", ttl_seconds=0.1)
+    assert first.token == 1
+    assert try_acquire_lock(conn, "poller:a/b", "owner2") is None
+    time.sleep(0.15)
+    second = try_acquire_lock(conn, "poller:a/b", "owner2", ttl_seconds=60)
+    assert second.token == 2
+
+    # The stalled first holder can't renew, and its SHA write is fenced
+    # once the new holder has written
+    assert first.renew() is False and first.lost
+    assert state.upsert_last_sha("a/b", "sha-new", second.token)
+    assert not state.upsert_last_sha("a/b", "sha-stale", first.token)
+    assert state.get_last_sha("a/b") == "sha-new"
+
+    # Tokens keep increasing after a release
+    second.release()
+    assert try_acquire_lock(conn, "poller:a/b", "owner1").token == 3
+
+
+def test_async_lease_renews_past_its_ttl():
+    import asyncio
+    from persistence.lock import acquire_lock_async, try_acquire_lock
+
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    init_lock_table(conn)
+
+    async def main():
+        async with acquire_lock_async(conn, "R", "owner1",
+                                      ttl_seconds=0.3) as lease:
+            for _ in range(4):
+                await asyncio.sleep(0.2)
+                assert try_acquire_lock(conn, "R", "owner2") is None
+            lease.check()
+            return lease.renewals
+
+    assert asyncio.run(main()) >= 2
+    assert try_acquire_lock(conn, "R", "owner2") is not None
+
+
+def test_retries_back_off_exponentially_up_to_retry_seconds(monkeypatch):
+    import persistence.lock as lock_mod
+    from persistence.lock import try_acquire_lock
+
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    init_lock_table(conn)
+    holder = try_acquire_lock(conn, "B", "owner1")
+    # Jitter pinned to its upper bound
+    monkeypatch.setattr(lock_mod.random, "uniform", lambda lo, hi: hi)
+    waits = []
+
+    def fake_sleep(seconds):
+        waits.append(seconds)
+        if len(waits) == 6:
+            holder.release()
+
+    with acquire_lock(conn,
+                      "B",
+                      "owner2",
+                      retry_seconds=0.1,
+                      min_retry_seconds=0.01,
+                      sleep=fake_sleep) as lease:
+        assert lease is not None
+    assert waits == pytest.approx([0.01, 0.02, 0.04, 0.08, 0.1, 0.1])
@@ -6,6 +6,7 @@ LIVE = os.getenv("RUN_LIVE_TESTS") == "1"
 TOKEN = os.getenv("GITHUB_TOKEN") or os.getenv("GH_TOKEN")
 
 
+@pytest.mark.network
 @pytest.mark.skipif(not LIVE, reason="Set RUN_LIVE_TESTS=1 to run")
 def test_commits_endpoint_live():
     headers = {"Authorization": f"token {TOKEN}"} if TOKEN else {}
@@ -141,3 +141,70 @@ def test_empty_job_list_sends_nothing(prefs_all):
     svc.send_summary(user, [], repo_label="New Grad")
     assert sender.emails == []
     assert sender.sms == []
+
+
+def test_catch_up_digest_lists_top_k_and_counts_the_rest():
+    prefs = UserPreferences(subscribe_new_grad=True,
+                            subscribe_internship=False,
+                            receive_all=True,
+                            tech_keywords=["rust"],
+                            role_keywords=[],
+                            location_keywords=[])
+    user = UserContact(id="u1",
+                       email="a@b.com",
+                       phone="+15551234567",
+                       is_verified=True,
+                       notify_email=True,
+                       notify_sms=True,
+                       prefs=prefs)
+    jobs = [
+        sample_job(i, f"Engineer {i}", url=f"https://ex.com/{i}")
+        for i in range(300)
+    ]
+    jobs[250].title = "Rust Engineer"
+    sender = FakeSender()
+    svc = NotificationService(sender,
+                              edit_link_builder=lambda u: "https://edit/link")
+    svc.send_summary(user, jobs, repo_label="New Grad")
+
+    _, subject, html, text = sender.emails[0]
+    assert "300 new matches" in subject
+    assert text.count("\n- ") == 25 and "+ 275 more not shown" in text
+    assert html.count("<li>") == 26
+    # The keyword hit ranks first, the rest keep their order
+    assert text.index("Rust Engineer") < text.index("Engineer 0 ")
+
+    sms = sender.sms[0][1]
+    assert sms.count("\n- ") == 5 and "+ 295 more not shown" in sms
+    assert len(sms) < 1590
+
+
+def test_idempotency_key_only_goes_to_channels_that_accept_it(prefs_all):
+
+    class EmailKeyedSender(FakeSender):
+        """Resend-style email paired with an SMS sender that takes no key."""
+        accepts_email_idempotency_key = True
+
+        def __init__(self):
+            super().__init__()
+            self.keys = []
+
+        def send_email(self, to_addr, subject, html_body, text_body,
+                       idempotency_key=None):
+            self.keys.append(idempotency_key)
+            super().send_email(to_addr, subject, html_body, text_body)
+
+    user = UserContact(id="u1",
+                       email="a@b.com",
+                       phone="+15551234567",
+                       is_verified=True,
+                       notify_email=True,
+                       notify_sms=True,
+                       prefs=prefs_all)
+    sender = EmailKeyedSender()
+    svc = NotificationService(sender,
+                              edit_link_builder=lambda u: "https://edit/link")
+    svc.send_summary(user, [sample_job()], repo_label="New Grad")
+
+    assert len(sender.emails) == 1 and len(sender.sms) == 1
+    assert sender.keys[0].endswith("-email")
@@ -2,10 +2,11 @@ import sqlite3
 import pytest
 from job_scraper.scraper import JobScraper
 from persistence.db import init_db
-from persistence.repositories import RepoStateRepository, SentNotificationsRepository
+from persistence.repositories import RepoStateRepository, SentNotificationsRepository, SeenListingsRepository
 from common.models import JobListing, UserPreferences, UserContact
 from notification.service import NotificationService
 from notification.orchestrator import run_poll_for_repo
+from github_poller.dedupe import content_hash, listing_key
 
 
 class FakeSender:
@@ -247,3 +248,566 @@ def test_orchestrator_dedup_second_run(conn):
                       notifier=notifier,
                       scraper=DummyScraper())
     assert len(sender.emails) == 1  # No additional email
+
+
+def test_orchestrator_uses_subscribed_repo_keys(conn):
+    jobs = [J(1, "Backend Engineer")]
+    sender = FakeSender()
+    notifier = NotificationService(
+        sender, edit_link_builder=lambda u: "https://edit/link")
+
+    # Subscribed only through the repo key list, none of the legacy flags
+    prefs = UserPreferences(subscribe_new_grad=False,
+                            subscribe_internship=False,
+                            receive_all=True,
+                            tech_keywords=[],
+                            role_keywords=[],
+                            location_keywords=[],
+                            subscribed_repos=["offseason"])
+    users = [
+        UserContact(id="u3",
+                    email="c@b.com",
+                    phone=None,
+                    is_verified=True,
+                    notify_email=True,
+                    notify_sms=False,
+                    prefs=prefs)
+    ]
+
+    for key in ("offseason", "new_grad"):
+        run_poll_for_repo(repo_name="SimplifyJobs/Summer2027-Internships",
+                          repo_label="Off-Season",
+                          repo_key=key,
+                          poller=FakePoller(jobs, latest_sha="shaX"),
+                          users=users,
+                          sent_repo=SentNotificationsRepository(conn),
+                          state_repo=RepoStateRepository(conn),
+                          notifier=notifier,
+                          scraper=DummyScraper())
+
+    assert len(sender.emails) == 1
+    assert sender.emails[0][1].startswith("[Off-Season]")
+
+
+class RecordingScraper(DummyScraper):
+
+    def __init__(self):
+        self.urls = []
+
+    async def fetch_description(self, url: str):
+        self.urls.append(url)
+        return await super().fetch_description(url)
+
+
+def test_planner_scrapes_only_undecided_jobs(conn):
+    jobs = [
+        J(1, "Backend Engineer"),  # Title decides for the backend user
+        J(2, "Software Engineer"),  # Needs the description
+        J(3, "Data Analyst", locs=["Toronto, ON"]),  # Location rejects
+    ]
+
+    def user(uid, **kw):
+        prefs = UserPreferences(subscribe_new_grad=True,
+                                subscribe_internship=False,
+                                receive_all=False,
+                                tech_keywords=[],
+                                role_keywords=[],
+                                location_keywords=["remote"])
+        for k, v in kw.items():
+            setattr(prefs, k, v)
+        return UserContact(id=uid,
+                           email=f"{uid}@b.com",
+                           phone=None,
+                           is_verified=True,
+                           notify_email=True,
+                           notify_sms=False,
+                           prefs=prefs)
+
+    users = [
+        user("all", receive_all=True),
+        user("backend", role_keywords=["backend"], tech_keywords=["kubernetes"]),
+    ]
+    # Unverified / unsubscribed users never trigger scrapes
+    users.append(user("unverified", tech_keywords=["rust"]))
+    users[-1].is_verified = False
+    users.append(user("intern", subscribe_new_grad=False, tech_keywords=["go"]))
+
+    sender = FakeSender()
+    scraper = RecordingScraper()
+    stats = run_poll_for_repo(
+        repo_name="SimplifyJobs/New-Grad-Positions",
+        repo_label="New Grad",
+        poller=FakePoller(jobs, latest_sha="sha1"),
+        users=users,
+        sent_repo=SentNotificationsRepository(conn),
+        state_repo=RepoStateRepository(conn),
+        notifier=NotificationService(sender,
+                                     edit_link_builder=lambda u: "x"),
+        scraper=scraper)
+
+    assert scraper.urls == ["https://ex.com/2"]
+    assert stats["jobs_scraped"] == 1
+    assert stats["jobs_scrape_skipped"] == 2
+    # Job 2 still matches "backend" through its description (kubernetes)
+    backend_email = [e for e in sender.emails if e[0] == "backend@b.com"][0]
+    assert "Software Engineer" in backend_email[2]
+    assert "Data Analyst" not in backend_email[2]
+
+
+class HangingScraper(DummyScraper):
+    """ex.com/hang never answers; everything else is instant."""
+
+    async def fetch_description(self, url: str):
+        import asyncio
+        if url.endswith("/hang"):
+            await asyncio.sleep(3600)
+        return await super().fetch_description(url)
+
+
+def test_enrichment_deadline_lets_the_run_finish(conn):
+    import time
+
+    jobs = [J(1, "Software Engineer"), J(2, "Engineer", url="https://ex.com/hang")]
+    prefs = UserPreferences(subscribe_new_grad=True,
+                            subscribe_internship=False,
+                            receive_all=False,
+                            tech_keywords=["kubernetes"],
+                            role_keywords=[],
+                            location_keywords=[])
+    users = [
+        UserContact(id="u1",
+                    email="a@b.com",
+                    phone=None,
+                    is_verified=True,
+                    notify_email=True,
+                    notify_sms=False,
+                    prefs=prefs)
+    ]
+    sender = FakeSender()
+    state_repo = RepoStateRepository(conn)
+    seen = SeenListingsRepository(conn)
+
+    t0 = time.monotonic()
+    stats = run_poll_for_repo(repo_name="SimplifyJobs/New-Grad-Positions",
+                              repo_label="New Grad",
+                              poller=FakePoller(jobs, latest_sha="sha9"),
+                              users=users,
+                              sent_repo=SentNotificationsRepository(conn),
+                              state_repo=state_repo,
+                              notifier=NotificationService(
+                                  sender, edit_link_builder=lambda u: "x"),
+                              scraper=HangingScraper(),
+                              enrich_deadline=0.3,
+                              seen_listings=seen)
+
+    assert time.monotonic() - t0 < 2
+    assert state_repo.get_last_sha("SimplifyJobs/New-Grad-Positions") == "sha9"
+    assert stats["enrichment"]["timed_out"] == 1
+    assert stats["enrichment"]["stragglers"] == [{
+        "id": "2",
+        "url": "https://ex.com/hang"
+    }]
+    # The job that made it in time is still matched and sent
+    assert stats["jobs_sent_total"] == 1
+    assert "Software Engineer" in sender.emails[0][2]
+    # Only the listing that finished its pipeline is in the ledger
+    entries = [(listing_key(j), content_hash(j)) for j in jobs]
+    assert seen.filter_unseen("SimplifyJobs/New-Grad-Positions",
+                              entries) == entries[1:]
+
+
+class StreamingPoller:
+    """commit_diffs() poller: one listing per commit, `delay` s per diff."""
+
+    def __init__(self, n, delay):
+        self.n = n
+        self.delay = delay
+        self.produced_at = []
+
+    def commit_diffs(self, since_sha):
+        import json
+        import time
+
+        def diffs():
+            for i in range(self.n):
+                time.sleep(self.delay)
+                obj = J(i, "Engineer").__dict__
+                body = json.dumps(obj, indent=4).splitlines()[1:-1]
+                self.produced_at.append(time.perf_counter())
+                yield (["@@ -1,1 +1,12 @@", "+    {"] +
+                       ["+    " + line for line in body] + ["+    },"])
+
+        return diffs(), f"sha{self.n}"
+
+
+class TimedScraper(DummyScraper):
+
+    def __init__(self):
+        self.fetched_at = []
+
+    async def fetch_description(self, url: str):
+        import time
+        self.fetched_at.append(time.perf_counter())
+        return await super().fetch_description(url)
+
+
+def test_pipeline_enriches_while_polling_and_reports_stages(conn):
+    prefs = UserPreferences(subscribe_new_grad=True,
+                            subscribe_internship=False,
+                            receive_all=False,
+                            tech_keywords=["kubernetes"],
+                            role_keywords=[],
+                            location_keywords=[])
+    users = [
+        UserContact(id=f"u{i}",
+                    email=f"u{i}@b.com",
+                    phone=None,
+                    is_verified=True,
+                    notify_email=True,
+                    notify_sms=False,
+                    prefs=prefs) for i in range(3)
+    ]
+    poller, scraper, sender = StreamingPoller(4, 0.1), TimedScraper(), FakeSender()
+    state_repo = RepoStateRepository(conn)
+
+    stats = run_poll_for_repo(repo_name="SimplifyJobs/New-Grad-Positions",
+                              repo_label="New Grad",
+                              poller=poller,
+                              users=users,
+                              sent_repo=SentNotificationsRepository(conn),
+                              state_repo=state_repo,
+                              notifier=NotificationService(
+                                  sender, edit_link_builder=lambda u: "x"),
+                              scraper=scraper)
+
+    # The first description was fetched before the last commit was polled
+    assert len(scraper.fetched_at) == 4
+    assert scraper.fetched_at[0] < poller.produced_at[-1]
+    assert state_repo.get_last_sha("SimplifyJobs/New-Grad-Positions") == "sha4"
+    # One digest per user, jobs in commit order
+    assert sorted(e[0] for e in sender.emails) == [
+        "u0@b.com", "u1@b.com", "u2@b.com"
+    ]
+    text = sender.emails[0][2]
+    assert text.index("ex.com/0") < text.index("ex.com/3")
+
+    stages = stats["stages"]
+    assert [stages[s]["items"] for s in ("poll", "parse", "enrich", "match")
+            ] == [4, 4, 4, 4]
+    assert stages["dedupe"]["items"] == 3 and stages["send"]["items"] == 3
+    assert all(s["max_queue_depth"] <= 64 for s in stages.values())
+    assert stats["jobs_sent_total"] == 12
+
+
+def test_duplicate_listings_in_a_run_are_enriched_and_sent_once(conn):
+    prefs = UserPreferences(subscribe_new_grad=True,
+                            subscribe_internship=False,
+                            receive_all=False,
+                            tech_keywords=["kubernetes"],
+                            role_keywords=[],
+                            location_keywords=[])
+    user = UserContact(id="u1",
+                       email="a@b.com",
+                       phone=None,
+                       is_verified=True,
+                       notify_email=True,
+                       notify_sms=False,
+                       prefs=prefs)
+    older, newer = J(1, "Engineer"), J(1, "Senior Engineer")
+    older.date_updated, newer.date_updated = 10, 20
+    # An id-less posting seen again under a tracking URL
+    plain = J("", "Engineer", url="https://ex.com/2")
+    tracked = J("", "Engineer", url="https://ex.com/2/?utm_source=gh")
+    poller = FakePoller([older, plain, newer, tracked], "sha1")
+    scraper, sender = TimedScraper(), FakeSender()
+
+    stats = run_poll_for_repo(repo_name="SimplifyJobs/New-Grad-Positions",
+                              repo_label="New Grad",
+                              poller=poller,
+                              users=[user],
+                              sent_repo=SentNotificationsRepository(conn),
+                              state_repo=RepoStateRepository(conn),
+                              notifier=NotificationService(
+                                  sender, edit_link_builder=lambda u: "x"),
+                              scraper=scraper)
+
+    assert len(scraper.fetched_at) == 2
+    assert stats["duplicates"]["in_repo"] == 2
+    assert stats["jobs_sent_total"] == 2
+    assert "Senior Engineer" in sender.emails[0][2]
+
+
+def test_seen_listings_ledger_limits_reprocessing_to_new_work(conn):
+    prefs = UserPreferences(subscribe_new_grad=True,
+                            subscribe_internship=False,
+                            receive_all=False,
+                            tech_keywords=["kubernetes"],
+                            role_keywords=[],
+                            location_keywords=[])
+    user = UserContact(id="u1",
+                       email="a@b.com",
+                       phone=None,
+                       is_verified=True,
+                       notify_email=True,
+                       notify_sms=False,
+                       prefs=prefs)
+    seen = SeenListingsRepository(conn)
+    sent_repo, state_repo = SentNotificationsRepository(conn), RepoStateRepository(conn)
+
+    def run(jobs, sha):
+        scraper = TimedScraper()
+        stats = run_poll_for_repo(repo_name="SimplifyJobs/New-Grad-Positions",
+                                  repo_label="New Grad",
+                                  poller=FakePoller(jobs, sha),
+                                  users=[user],
+                                  sent_repo=sent_repo,
+                                  state_repo=state_repo,
+                                  notifier=NotificationService(
+                                      FakeSender(),
+                                      edit_link_builder=lambda u: "x"),
+                                  scraper=scraper,
+                                  seen_listings=seen)
+        return stats, len(scraper.fetched_at)
+
+    page = [J(i, "Engineer") for i in range(50)]
+    stats, fetched = run(page, "sha1")
+    assert fetched == 50 and stats["duplicates"]["already_seen"] == 0
+
+    # since_sha fell off the commit page: the same 50 come back, one edited,
+    # plus one genuinely new listing
+    page = [J(i, "Engineer") for i in range(50)]
+    page[7].locations = ["NYC"]
+    stats, fetched = run(page + [J(50, "Engineer")], "sha2")
+    assert fetched == 2
+    assert stats["jobs_considered"] == 2
+    assert stats["duplicates"]["already_seen"] == 49
+    assert stats["jobs_sent_total"] == 1  # the edit was already sent
+
+
+def test_lost_lease_stops_the_run_before_claiming(conn):
+    from persistence.lock import LeaseLost, try_acquire_lock
+
+    prefs = UserPreferences(subscribe_new_grad=True,
+                            subscribe_internship=False,
+                            receive_all=True,
+                            tech_keywords=[],
+                            role_keywords=[],
+                            location_keywords=[])
+    user = UserContact(id="u1",
+                       email="a@b.com",
+                       phone=None,
+                       is_verified=True,
+                       notify_email=True,
+                       notify_sms=False,
+                       prefs=prefs)
+    lease = try_acquire_lock(conn, "poller:SimplifyJobs/New-Grad-Positions",
+                             "owner1")
+    lease.lost = True  # A heartbeat found it taken over
+    sent_repo, state_repo, sender = (SentNotificationsRepository(conn),
+                                     RepoStateRepository(conn), FakeSender())
+
+    with pytest.raises(LeaseLost):
+        run_poll_for_repo(repo_name="SimplifyJobs/New-Grad-Positions",
+                          repo_label="New Grad",
+                          poller=FakePoller([J(1, "Engineer")], "sha1"),
+                          users=[user],
+                          sent_repo=sent_repo,
+                          state_repo=state_repo,
+                          notifier=NotificationService(
+                              sender, edit_link_builder=lambda u: "x"),
+                          scraper=DummyScraper(),
+                          lease=lease)
+
+    assert sender.emails == [] and sent_repo.was_sent("u1", "1") is False
+    assert state_repo.get_last_sha("SimplifyJobs/New-Grad-Positions") is None
+
+
+def test_keywords_outside_the_tag_dictionary_see_the_full_description(conn):
+    from common.tags import EXCERPT_CHARS
+
+    class LongPageScraper:
+
+        async def fetch_description(self, url: str):
+
+            class JD:
+                text = "x" * EXCERPT_CHARS + " compilers in Haskell"
+
+            return JD()
+
+    prefs = UserPreferences(subscribe_new_grad=True,
+                            subscribe_internship=False,
+                            receive_all=False,
+                            tech_keywords=["haskell"],
+                            role_keywords=[],
+                            location_keywords=[])
+    users = [
+        UserContact(id="u1",
+                    email="a@b.com",
+                    phone=None,
+                    is_verified=True,
+                    notify_email=True,
+                    notify_sms=False,
+                    prefs=prefs)
+    ]
+    sender = FakeSender()
+    stats = run_poll_for_repo(
+        repo_name="SimplifyJobs/New-Grad-Positions",
+        repo_label="New Grad",
+        poller=FakePoller([J(1, "Software Engineer")], latest_sha="sha1"),
+        users=users,
+        sent_repo=SentNotificationsRepository(conn),
+        state_repo=RepoStateRepository(conn),
+        notifier=NotificationService(
+            sender, edit_link_builder=lambda u: "https://edit/link"),
+        scraper=LongPageScraper())
+
+    assert stats["users_notified"] == 1
+    assert "Software Engineer" in sender.emails[0][2]
+
+
+class PooledHangingScraper(DummyScraper):
+    """A pooled session whose pages never answer; logs what happens."""
+
+    def __init__(self):
+        self.events = []
+
+    async def open_session(self):
+        self.events.append("open")
+
+    async def close_session(self):
+        self.events.append("close")
+
+    async def fetch_description(self, url: str):
+        import asyncio
+        self.events.append("fetch")
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            self.events.append("cancelled")
+            raise
+
+
+def test_cancelled_run_stops_fetches_before_closing_the_session(conn):
+    import asyncio
+    from notification.orchestrator import run_poll_for_repo_async
+
+    prefs = UserPreferences(subscribe_new_grad=True,
+                            subscribe_internship=False,
+                            receive_all=False,
+                            tech_keywords=["kubernetes"],
+                            role_keywords=[],
+                            location_keywords=[])
+    user = UserContact(id="u1",
+                       email="a@b.com",
+                       phone=None,
+                       is_verified=True,
+                       notify_email=True,
+                       notify_sms=False,
+                       prefs=prefs)
+    scraper = PooledHangingScraper()
+
+    async def main():
+        run = asyncio.ensure_future(
+            run_poll_for_repo_async(
+                repo_name="SimplifyJobs/New-Grad-Positions",
+                repo_label="New Grad",
+                # Still polling, so enrichment is waiting for more jobs
+                poller=StreamingPoller(2, 0.3),
+                users=[user],
+                sent_repo=SentNotificationsRepository(conn),
+                state_repo=RepoStateRepository(conn),
+                notifier=NotificationService(FakeSender(),
+                                             edit_link_builder=lambda u: "x"),
+                scraper=scraper))
+        while "fetch" not in scraper.events:
+            await asyncio.sleep(0.01)
+        run.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await run
+
+    asyncio.run(main())
+
+    assert scraper.events == ["open", "fetch", "cancelled", "close"]
+
+
+def test_repo_cancelled_after_claiming_a_listing_does_not_hang_others(conn):
+    import asyncio
+    from github_poller.dedupe import RunListings
+    from notification.orchestrator import run_poll_for_repo_async
+
+    class StuckSessionScraper(DummyScraper):
+
+        def __init__(self):
+            self.opening = False
+
+        async def open_session(self):
+            self.opening = True
+            await asyncio.sleep(3600)
+
+        async def close_session(self):
+            pass
+
+    prefs = UserPreferences(subscribe_new_grad=True,
+                            subscribe_internship=True,
+                            receive_all=False,
+                            tech_keywords=["kubernetes"],
+                            role_keywords=[],
+                            location_keywords=[])
+    user = UserContact(id="u1",
+                       email="a@b.com",
+                       phone=None,
+                       is_verified=True,
+                       notify_email=True,
+                       notify_sms=False,
+                       prefs=prefs)
+    run_listings, stuck = RunListings(), StuckSessionScraper()
+
+    def run(repo_name, repo_label, scraper):
+        return run_poll_for_repo_async(
+            repo_name=repo_name,
+            repo_label=repo_label,
+            poller=FakePoller([J(1, "Engineer")], "sha1"),
+            users=[user],
+            sent_repo=SentNotificationsRepository(conn),
+            state_repo=RepoStateRepository(conn),
+            notifier=NotificationService(FakeSender(),
+                                         edit_link_builder=lambda u: "x"),
+            scraper=scraper,
+            run_listings=run_listings)
+
+    async def main():
+        first = asyncio.ensure_future(
+            run("SimplifyJobs/New-Grad-Positions", "New Grad", stuck))
+        # Cancelled after claiming the listing, before fetching it
+        while not stuck.opening:
+            await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await asyncio.wait_for(
+            run("SimplifyJobs/Summer2026-Internships", "Internship",
+                DummyScraper()), 2)
+
+    stats = asyncio.run(main())
+
+    assert stats["duplicates"]["enrich_reused"] == 1
+
+
+def test_sync_run_inside_an_event_loop_raises_instead_of_deadlocking(conn):
+    import asyncio
+
+    async def main():
+        with pytest.raises(RuntimeError, match="run_poll_for_repo_async"):
+            run_poll_for_repo(repo_name="SimplifyJobs/New-Grad-Positions",
+                              repo_label="New Grad",
+                              poller=FakePoller([J(1, "Engineer")], "sha1"),
+                              users=[],
+                              sent_repo=SentNotificationsRepository(conn),
+                              state_repo=RepoStateRepository(conn),
+                              notifier=NotificationService(
+                                  FakeSender(), edit_link_builder=lambda u: "x"),
+                              scraper=DummyScraper())
+
+    asyncio.run(main())
+    assert RepoStateRepository(conn).get_last_sha(
+        "SimplifyJobs/New-Grad-Positions") is None
@@ -1,11 +1,13 @@
 import uuid
 import sqlite3
 import pytest
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 from persistence.db import init_db, get_conn
 from persistence.repositories import (UserRepository, RepoStateRepository,
-                                      SentNotificationsRepository)
+                                      SentNotificationsRepository,
+                                      RepoConfigRepository,
+                                      SeenListingsRepository)
 from common.models import UserPreferences
 
 
@@ -85,3 +87,96 @@ def test_sent_notifications_dedup(conn):
     assert sent.was_sent(uid, jid) is False
     sent.mark_sent(uid, jid)
     assert sent.was_sent(uid, jid) is True
+
+
+def test_sent_notifications_bulk_dedup(conn):
+    sent = SentNotificationsRepository(conn)
+    sent.mark_sent("u1", "j2")
+    job_ids = [f"j{i}" for i in range(1200)]  # more than one IN chunk
+    unsent = sent.filter_unsent("u1", job_ids)
+    assert unsent == [j for j in job_ids if j != "j2"]
+    assert sent.filter_unsent("u2", ["j2"]) == ["j2"]
+
+    claimed = sent.mark_sent_many([("u1", "j1"), ("u1", "j2"), ("u2", "j2")])
+    assert claimed == [("u1", "j1"), ("u2", "j2")]
+    # A second run claims nothing
+    assert sent.mark_sent_many([("u1", "j1"), ("u2", "j2")]) == []
+    assert sent.was_sent("u2", "j2") is True
+
+
+def test_seen_listings_ledger_skips_unchanged(conn):
+    seen = SeenListingsRepository(conn)
+    entries = [(f"id:{i}", "h0") for i in range(700)]  # more than one IN chunk
+    seen.record("a/b", entries)
+    assert seen.filter_unseen("a/b", entries) == []
+    # Edited content and other repos still count as unseen
+    assert seen.filter_unseen("a/b", [("id:1", "h1"), ("id:9999", "h0")
+                                      ]) == [("id:1", "h1"), ("id:9999", "h0")]
+    assert seen.filter_unseen("c/d", [("id:1", "h0")]) == [("id:1", "h0")]
+    seen.record("a/b", [("id:1", "h1")])
+    assert seen.filter_unseen("a/b", [("id:1", "h1")]) == []
+    assert seen.count("a/b") == 700
+
+
+def test_seen_listings_prune_drops_old_entries(conn):
+    seen = SeenListingsRepository(conn)
+    seen.record("a/b", [("id:1", "h0"), ("id:2", "h0")])
+    conn.execute("UPDATE seen_listings SET seen_at = '2000-01-01T00:00:00+00:00' "
+                 "WHERE listing_key = 'id:1'")
+    assert seen.prune(timedelta(days=30)) == 1
+    assert seen.filter_unseen("a/b", [("id:1", "h0"), ("id:2", "h0")
+                                      ]) == [("id:1", "h0")]
+
+
+def test_bulk_dedupe_beats_per_pair():
+    from bin.bench_dedupe import bench
+
+    results = bench(n_users=100, n_jobs=10)
+    assert results["bulk"] < results["per-pair"]
+
+
+def test_repo_configs_seeded_and_loaded_from_file(conn, tmp_path):
+    repos = RepoConfigRepository(conn)
+    assert {c.key for c in repos.list_repos()} == {"new_grad", "internship"}
+
+    cfg_file = tmp_path / "repos.json"
+    cfg_file.write_text(
+        '[{"key": "offseason", "owner": "SimplifyJobs", '
+        '"repo": "Summer2027-Internships", "branch": "main", '
+        '"label": "Off-Season"}]')
+    repos.load_file(str(cfg_file))
+
+    got = repos.get_by_full_name("SimplifyJobs/Summer2027-Internships")
+    assert got.key == "offseason" and got.branch == "main"
+    assert len(repos.list_repos()) == 3
+
+
+def test_legacy_branch_env_updates_seeded_repos(conn, monkeypatch, capsys):
+    from bin.poll_once import apply_legacy_branch_env
+
+    repos = RepoConfigRepository(conn)
+    monkeypatch.setenv("NG_BRANCH", "main")
+    monkeypatch.delenv("INTERN_BRANCH", raising=False)
+    apply_legacy_branch_env(repos)
+
+    branches = {c.key: c.branch for c in repos.list_repos()}
+    assert branches == {"new_grad": "main", "internship": "dev"}
+    assert "NG_BRANCH is deprecated" in capsys.readouterr().out
+    assert not repos.set_branch("no_such_repo", "main")
+
+
+def test_subscribed_repos_roundtrip(conn):
+    repo = UserRepository(conn)
+    prefs = UserPreferences(False, False, True, [], [], [],
+                            subscribed_repos=["offseason"])
+    repo.create_user("u1", "a@b.com", None, True, prefs, True, False)
+    assert repo.get_user("u1")["prefs"].subscribed_repos == ["offseason"]
+
+
+def test_init_db_migrates_old_users_table():
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    conn.execute("CREATE TABLE users (id TEXT PRIMARY KEY, email TEXT)")
+    init_db(conn)
+    cols = {r["name"] for r in conn.execute("PRAGMA table_info(users)")}
+    assert "subscribed_repos" in cols
@@ -0,0 +1,104 @@
+from common.models import JobListing, UserPreferences
+from common.tags import (EXCERPT_CHARS, canonical_tag, excerpt, extract_tags,
+                         uncovered_terms)
+from github_poller.matcher import MatchingEngine
+
+
+def _job(description=None, tags=None):
+    return JobListing(id="1",
+                      date_posted=0,
+                      url="https://ex.com/1",
+                      company_name="Acme",
+                      title="Software Engineer",
+                      locations=["Remote"],
+                      sponsorship="None",
+                      active=True,
+                      description=description,
+                      tags=tags)
+
+
+def _prefs(tech=(), role=()):
+    return UserPreferences(subscribe_new_grad=True,
+                           subscribe_internship=False,
+                           receive_all=False,
+                           tech_keywords=list(tech),
+                           role_keywords=list(role),
+                           location_keywords=[])
+
+
+def test_extract_tags_canonicalises_synonyms():
+    text = ("New Grad, back-end team. We run K8s on AWS with Postgres, "
+            "Golang and C++; Spring Boot services talk gRPC.")
+    assert extract_tags(text) == {
+        "new grad", "backend", "kubernetes", "aws", "postgresql", "go", "c++",
+        "spring boot", "grpc"
+    }
+
+
+def test_extract_tags_matches_whole_words_only():
+    assert extract_tags("Google Workspace, javascripting, reactive") == set()
+    # Too generic to stand for a skill on their own
+    assert extract_tags("Spring internship: rest, then platform work") == {
+        "intern"
+    }
+    assert extract_tags("RESTful APIs on the Spring Framework") == {
+        "rest api", "spring framework"
+    }
+    assert extract_tags("") == frozenset()
+    assert canonical_tag(" K8S ") == "kubernetes"
+    assert canonical_tag("haskell") is None
+
+
+def test_excerpt_caps_description():
+    assert excerpt("short") == "short"
+    assert len(excerpt("x" * 50_000)) == EXCERPT_CHARS
+    assert excerpt(None) is None
+
+
+def test_matcher_uses_tags_beyond_the_excerpt():
+    full = "About us. " * 2000 + "Stack: k8s, postgres."
+    job = _job(description=excerpt(full), tags=extract_tags(full))
+    assert MatchingEngine.matches(job, _prefs(tech=["kubernetes"]))
+    assert MatchingEngine.matches(job, _prefs(tech=["Postgres"]))
+    assert not MatchingEngine.matches(job, _prefs(tech=["kafka"]))
+    # Keywords outside the dictionary still scan title/company/excerpt
+    assert MatchingEngine.matches(job, _prefs(role=["about us"]))
+
+
+def test_uncovered_keywords_are_tagged_from_the_full_text():
+    full = "About us. " * 2000 + "Our compiler team writes Haskell."
+    terms = uncovered_terms(["Haskell", "k8s", "", "rest"])
+    assert terms == {"haskell", "rest"}
+    job = _job(description=excerpt(full), tags=extract_tags(full, terms))
+    assert "haskell" not in job.description.lower()
+    assert MatchingEngine.matches(job, _prefs(tech=["haskell"]))
+    assert MatchingEngine.keyword_hits(job, _prefs(tech=["Haskell"])) == 1
+    assert not MatchingEngine.matches(job, _prefs(tech=["rest"]))
+
+
+def test_tags_shrink_listings_and_spare_the_description_scan(monkeypatch):
+    import github_poller.matcher as matcher
+
+    page = ("We build distributed systems in Python and Go on Kubernetes. " +
+            "Benefits, culture and equal opportunity boilerplate. " * 500)
+    tagged = _job(description=excerpt(page), tags=extract_tags(page))
+    assert len(tagged.description) * 10 < len(page)
+
+    scans = []
+    scan = matcher._description_text
+    monkeypatch.setattr(matcher, "_description_text",
+                        lambda job: scans.append(job) or scan(job))
+    # Known keywords are decided by the tags, hit or miss
+    assert MatchingEngine.matches(tagged, _prefs(tech=["rust", "k8s"]))
+    assert not MatchingEngine.matches(tagged, _prefs(tech=["kafka", "rust"]))
+    assert MatchingEngine.keyword_hits(tagged,
+                                       _prefs(tech=["go", "kafka"])) == 1
+    assert scans == []
+    # Only keywords outside the dictionary read the description, once
+    assert MatchingEngine.matches(tagged, _prefs(tech=["kafka", "boilerplate"]))
+    assert not MatchingEngine.matches(tagged, _prefs(tech=["erlang", "elixir"]))
+    assert len(scans) == 2
+    # Without tags (not enriched), the description is scanned as before
+    raw = _job(description=page)
+    assert MatchingEngine.matches(raw, _prefs(tech=["kubernetes"]))
+    assert len(scans) == 3
@@ -0,0 +1,219 @@
+import hashlib
+import hmac
+import json
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api.server as srv
+from persistence.db import init_db
+from persistence.repositories import (UserRepository, RepoStateRepository,
+                                      SentNotificationsRepository,
+                                      WebhookEventRepository)
+from common.models import UserPreferences
+from notification.service import NotificationService
+from notification.runner import drain_webhook_queue
+
+SECRET = "hook-secret"
+REPO = "SimplifyJobs/New-Grad-Positions"
+
+LISTING_PATCH = "\n".join([
+    '+{',
+    '+   "company_name": "Acme",',
+    '+   "id": "wh-1",',
+    '+   "title": "Backend Engineer",',
+    '+   "url": "https://ex.com/wh-1",',
+    '+   "date_posted": 0,',
+    '+   "locations": ["Remote"],',
+    '+   "sponsorship": "Other",',
+    '+   "active": true',
+    '+}',
+])
+
+
+class FakeGithub(BaseHTTPRequestHandler):
+    """Local stand-in for the two GitHub REST endpoints the poller calls."""
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path.endswith("/commits"):
+            body = [{"sha": "sha-new"}, {"sha": "sha-old"}]
+        elif path.endswith("/commits/sha-new"):
+            body = {
+                "files": [{
+                    "filename": ".github/scripts/listings.json",
+                    "patch": LISTING_PATCH
+                }]
+            }
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeSender:
+
+    def __init__(self):
+        self.emails = []
+
+    def send_email(self, to_addr, subject, html_body, text_body):
+        self.emails.append((time.perf_counter(), to_addr, subject))
+
+    def send_sms(self, to_number, text_body):
+        pass
+
+
+class DummyScraper:
+
+    async def fetch_description(self, url: str):
+
+        class JD:
+            text = "python"
+
+        return JD()
+
+
+@pytest.fixture
+def github_api(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGithub)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    monkeypatch.setenv("GITHUB_API_URL",
+                       f"http://127.0.0.1:{server.server_address[1]}")
+    yield
+    server.shutdown()
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    init_db(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def client(conn, monkeypatch):
+    monkeypatch.setenv("GITHUB_WEBHOOK_SECRET", SECRET)
+    srv.app.dependency_overrides[srv.get_webhook_repo] = (
+        lambda: WebhookEventRepository(conn))
+    yield TestClient(srv.app)
+    srv.app.dependency_overrides.clear()
+
+
+def _signed_post(client, payload, secret=SECRET, event="push", delivery=None):
+    body = json.dumps(payload).encode()
+    sig = "sha256=" + hmac.new(secret.encode(), body,
+                               hashlib.sha256).hexdigest()
+    headers = {
+        "Content-Type": "application/json",
+        "X-GitHub-Event": event,
+        "X-Hub-Signature-256": sig,
+    }
+    if delivery:
+        headers["X-GitHub-Delivery"] = delivery
+    return client.post("/webhooks/github", content=body, headers=headers)
+
+
+def _push_payload():
+    return {
+        "ref": "refs/heads/dev",
+        "after": "sha-new",
+        "repository": {
+            "full_name": REPO
+        },
+        "commits": [{
+            "id": "sha-new"
+        }],
+    }
+
+
+def test_webhook_rejects_bad_signature(client, conn):
+    r = _signed_post(client, _push_payload(), secret="wrong")
+    assert r.status_code == 401
+    assert WebhookEventRepository(conn).pending_repos() == []
+
+
+def test_webhook_ping_is_acknowledged(client):
+    r = _signed_post(client, {"zen": "hi"}, event="ping")
+    assert r.status_code == 200
+    assert r.json()["status"] == "pong"
+
+
+def test_webhook_ignores_pushes_to_other_branches(client, conn):
+    payload = _push_payload()
+    payload["ref"] = "refs/heads/feature"
+    r = _signed_post(client, payload)
+    assert r.status_code == 200 and r.json()["status"] == "ignored"
+    assert WebhookEventRepository(conn).pending_repos() == []
+
+
+def test_webhook_skips_malformed_commits(client, conn):
+    payload = _push_payload()
+    payload["commits"] = ["sha-new", None, {"id": "sha-2"}]
+    r = _signed_post(client, payload)
+    assert r.status_code == 200
+    assert r.json() == {"status": "queued", "queued": 1}
+
+
+def test_webhook_redelivery_is_not_queued_twice(client, conn):
+    first = _signed_post(client, _push_payload(), delivery="d-1")
+    again = _signed_post(client, _push_payload(), delivery="d-1")
+    assert first.json() == {"status": "queued", "queued": 1}
+    assert again.json() == {"status": "duplicate", "queued": 0}
+    assert WebhookEventRepository(conn).pending_repos()[0]["n"] == 1
+
+
+def test_webhook_to_send_latency_end_to_end(client, conn, github_api):
+    user_repo = UserRepository(conn)
+    state_repo = RepoStateRepository(conn)
+    state_repo.upsert_last_sha(REPO, "sha-old")
+    user_repo.create_user(user_id="u1",
+                          email="a@b.com",
+                          phone=None,
+                          is_verified=True,
+                          prefs=UserPreferences(True, False, True, [], [],
+                                                []),
+                          notify_email=True,
+                          notify_sms=False)
+    sender = FakeSender()
+    notifier = NotificationService(sender,
+                                   edit_link_builder=lambda u: "http://edit")
+    webhook_repo = WebhookEventRepository(conn)
+
+    t0 = time.perf_counter()
+    r = _signed_post(client, _push_payload())
+    assert r.status_code == 200
+    assert r.json() == {"status": "queued", "queued": 1}
+
+    stats = drain_webhook_queue(webhook_repo, user_repo, state_repo,
+                                SentNotificationsRepository(conn), notifier,
+                                DummyScraper())
+
+    assert len(sender.emails) == 1
+    sent_at, to, subject = sender.emails[0]
+    latency = sent_at - t0
+    assert to == "a@b.com" and "1 new match" in subject
+    assert latency < 5.0
+    assert stats[REPO]["webhook_events"] == 1
+    assert state_repo.get_last_sha(REPO) == "sha-new"
+
+    # Queue is drained; a second pass is a no-op
+    assert webhook_repo.pending_repos() == []
+    assert drain_webhook_queue(webhook_repo, user_repo, state_repo,
+                               SentNotificationsRepository(conn), notifier,
+                               DummyScraper()) == {}